@@ -1,12 +1,30 @@
 """Monitor Slurm queue state and react by adding or removing nodes."""
+import argparse
 import logging
+import signal
+import threading
 import time
 
+import slurmscale as ss
 import slurmscale.jobs
 import slurmscale.nodes
+from slurmscale.util import journal
+from slurmscale.util import metrics
+from slurmscale.util import sizing
+from slurmscale.util.forecast import DemandForecaster
+from slurmscale.util.pools import get_pools
+from slurmscale.util.provision_manager import ProvisionManagerFactory
+from slurmscale.util.snapshot import snapshot
+from slurmscale.util.warm_pool import WarmPool
 
 log = logging.getLogger(__name__)
 
+# Number of nodes being added by running scale-ups, which cluster snapshots
+# do not list yet, by pool name. Pools scale up concurrently, so headroom
+# under max_cluster_size is reserved here before any node is launched.
+_adding = {}
+_headroom_lock = threading.RLock()
+
 
 def idle_nodes():
     """
@@ -19,11 +37,50 @@ def idle_nodes():
     return True if len(ns.list(only_idle=True)) > 0 else False
 
 
-def scale_down():
-    """Remove idle nodes from the cluster."""
+def scale_down(names=None, drainer=None, pool=None):
+    """
+    Remove idle nodes from the cluster.
+
+    At least ``min_nodes`` nodes are kept in the cluster, or in the pool.
+
+    :type names: ``list`` of ``str``
+    :param names: Names of the nodes to remove, in order of preference; of
+                  these, only nodes that are still idle are removed. If not
+                  supplied, all idle nodes are candidates for removal.
+
+    :type drainer: :class:`.DrainPipeline`
+    :param drainer: If supplied, the nodes are drained and left to the
+                    pipeline to remove once they finish any jobs scheduled
+                    in the meantime; nodes already in the pipeline count as
+                    removed. Otherwise, the nodes are removed right away.
+
+    :type pool: :class:`.pools.NodePool`
+    :param pool: If supplied, only remove nodes of this pool, keeping the
+                 pool's ``min_nodes``.
+    """
     ns = slurmscale.nodes.Nodes()
-    log.debug("Scaling down (removing {0})".format(ns.list(only_idle=True)))
-    ns.remove(ns.list(only_idle=True))
+    nodes = ns.list()
+    min_nodes = int(ss.config.get_config_value('min_nodes', 0))
+    if pool is not None:
+        pools = get_pools()
+        nodes = [n for n in nodes if pools.for_node(n.name) is pool]
+        min_nodes = pool.min_nodes
+    draining = (set(drainer.names()) & set(n.name for n in nodes)
+                if drainer is not None else set())
+    idle = dict((n.name, n) for n in nodes
+                if n.state == 'IDLE' and n.name not in draining)
+    remove = ([idle[name] for name in names if name in idle]
+              if names is not None else list(idle.values()))
+    remove = remove[:max(0, len(nodes) - len(draining) - min_nodes)]
+    if not remove:
+        log.debug("No idle nodes to remove")
+        return
+    if drainer is not None:
+        log.debug("Scaling down (draining {0})".format(remove))
+        drainer.drain(remove)
+    else:
+        log.debug("Scaling down (removing {0})".format(remove))
+        ns.remove(remove)
 
 
 def waiting_jobs(grace=300):
@@ -49,15 +106,196 @@ def waiting_jobs(grace=300):
     return w_jobs
 
 
-def scale_up():
-    """Add a worker node."""
-    log.debug("Scaling up...")
-    ns = slurmscale.nodes.Nodes()
-    ns.add()
+def node_shape(pool=None):
+    """
+    Get the resources of the nodes added by the autoscaler.
+
+    :type pool: :class:`.pools.NodePool`
+    :param pool: Pool the nodes are added to; the default pool if not
+                 supplied.
+
+    :rtype: :class:`.sizing.NodeShape`
+    :return: The shape set by the pool's ``instance_cpus`` and
+             ``instance_memory`` config values.
+    """
+    pool = pool or get_pools().default
+    return sizing.NodeShape(cpus=pool.cpus, memory=pool.memory)
+
+
+def scale_up_limit(pool=None):
+    """
+    Get the largest number of nodes a single scale-up may add.
+
+    :type pool: :class:`.pools.NodePool`
+    :param pool: Pool the nodes are added to; the default pool if not
+                 supplied.
+
+    :rtype: ``int``
+    :return: The pool's ``max_nodes_per_cycle``, lowered so the pool does
+             not grow beyond its ``max_nodes`` nodes and the cluster beyond
+             ``max_cluster_size`` nodes, counting nodes still being added.
+    """
+    pools = get_pools()
+    pool = pool or pools.default
+    nodes = snapshot.nodes()
+    limit = pool.max_nodes_per_cycle
+    with _headroom_lock:
+        if pool.max_nodes:
+            size = (sum(1 for name in nodes if pools.for_node(name) is pool) +
+                    _adding.get(pool.name, 0))
+            limit = min(limit, max(0, pool.max_nodes - size))
+        max_size = int(ss.config.get_config_value('max_cluster_size', 0))
+        if max_size:
+            size = len(nodes) + sum(_adding.values())
+            limit = min(limit, max(0, max_size - size))
+    return limit
+
+
+def reserve_headroom(count, pool=None):
+    """
+    Reserve room in the cluster for nodes about to be added.
+
+    Reserved nodes count towards the limits of :func:`scale_up_limit` until
+    released with :func:`release_headroom`.
+
+    :type count: ``int``
+    :param count: Number of nodes to reserve room for.
+
+    :type pool: :class:`.pools.NodePool`
+    :param pool: Pool the nodes are added to; the default pool if not
+                 supplied.
+
+    :rtype: ``int``
+    :return: Number of nodes room was reserved for; fewer than ``count`` if
+             other scale-ups took up the headroom in the meantime.
+    """
+    pool = pool or get_pools().default
+    with _headroom_lock:
+        granted = min(count, scale_up_limit(pool))
+        _adding[pool.name] = _adding.get(pool.name, 0) + granted
+    return granted
+
+
+def release_headroom(count, pool=None):
+    """Release room reserved with :func:`reserve_headroom`."""
+    pool = pool or get_pools().default
+    with _headroom_lock:
+        _adding[pool.name] = max(0, _adding.get(pool.name, 0) - count)
+
+
+def _waiting(grace, pool):
+    """Get the jobs waiting for capacity, for the pool if one is supplied."""
+    now = int(time.time())
+    jobs = [job for job in snapshot.jobs().values()
+            if sizing.is_waiting(job, grace, now)]
+    if pool is not None:
+        pools = get_pools()
+        jobs = [job for job in jobs if pools.for_job(job) is pool]
+    return jobs
+
+
+def nodes_needed(grace=300, pool=None):
+    """
+    Compute the number of nodes to add for the jobs waiting in the queue.
+
+    The CPU, memory and node requests of waiting jobs are bin-packed onto
+    nodes of the pool's shape (``instance_cpus`` and ``instance_memory``
+    config values). The result is capped by :func:`scale_up_limit`.
+
+    :type grace: ``int``
+    :param grace: Number of seconds a job needs to be queued and ready to run
+                  before it gets counted as waiting.
+
+    :type pool: :class:`.pools.NodePool`
+    :param pool: If supplied, only count jobs submitted to the partition the
+                 pool serves and size them for the pool's nodes. Otherwise,
+                 all waiting jobs are sized for nodes of the default pool.
+
+    :rtype: ``int``
+    :return: Number of nodes to add.
+    """
+    jobs = _waiting(grace, pool)
+    if not jobs:
+        return 0
+    limit = scale_up_limit(pool)
+    needed = (sizing.nodes_needed(jobs, node_shape(pool), limit=limit)
+              if limit else 0)
+    log.debug("{0} job(s) waiting to run{1}; adding {2} node(s)".format(
+              len(jobs), " in pool {0}".format(pool.name) if pool else "",
+              needed))
+    return needed
+
+
+def instance_types_needed(grace=300, pool=None):
+    """
+    Choose the flavors of the nodes to add for the jobs waiting in the queue.
+
+    If the pool has ``flavors`` configured, the mix of flavors that runs the
+    waiting jobs with the fewest instances, or at the lowest cost, is chosen
+    using :func:`.sizing.flavor_mix`. Otherwise, all the nodes computed by
+    :func:`nodes_needed` are of the pool's ``instance_type``.
+
+    :type grace: ``int``
+    :param grace: Number of seconds a job needs to be queued and ready to run
+                  before it gets counted as waiting.
+
+    :type pool: :class:`.pools.NodePool`
+    :param pool: Pool to add the nodes to; the default pool if not supplied.
+
+    :rtype: ``list`` of ``str``
+    :return: The flavor of each node to add, largest first; ``None`` for
+             nodes of the pool's ``instance_type``.
+    """
+    flavors = (pool or get_pools().default).flavors
+    if not flavors:
+        return [None] * nodes_needed(grace, pool)
+    jobs = _waiting(grace, pool)
+    limit = scale_up_limit(pool)
+    if not jobs or not limit:
+        return []
+    objective = (pool or get_pools().default).flavor_objective
+    default = (pool or get_pools().default).instance_type
+    mix = [flavor.name for flavor in sizing.flavor_mix(
+        jobs, flavors, objective=objective, limit=limit)]
+    log.debug("{0} job(s) waiting to run; adding {1} ({2} objective)".format(
+              len(jobs), mix, objective))
+    return [None if name == default else name for name in mix]
+
+
+def scale_up(count=1, warm_pool=None, pool=None, instance_types=None):
+    """
+    Add worker nodes.
+
+    :type count: ``int``
+    :param count: Number of nodes to add.
+
+    :type warm_pool: :class:`.warm_pool.WarmPool`
+    :param warm_pool: A pool of standby instances to claim from first.
+
+    :type pool: :class:`.pools.NodePool`
+    :param pool: Pool to add the nodes to; the default pool if not supplied.
+
+    :type instance_types: ``list`` of ``str``
+    :param instance_types: Flavor of each node to add (see
+                           :func:`instance_types_needed`).
+    """
+    granted = reserve_headroom(count, pool)
+    if granted < count:
+        log.info("Only room for {0} of {1} node(s) left in the cluster".format(
+                 granted, count))
+    if not granted:
+        return
+    try:
+        log.debug("Scaling up by {0} node(s)...".format(granted))
+        ns = slurmscale.nodes.Nodes(warm_pool=warm_pool, pool=pool)
+        ns.add(count=granted, instance_types=(instance_types or [])[:granted])
+    finally:
+        release_headroom(granted, pool)
 
 
 def setup_logging():
     """Setup logging."""
+    ss.configure_logging()
     formatter = logging.Formatter("%(asctime)s,%(msecs)d L#%(lineno)d "
                                   "[%(levelname)s] - %(message)s", "%H:%M:%S")
     console = logging.StreamHandler()  # log to console
@@ -76,11 +314,341 @@ def run_check():
     """Check if the cluster is busy or has idle nodes and initiate scaling."""
     if idle_nodes():
         scale_down()
-    elif waiting_jobs():
-        scale_up()
+    else:
+        needed = nodes_needed()
+        if needed:
+            scale_up(needed)
+
+
+class IdleTracker(object):
+    """Track for how long each node has been idle across cluster checks."""
+
+    def __init__(self):
+        """Initialize the tracker with no idle nodes."""
+        self._since = {}  # node name -> time the node was first seen idle
+
+    def update(self, nodes, now=None):
+        """
+        Record the current state of the nodes.
+
+        A node's idle time starts when it is first seen ``IDLE`` and is reset
+        as soon as it is seen in any other state. Nodes no longer in the
+        cluster are forgotten.
+
+        :type nodes: ``list`` of :class:`.Node`
+        :param nodes: All the current cluster nodes.
+
+        :type now: ``float``
+        :param now: Current time as a Unix timestamp; defaults to the clock.
+        """
+        now = time.time() if now is None else now
+        since = {}
+        for node in nodes:
+            if node.state == 'IDLE':
+                since[node.name] = self._since.get(node.name, now)
+        self._since = since
+
+    def idle_for(self, name, now=None):
+        """
+        Get the number of seconds a node has been idle.
+
+        :rtype: ``float``
+        :return: Seconds since the node was first seen idle; 0 if it is not
+                 idle.
+        """
+        now = time.time() if now is None else now
+        return now - self._since[name] if name in self._since else 0
+
+    def idle_longer_than(self, seconds, now=None):
+        """
+        Get the nodes that have been idle for at least ``seconds``.
+
+        :rtype: ``list`` of ``str``
+        :return: Node names, longest idle first.
+        """
+        now = time.time() if now is None else now
+        return [name for name, since in sorted(self._since.items(),
+                                               key=lambda item: item[1])
+                if now - since >= seconds]
+
+
+class Autoscaler(object):
+    """
+    Poll the cluster and run scaling operations in the background.
+
+    The cluster state is checked every ``interval`` seconds using the shared
+    cluster snapshot. Each node pool (see :class:`.pools.NodePools`) is
+    scaled independently, for the jobs submitted to the partition it
+    serves. Scaling operations run in their own threads so monitoring
+    continues while nodes are being provisioned or configured and pools
+    scale concurrently; at most one scale-up and one scale-down operation
+    run for each pool at any time.
+
+    To avoid removing nodes that are briefly idle between jobs only to add
+    them again shortly after, nodes are removed only once they have been
+    idle for the pool's ``min_idle_time`` seconds, not within
+    ``scale_down_cooldown`` seconds of a scale-up of the pool and never
+    below the pool's ``min_nodes`` nodes. Nodes are not added within
+    ``scale_up_cooldown`` seconds of a scale-down of the pool.
+
+    Nodes are removed through a :class:`.DrainPipeline`: they are drained
+    first, so a job scheduled onto a node just before it is chosen for
+    removal is not killed, and removed once they finish their jobs or
+    ``drain_timeout`` seconds pass. When jobs are waiting, draining nodes
+    are returned to service before new nodes are added.
+
+    With ``predictive_scaling`` enabled, job submissions to each pool are
+    tracked by a :class:`.DemandForecaster` and nodes are added, or kept,
+    for the demand forecast over the next ``forecast_horizon`` seconds
+    instead of only once jobs have been waiting.
+    """
+
+    def __init__(self, interval=None):
+        """
+        Initialize the autoscaler.
+
+        :type interval: ``float``
+        :param interval: Number of seconds between cluster checks. If not
+                         supplied, ``autoscaler_interval`` config value is
+                         used.
+        """
+        self.interval = interval or float(ss.config.get_config_value(
+            'autoscaler_interval', 60))
+        self._stop = threading.Event()
+        self._tasks = {}  # operation name -> running thread
+        self._finished = {}  # operation name -> time it last finished
+        self.idle = IdleTracker()
+        self.min_idle_time = float(ss.config.get_config_value(
+            'min_idle_time', 600))
+        self.scale_down_cooldown = float(ss.config.get_config_value(
+            'scale_down_cooldown', 600))
+        self.scale_up_cooldown = float(ss.config.get_config_value(
+            'scale_up_cooldown', 60))
+        self.min_nodes = int(ss.config.get_config_value('min_nodes', 0))
+        self.pools = get_pools()
+        self.drainer = slurmscale.nodes.DrainPipeline()
+        self.forecasters = {}  # pool name -> DemandForecaster
+        if ss.config.get_config_bool('predictive_scaling', False):
+            self.forecasters = dict((pool.name, DemandForecaster())
+                                    for pool in self.pools)
+        self.warm_pool = None
+        if int(ss.config.get_config_value('warm_pool_size', 0)) > 0:
+            self.warm_pool = WarmPool(
+                ProvisionManagerFactory.get_provision_manger(
+                    ss.config.get_config_value(
+                        'provision_manager_name',
+                        'JetstreamIUProvisionManager')))
+
+    def _busy(self, name):
+        """Check if the named scaling operation is still running."""
+        task = self._tasks.get(name)
+        return task is not None and task.is_alive()
+
+    def _run_task(self, name, target):
+        """Run a scaling operation, logging any exceptions it raises."""
+        start = time.time()
+        try:
+            target()
+        except Exception:
+            log.exception("Scaling operation {0} failed".format(name))
+            metrics.inc('slurmscale_scaling_failures_total', operation=name)
+        self._finished[name] = time.time()
+        metrics.observe('slurmscale_scaling_seconds', time.time() - start,
+                        operation=name)
+        log.debug("Scaling operation {0} finished in {1:.1f}s".format(
+                  name, time.time() - start))
+
+    def _start_task(self, name, target):
+        """Start a scaling operation in the background unless it's running."""
+        if self._busy(name):
+            log.debug("Scaling operation {0} still in progress".format(name))
+            return False
+        task = threading.Thread(target=self._run_task, args=(name, target),
+                                name=name)
+        self._tasks[name] = task
+        task.start()
+        return True
+
+    def _cooling_down(self, name, cooldown, now):
+        """Check if the named operation finished less than cooldown ago."""
+        return now - self._finished.get(name, 0) < cooldown
+
+    def _policy(self, pool):
+        """Get a pool's ``min_idle_time`` and ``min_nodes`` settings."""
+        if pool.default:
+            return (self.min_idle_time, self.min_nodes)
+        return (pool.min_idle_time, pool.min_nodes)
+
+    def _forecast_nodes(self, now, pool, count_idle=True):
+        """
+        Get the number of nodes to add to a pool for the forecast job demand.
+
+        :type count_idle: ``bool``
+        :param count_idle: Whether the CPUs of idle nodes count as free. If
+                           not, the result is the number of idle nodes worth
+                           keeping for the forecast demand.
+
+        :rtype: ``int``
+        :return: Number of nodes; 0 if predictive scaling is disabled.
+        """
+        forecaster = self.forecasters.get(pool.name)
+        if forecaster is None:
+            return 0
+        states = ('IDLE', 'MIXED') if count_idle else ('MIXED',)
+        free = sum(max(0, int(n.get('cpus') or 0) -
+                       int(n.get('alloc_cpus') or 0))
+                   for name, n in snapshot.nodes().items()
+                   if self.pools.for_node(name) is pool and
+                   n.get('state', '').rstrip('*~#!%$@^-') in states)
+        return forecaster.nodes_needed(node_shape(pool), free, now=now)
+
+    def _removable(self, nodes, now, pool):
+        """
+        Get the names of idle nodes of a pool that may be removed.
+
+        :type nodes: ``list`` of :class:`.Node`
+        :param nodes: All the nodes of the pool.
+
+        :rtype: ``list`` of ``str``
+        :return: Node names, longest idle first.
+        """
+        scale_up = pool.task('scale_up')
+        if self._busy(scale_up) or self._cooling_down(
+                scale_up, self.scale_down_cooldown, now):
+            return []
+        min_idle_time, min_nodes = self._policy(pool)
+        in_pool = set(node.name for node in nodes)
+        draining = set(self.drainer.names()) & in_pool
+        names = [name for name in self.idle.idle_longer_than(
+            min_idle_time, now) if name in in_pool and name not in draining]
+        keep = (self._forecast_nodes(now, pool, count_idle=False)
+                if names else 0)
+        if keep:
+            log.debug("Keeping {0} idle node(s) in pool {1} for the forecast "
+                      "demand".format(keep, pool.name))
+            names = names[:max(0, len(names) - keep)]
+        return names[:max(0, len(nodes) - len(draining) - min_nodes)]
+
+    def _check_pool(self, pool, nodes, now):
+        """
+        Start any scaling operation needed for a pool.
+
+        :type nodes: ``list`` of :class:`.Node`
+        :param nodes: All the nodes of the pool.
+        """
+        if any(node.state == 'IDLE' for node in nodes):
+            names = self._removable(nodes, now, pool)
+            if names:
+                self._start_task(
+                    pool.task('scale_down'),
+                    lambda: scale_down(names, self.drainer, pool))
+        elif not self._busy(pool.task('scale_up')):
+            if self._cooling_down(pool.task('scale_down'),
+                                  self.scale_up_cooldown, now):
+                log.debug("Not scaling up pool {0} within {1}s of a "
+                          "scale-down".format(pool.name,
+                                              self.scale_up_cooldown))
+                return
+            types = instance_types_needed(pool=pool)
+            predicted = min(self._forecast_nodes(now, pool),
+                            scale_up_limit(pool))
+            if predicted > len(types):
+                log.debug("Scaling up pool {0} ahead of the forecast "
+                          "demand".format(pool.name))
+                types += [None] * (predicted - len(types))
+            if types and len(self.drainer):
+                resumed = self.drainer.resume(len(types), pool)
+                # Resumed nodes stand in for the smallest new ones
+                types = types[:len(types) - len(resumed)]
+                if resumed:
+                    self._finished[pool.task('scale_up')] = now
+            if types:
+                # Standby instances have the default pool's flavor
+                warm_pool = self.warm_pool if pool.default else None
+                self._start_task(pool.task('scale_up'), lambda: scale_up(
+                    len(types), warm_pool, pool, types))
+
+    def check(self):
+        """Check the cluster state and start any needed scaling operation."""
+        snapshot.refresh()
+        now = time.time()
+        nodes = slurmscale.nodes.Nodes().list()
+        self.idle.update(nodes, now)
+        if self.forecasters:
+            jobs = self.pools.split_jobs(snapshot.jobs())
+            for name, forecaster in self.forecasters.items():
+                forecaster.observe(jobs[name], now)
+        if len(self.drainer):
+            self._start_task('decommission', self.drainer.poll)
+        pool_nodes = dict((pool.name, []) for pool in self.pools)
+        for node in nodes:
+            pool_nodes[self.pools.for_node(node.name).name].append(node)
+        for pool in self.pools:
+            self._check_pool(pool, pool_nodes[pool.name], now)
+
+    def recover(self):
+        """Resume or roll back node operations interrupted by a restart."""
+        try:
+            slurmscale.nodes.Nodes().recover(drainer=self.drainer)
+            node_journal = journal.get_journal()
+            if node_journal:
+                node_journal.prune(float(ss.config.get_config_value(
+                    'journal_max_age', 7 * 24 * 3600)))
+        except Exception:
+            log.exception("Recovering interrupted operations failed")
+
+    def stop(self, *args):
+        """Request the autoscaler to stop; usable as a signal handler."""
+        log.info("Stopping the autoscaler.")
+        self._stop.set()
+
+    def run(self):
+        """
+        Check the cluster periodically until stopped.
+
+        ``SIGINT`` and ``SIGTERM`` stop the polling; scaling operations that
+        are already running are allowed to finish before returning.
+        """
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
+        metrics_server = None
+        metrics_port = int(ss.config.get_config_value('metrics_port', 0))
+        if metrics_port:
+            metrics.enable()
+            metrics_server = metrics.serve(metrics_port)
+        self.recover()
+        log.info("Checking the cluster every {0}s".format(self.interval))
+        if self.warm_pool:
+            self.warm_pool.start()
+        while not self._stop.is_set():
+            try:
+                with metrics.timer('slurmscale_check_seconds'):
+                    self.check()
+            except Exception:
+                log.exception("Cluster check failed")
+            self._stop.wait(self.interval)
+        for name, task in self._tasks.items():
+            if task.is_alive():
+                log.info("Waiting for {0} to finish...".format(name))
+                # Join with a timeout so signals are still delivered
+                while task.is_alive():
+                    task.join(1)
+        if self.warm_pool:
+            self.warm_pool.stop()
+        if metrics_server:
+            metrics_server.shutdown()
+
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--interval', type=float,
+                        help="Seconds between cluster checks (default: "
+                             "autoscaler_interval config value)")
+    parser.add_argument('--once', action='store_true',
+                        help="Check the cluster once and exit")
+    args = parser.parse_args()
     setup_logging()
-    while True:
+    if args.once:
         run_check()
-        time.sleep(1800)  # Run every 30 minutes
+    else:
+        Autoscaler(interval=args.interval).run()
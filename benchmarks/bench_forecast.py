@@ -0,0 +1,116 @@
+"""
+Evaluate job demand forecasts offline against a replayed arrival stream.
+
+Jobs from a seeded ``ArrivalGenerator`` are replayed into forecasters with
+different settings, polling the simulated queue like the autoscaler does.
+At every poll, the CPUs forecast to be requested over the next horizon are
+compared with the CPUs actually requested::
+
+    python benchmarks/bench_forecast.py --days 7 --horizon 900
+"""
+import argparse
+import bisect
+import heapq
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..'))
+
+from slurmscale.fake import ArrivalGenerator  # noqa
+from slurmscale.util.forecast import DemandForecaster  # noqa
+from slurmscale.util.forecast import job_cpus  # noqa
+
+DAY = 86400
+
+
+def parse_args():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--days', type=int, default=7,
+                        help="Days of arrivals to replay")
+    parser.add_argument('--warmup', type=int, default=1,
+                        help="Days replayed before forecasts are scored")
+    parser.add_argument('--poll', type=float, default=60,
+                        help="Seconds between queue snapshots")
+    parser.add_argument('--interval', type=float, default=300,
+                        help="Forecast bucket size in seconds")
+    parser.add_argument('--horizon', type=float, default=900,
+                        help="Seconds ahead to forecast")
+    parser.add_argument('--alpha', type=float, default=0.3,
+                        help="EWMA smoothing factor")
+    parser.add_argument('--rate', type=float, default=1 / 130.0,
+                        help="Average jobs submitted per second")
+    parser.add_argument('--burst-rate', type=float, default=4.0 / DAY,
+                        help="Average bursts per second")
+    parser.add_argument('--seed', type=int, default=0,
+                        help="Seed of the arrival stream")
+    return parser.parse_args()
+
+
+def replay(forecaster, jobs, args):
+    """
+    Replay jobs into a forecaster and score its forecasts.
+
+    :rtype: ``dict``
+    :return: Mean absolute error and bias of the forecast CPUs, and the mean
+             CPUs actually requested, per horizon.
+    """
+    times = [job['submit_time'] for job in jobs]
+    cumulative = [0]
+    for job in jobs:
+        cumulative.append(cumulative[-1] + job_cpus(job))
+    active = {}
+    ends = []  # Heap of (end time, job ID)
+    errors = []
+    actuals = []
+    next_job = 0
+    now = 0.0
+    end = args.days * DAY
+    while now < end:
+        while next_job < len(jobs) and times[next_job] <= now:
+            job = dict(jobs[next_job], job_state='RUNNING')
+            active[job['job_id']] = job
+            heapq.heappush(ends, (job['submit_time'] +
+                                  job['time_limit_secs'], job['job_id']))
+            next_job += 1
+        while ends and ends[0][0] <= now:
+            active.pop(heapq.heappop(ends)[1], None)
+        forecaster.observe(active, now)
+        if now >= args.warmup * DAY and now + args.horizon <= end:
+            forecast, _ = forecaster.forecast(args.horizon, now)
+            actual = (cumulative[bisect.bisect_right(times, now +
+                                                     args.horizon)] -
+                      cumulative[bisect.bisect_right(times, now)])
+            errors.append(forecast - actual)
+            actuals.append(actual)
+        now += args.poll
+    count = float(len(errors)) or 1.0
+    return {'mae': sum(abs(e) for e in errors) / count,
+            'bias': sum(errors) / count,
+            'mean': sum(actuals) / count}
+
+
+def main():
+    """Replay the arrival stream into each forecaster and print scores."""
+    args = parse_args()
+    generator = ArrivalGenerator(rate=args.rate, burst_rate=args.burst_rate,
+                                 seed=args.seed)
+    jobs = generator.until(args.days * DAY)
+    print("Replaying {0} jobs over {1} day(s); forecasting {2:.0f}s "
+          "ahead".format(len(jobs), args.days, args.horizon))
+    forecasters = [
+        ('last bucket', DemandForecaster(args.interval, 1.0, 0)),
+        ('ewma', DemandForecaster(args.interval, args.alpha, 0)),
+        ('seasonal', DemandForecaster(args.interval, args.alpha, DAY)),
+    ]
+    print("{0:<12} {1:>10} {2:>10} {3:>10}".format(
+          'forecaster', 'mae', 'bias', 'actual'))
+    for name, forecaster in forecasters:
+        score = replay(forecaster, jobs, args)
+        print("{0:<12} {1:>10.1f} {2:>10.1f} {3:>10.1f}".format(
+              name, score['mae'], score['bias'], score['mean']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+Check that importing SlurmScale stays within a start-up time budget.
+
+Each measurement runs in a fresh interpreter that imports the public
+packages and creates a ``Nodes`` object, as a quick status command would.
+The check fails if the best time exceeds the budget or if any of the heavy
+dependencies, which should only be loaded on first use, got imported::
+
+    python benchmarks/bench_import.py --budget 150
+
+With ``--fake``, the fake Slurm backend (see :mod:`slurmscale.fake`) is
+installed first, so the check also runs where ``pyslurm`` is not installed.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# Modules that must not be loaded until they are actually needed. yaml is
+# not among them: bunch, used throughout, imports it whenever it is installed
+HEAVY_MODULES = ('cloudbridge', 'paramiko', 'novaclient', 'keystoneclient')
+
+CHILD = """
+import json
+import sys
+import time
+start = time.time()
+%s
+import slurmscale.jobs
+import slurmscale.nodes
+import slurmscale.partitions
+slurmscale.nodes.Nodes()
+elapsed = time.time() - start
+print(json.dumps({'seconds': elapsed,
+                  'heavy': sorted(m for m in sys.modules
+                                  if m.split('.')[0] in %r)}))
+"""
+
+# Installs the fake backends in place of Slurm and the cloud
+FAKE_SETUP = """
+from slurmscale import fake
+fake.install()
+"""
+
+
+def parse_args():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--budget', type=float, default=150,
+                        help="Allowed import time in milliseconds")
+    parser.add_argument('--repeat', type=int, default=5,
+                        help="Number of fresh interpreters to time")
+    parser.add_argument('--fake', action='store_true',
+                        help="Use the fake Slurm backend (timed as well)")
+    return parser.parse_args()
+
+
+def measure(fake=False):
+    """
+    Time the imports in a fresh interpreter.
+
+    :type fake: ``bool``
+    :param fake: Whether to install the fake backends first.
+
+    :rtype: ``dict``
+    :return: Import time in seconds and the heavy modules that got loaded.
+    """
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [ROOT] + [p for p in env.get('PYTHONPATH', '').split(os.pathsep)
+                  if p])
+    child = CHILD % (FAKE_SETUP if fake else '', HEAVY_MODULES)
+    out = subprocess.check_output([sys.executable, '-c', child], env=env,
+                                  cwd=ROOT)
+    return json.loads(out.decode('utf-8').strip().splitlines()[-1])
+
+
+def main():
+    """Run the check and report the results."""
+    args = parse_args()
+    results = [measure(args.fake) for _ in range(args.repeat)]
+    best = min(r['seconds'] for r in results) * 1000
+    heavy = sorted(set(m for r in results for m in r['heavy']))
+    print("import time: {0:.1f} ms (budget {1:.0f} ms)".format(
+          best, args.budget))
+    failed = False
+    if best > args.budget:
+        print("OVER BUDGET by {0:.1f} ms".format(best - args.budget))
+        failed = True
+    if heavy:
+        print("Heavy modules loaded on import: {0}".format(', '.join(heavy)))
+        failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
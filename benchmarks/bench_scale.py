@@ -0,0 +1,149 @@
+"""
+Time common SlurmScale operations against the local fake backends.
+
+Each operation is timed with a cold cluster snapshot, so the reported time
+includes fetching data from (fake) Slurm. Results can be saved and compared
+against a previous run to catch regressions::
+
+    python benchmarks/bench_scale.py --nodes 10000 --jobs 100000 \\
+        --save baseline.json
+    python benchmarks/bench_scale.py --nodes 10000 --jobs 100000 \\
+        --compare baseline.json
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..'))
+
+from slurmscale import fake  # noqa
+
+
+def parse_args():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--nodes', type=int, default=1000,
+                        help="Nodes in the fake cluster")
+    parser.add_argument('--jobs', type=int, default=10000,
+                        help="Jobs in the fake cluster")
+    parser.add_argument('--batch', type=int, default=20,
+                        help="Nodes added and removed per iteration")
+    parser.add_argument('--repeat', type=int, default=5,
+                        help="Iterations per operation")
+    parser.add_argument('--rpc-latency', type=float, default=0.0,
+                        help="Seconds per simulated pyslurm call")
+    parser.add_argument('--api-latency', type=float, default=0.0,
+                        help="Seconds per simulated cloud API call")
+    parser.add_argument('--playbook-latency', type=float, default=0.0,
+                        help="Seconds per simulated playbook run")
+    parser.add_argument('--save', help="Save results to a JSON file")
+    parser.add_argument('--compare',
+                        help="Compare results to a JSON file saved earlier")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="Allowed slowdown when comparing (fraction)")
+    return parser.parse_args()
+
+
+def timed(func, repeat, setup=None):
+    """
+    Time ``func`` over ``repeat`` iterations.
+
+    :rtype: ``dict``
+    :return: Best and median wall time in seconds, and Slurm RPCs per
+             iteration.
+    """
+    from slurmscale.util.snapshot import snapshot
+    times = []
+    calls = 0
+    for _ in range(repeat):
+        arg = setup() if setup else None
+        snapshot.refresh()
+        before = sum(fake.slurm.cluster.calls.values())
+        start = time.time()
+        func(arg) if setup else func()
+        times.append(time.time() - start)
+        calls += sum(fake.slurm.cluster.calls.values()) - before
+    times.sort()
+    return {'best': times[0], 'median': times[len(times) // 2],
+            'rpcs': calls / float(repeat)}
+
+
+def main():
+    """Run the benchmarks and report the results."""
+    args = parse_args()
+    backend = fake.install(
+        nodes=args.nodes, jobs=args.jobs, rpc_latency=args.rpc_latency,
+        api_latency=args.api_latency, playbook_latency=args.playbook_latency)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    import autoscaler
+    import slurmscale.jobs
+
+    nodes = backend.nodes()
+    jobs = slurmscale.jobs.Jobs()
+    added = []
+
+    def add():
+        added.append([r.node for r in nodes.add(count=args.batch)
+                      if r.node])
+
+    def remove(batch):
+        nodes.remove(batch)
+
+    def waiting_by_partition():
+        summary = jobs.summary()
+        waiting = summary.waiting()
+        return (summary.count_by_partition(waiting),
+                summary.total_cpus(waiting),
+                summary.age_percentiles(selected=waiting))
+
+    some_node = nodes.list()[-1] if args.nodes else None
+    cases = [
+        ('nodes_list', lambda: nodes.list(), None),
+        ('nodes_list_idle', lambda: nodes.list(only_idle=True), None),
+        ('nodes_get', lambda: nodes.get(ip=some_node.ip if some_node
+                                        else None), None),
+        ('node_state', lambda: [n.state for n in nodes.list()[:100]], None),
+        ('jobs_list', lambda: jobs.list(), None),
+        ('jobs_list_pending', lambda: jobs.list(states=['PENDING']), None),
+        ('jobs_summary', lambda: jobs.summary(), None),
+        ('waiting_by_partition', lambda: waiting_by_partition(), None),
+        ('waiting_jobs', autoscaler.waiting_jobs, None),
+        ('nodes_needed', autoscaler.nodes_needed, None),
+        ('add', add, None),
+        ('remove', remove, lambda: added.pop(0) if added else []),
+    ]
+    results = {}
+    print("{0:<20} {1:>10} {2:>10} {3:>8}".format(
+          'operation', 'best (s)', 'median (s)', 'rpcs'))
+    for name, func, setup in cases:
+        results[name] = timed(func, args.repeat, setup)
+        print("{0:<20} {1:>10.4f} {2:>10.4f} {3:>8.1f}".format(
+              name, results[name]['best'], results[name]['median'],
+              results[name]['rpcs']))
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        regressions = []
+        for name, result in sorted(results.items()):
+            base = baseline.get(name)
+            # Ignore noise on operations that take well under a millisecond
+            if base and result['best'] > max(base['best'], 0.001) * (
+                    1 + args.tolerance):
+                regressions.append(name)
+                print("REGRESSION {0}: {1:.4f}s vs {2:.4f}s".format(
+                      name, result['best'], base['best']))
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,7 @@
 import logging
 import logging.config
 import os
-import yaml
+import threading
 
 from util import Config
 
@@ -35,8 +35,36 @@ def logpath(filename, max_bytes=0, backup_count=0):
     return logging.handlers.RotatingFileHandler(
         filename, maxBytes=max_bytes, backupCount=backup_count)
 
-# Read log config from a YAML file
-log_conf = os.path.join(lib_root_path, 'logging.yaml')
-with open(log_conf, 'r') as f:
-    logging.config.dictConfig(yaml.load(f))
+
+# Until logging is configured, drop library log records silently
+logging.getLogger('slurmscale').addHandler(logging.NullHandler())
+
+_logging_lock = threading.Lock()
+_logging_configured = False
+
+
+def configure_logging():
+    """
+    Configure logging from the library's ``logging.yaml`` file.
+
+    Logging is configured on first use of the library (e.g., the first query
+    to Slurm) rather than on import, so importing the library stays cheap.
+    Calling this function more than once has no effect.
+    """
+    global _logging_configured
+    if _logging_configured:
+        return
+    with _logging_lock:
+        if _logging_configured:
+            return
+        import yaml
+        log_conf = os.path.join(lib_root_path, 'logging.yaml')
+        with open(log_conf, 'r') as f:
+            conf = yaml.safe_load(f)
+        # Module loggers already exist by the time logging is configured
+        conf.setdefault('disable_existing_loggers', False)
+        logging.config.dictConfig(conf)
+        _logging_configured = True
+
+
 log = logging.getLogger()
@@ -0,0 +1,118 @@
+"""
+Local stand-ins for Slurm, the cloud provider and Ansible.
+
+These make it possible to exercise the library, e.g., for benchmarking,
+without a live ``slurmctld``, cloud or playbook. ``install()`` must be called
+before any library module that imports ``pyslurm`` is imported::
+
+    from slurmscale import fake
+    backend = fake.install(nodes=10000, jobs=100000)
+
+    import slurmscale.nodes
+    nodes = backend.nodes()
+    nodes.add(count=20)
+"""
+import os
+import sys
+import tempfile
+
+from . import slurm
+from .ansible import FakeAnsibleRunner
+from .arrivals import ArrivalGenerator  # noqa
+from .cloud import FakeProvider
+from .cloud import FakeReadinessProbe
+
+import slurmscale as ss
+
+
+class FakeBackend(object):
+    """Handles to the installed fake backends."""
+
+    def __init__(self, cluster, provider, ssh_probe):
+        """Initialize the handles."""
+        self.cluster = cluster
+        self.provider = provider
+        self.ssh_probe = ssh_probe
+        self.runner_class = FakeAnsibleRunner
+
+    def provision_manager(self):
+        """Create a provision manager backed by the fake cloud provider."""
+        from slurmscale.util.provision_manager import \
+            JetstreamIUProvisionManager
+        return JetstreamIUProvisionManager(provider=self.provider,
+                                           ssh_probe=self.ssh_probe)
+
+    def config_manager(self):
+        """Create a config manager backed by the fake Ansible runner."""
+        from slurmscale.util.config_manager import \
+            GalaxyJetstreamIUConfigManager
+        return GalaxyJetstreamIUConfigManager(runner_class=self.runner_class)
+
+    def nodes(self, **kwargs):
+        """Create a ``Nodes`` object using the fake managers."""
+        from slurmscale.nodes import Nodes
+        return Nodes(provision_manager=self.provision_manager(),
+                     config_manager=self.config_manager(), **kwargs)
+
+
+def install(nodes=0, jobs=0, rpc_latency=0.0, api_latency=0.0,
+            boot_time=0.0, ssh_latency=0.0, playbook_latency=0.0,
+            playbook_host_latency=0.0, pending_ratio=0.2):
+    """
+    Install the fake backends.
+
+    The fake ``pyslurm`` module is registered in ``sys.modules`` and the
+    configuration is pointed at a temporary playbook directory.
+
+    :type nodes: ``int``
+    :param nodes: Number of nodes in the fake cluster.
+
+    :type jobs: ``int``
+    :param jobs: Number of jobs in the fake cluster.
+
+    :type rpc_latency: ``float``
+    :param rpc_latency: Seconds each ``pyslurm`` call takes.
+
+    :type api_latency: ``float``
+    :param api_latency: Seconds each cloud API call takes.
+
+    :type boot_time: ``float``
+    :param boot_time: Seconds an instance takes to reach the running state.
+
+    :type ssh_latency: ``float``
+    :param ssh_latency: Seconds a batch of instances takes to accept ssh.
+
+    :type playbook_latency: ``float``
+    :param playbook_latency: Seconds each playbook run takes.
+
+    :type playbook_host_latency: ``float``
+    :param playbook_host_latency: Additional seconds per host in a run.
+
+    :type pending_ratio: ``float``
+    :param pending_ratio: Fraction of jobs that are pending.
+
+    :rtype: :class:`.FakeBackend`
+    :return: Handles to the installed backends.
+    """
+    slurm.cluster = slurm.FakeCluster(
+        nodes=nodes, jobs=jobs, latency=rpc_latency,
+        prefix=ss.config.get_config_value('node_name_prefix',
+                                          'jetstream-iu-large'),
+        pending_ratio=pending_ratio)
+    sys.modules['pyslurm'] = slurm
+    FakeAnsibleRunner.latency = playbook_latency
+    FakeAnsibleRunner.host_latency = playbook_host_latency
+    # Keep the journal, like a real deployment's, outside the playbook root
+    root = tempfile.mkdtemp(prefix='slurmscale-fake-')
+    playbook_root = os.path.join(root, 'playbook')
+    os.mkdir(playbook_root)
+    ss.config.set_config_value('ansible_playbook_root', playbook_root)
+    ss.config.set_config_value('journal_path',
+                               os.path.join(root, 'journal.db'))
+    ss.config.set_config_value('ansible_inventory', 'inventory')
+    ss.config.set_config_value('ansible_playbook', 'playbook.yml')
+    ss.config.set_config_value('config_venv_path', '')
+    return FakeBackend(slurm.cluster,
+                       FakeProvider(api_latency=api_latency,
+                                    boot_time=boot_time),
+                       FakeReadinessProbe(latency=ssh_latency))
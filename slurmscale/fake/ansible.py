@@ -0,0 +1,48 @@
+"""A stand-in for ``AnsibleRunner`` that reconfigures the fake cluster."""
+import re
+import time
+
+from . import slurm
+
+INVENTORY_HOST_RE = re.compile(
+    r'^([^#\s]\S*)\s+ansible_host=(\S+)((?:\s+\S+=\S+)*)\s*$')
+
+
+class FakeAnsibleRunner(object):
+    """
+    Apply an inventory to the fake Slurm cluster instead of running Ansible.
+
+    A run takes ``latency`` seconds plus ``host_latency`` seconds per host
+    the run is limited to (or per host in the inventory for a full run).
+    """
+
+    latency = 0.0
+    host_latency = 0.0
+    runs = []  # ``limit`` of each run, for inspection
+
+    def __init__(self, playbook_root, inventory_filename, playbook_path,
+                 venv_path, verbosity=0, limit=None, **kwargs):
+        """Initialize the runner; arguments match ``AnsibleRunner``."""
+        self.inventory_filename = inventory_filename
+        self.limit = limit
+
+    def run(self):
+        """
+        Make the inventory's worker hosts the fake cluster's nodes.
+
+        :rtype: tuple of ``str``
+        :return: A tuple with the exit code and output.
+        """
+        servers = []
+        with open(self.inventory_filename, 'r') as f:
+            for line in f:
+                m = INVENTORY_HOST_RE.match(line)
+                if m:
+                    name, ip, host_vars = m.groups()
+                    servers.append((name, ip, dict(
+                        v.split('=', 1) for v in host_vars.split())))
+        hosts = len(self.limit.split(',')) if self.limit else len(servers)
+        time.sleep(self.latency + self.host_latency * hosts)
+        slurm.cluster.set_workers(servers)
+        FakeAnsibleRunner.runs.append(self.limit)
+        return (0, "Configured {0} host(s)".format(hosts))
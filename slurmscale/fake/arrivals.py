@@ -0,0 +1,142 @@
+"""Generate replayable streams of job submissions."""
+import heapq
+import math
+import random
+
+
+class ArrivalGenerator(object):
+    """
+    Generate job submissions with daily cycles and bursts.
+
+    Jobs arrive as a Poisson process whose rate follows a sinusoidal cycle
+    of ``period`` seconds around ``rate``, like a busy day and a quiet
+    night. On top of that, bursts (e.g., a user submitting an array job)
+    arrive at ``burst_rate`` per second, each submitting a number of jobs
+    within ``burst_spread`` seconds. The base rate defaults to the average
+    of ``rand.py``, which submits a job every 60 to 200 seconds.
+
+    The stream only depends on the parameters and the seed, so a generator
+    created with the same arguments replays the same jobs, which makes it
+    possible to evaluate scaling decisions offline and compare them across
+    runs.
+    """
+
+    def __init__(self, rate=1 / 130.0, amplitude=0.5, period=86400,
+                 burst_rate=1 / 21600.0, burst_size=(10, 50),
+                 burst_spread=300, run_time=(60, 3600), start=0, seed=0):
+        """
+        Initialize the generator.
+
+        :type rate: ``float``
+        :param rate: Average number of jobs submitted per second, excluding
+                     bursts.
+
+        :type amplitude: ``float``
+        :param amplitude: Relative swing of the rate over a period, between
+                          0 (constant rate) and 1.
+
+        :type period: ``float``
+        :param period: Length of the rate cycle, in seconds; the rate peaks
+                       a quarter into each period.
+
+        :type burst_rate: ``float``
+        :param burst_rate: Average number of bursts per second; 0 disables
+                           bursts.
+
+        :type burst_size: ``tuple`` of ``int``
+        :param burst_size: Smallest and largest number of jobs in a burst.
+
+        :type burst_spread: ``float``
+        :param burst_spread: Number of seconds over which a burst's jobs are
+                             submitted.
+
+        :type run_time: ``tuple`` of ``int``
+        :param run_time: Shortest and longest job run time, in seconds.
+
+        :type start: ``float``
+        :param start: Unix timestamp of the start of the stream.
+
+        :type seed: ``int``
+        :param seed: Seed for the stream.
+        """
+        self.rate = rate
+        self.amplitude = amplitude
+        self.period = period
+        self.burst_rate = burst_rate
+        self.burst_size = burst_size
+        self.burst_spread = burst_spread
+        self.run_time = run_time
+        self.start = start
+        self.seed = seed
+
+    def rate_at(self, when):
+        """Get the (non-burst) arrival rate at a point in time, per second."""
+        phase = 2 * math.pi * ((when - self.start) % self.period) / self.period
+        return self.rate * (1 + self.amplitude * math.sin(phase))
+
+    def _job(self, rnd, job_id, when):
+        """Create a job dict for a submission at ``when``."""
+        num_nodes = 1 if rnd.random() < 0.95 else 2
+        return {
+            'job_id': job_id,
+            'name': 'job{0}'.format(job_id),
+            'job_state': 'PENDING',
+            'state_reason': 'Resources',
+            'submit_time': int(when),
+            'eligible_time': int(when),
+            'run_time': 0,
+            'time_limit_secs': rnd.randint(*self.run_time),
+            'num_nodes': num_nodes,
+            'num_cpus': num_nodes * rnd.choice([1, 1, 2, 4, 8]),
+            'pn_min_cpus': 1,
+            'pn_min_memory': rnd.choice([1024, 2048, 4096, 8192]),
+            'partition': 'multi',
+        }
+
+    def __iter__(self):
+        """
+        Iterate over the submitted jobs, in order of submission.
+
+        The stream is endless; jobs are ``PENDING`` job dicts whose
+        ``time_limit_secs`` is the time the job runs for.
+        """
+        rnd = random.Random(self.seed)
+        peak = self.rate * (1 + self.amplitude)
+        burst_jobs = []  # Heap of pending burst submission times
+        next_burst = (self.start + rnd.expovariate(self.burst_rate)
+                      if self.burst_rate else float('inf'))
+        when = self.start
+        job_id = 0
+        while True:
+            # Thinning: draw candidates at the peak rate and keep each with
+            # probability rate / peak
+            when += rnd.expovariate(peak)
+            while rnd.random() * peak > self.rate_at(when):
+                when += rnd.expovariate(peak)
+            while next_burst < when:
+                for _ in range(rnd.randint(*self.burst_size)):
+                    heapq.heappush(burst_jobs, next_burst +
+                                   rnd.random() * self.burst_spread)
+                next_burst += rnd.expovariate(self.burst_rate)
+            while burst_jobs and burst_jobs[0] < when:
+                job_id += 1
+                yield self._job(rnd, job_id, heapq.heappop(burst_jobs))
+            job_id += 1
+            yield self._job(rnd, job_id, when)
+
+    def until(self, end):
+        """
+        Get the jobs submitted before ``end``.
+
+        :type end: ``float``
+        :param end: Unix timestamp at which to stop.
+
+        :rtype: ``list`` of ``dict``
+        :return: Job dicts, in order of submission.
+        """
+        jobs = []
+        for job in self:
+            if job['submit_time'] >= end:
+                break
+            jobs.append(job)
+        return jobs
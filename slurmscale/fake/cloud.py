@@ -0,0 +1,112 @@
+"""An in-memory stand-in for the CloudBridge provider and ssh readiness."""
+import itertools
+import threading
+import time
+
+from bunch import Bunch
+
+
+class FakeInstance(object):
+    """Stand-in for a ``CloudBridge.Instance`` object."""
+
+    def __init__(self, provider, name, ip):
+        """Initialize a new, running instance."""
+        self._provider = provider
+        self.id = ip
+        self.name = name
+        self.private_ips = [ip]
+        self.state = 'running'
+
+    def __repr__(self):
+        """Return human-readable FakeInstance representation."""
+        return "<FakeInstance {0} ({1})>".format(self.name, self.private_ips)
+
+    def wait_till_ready(self, timeout=None, interval=None):
+        """Wait for the simulated boot time."""
+        if self._provider.boot_time:
+            time.sleep(self._provider.boot_time)
+
+    def wait_for(self, target_states, terminal_states=None, timeout=None,
+                 interval=None):
+        """Return immediately; state changes are instantaneous."""
+        return True
+
+    def refresh(self):
+        """Refresh the instance state."""
+        self._provider.api_call()
+        if self.id not in self._provider.instances:
+            self.state = 'unknown'
+
+    def terminate(self):
+        """Terminate the instance."""
+        self._provider.api_call()
+        with self._provider.lock:
+            self._provider.instances.pop(self.id, None)
+        self.state = 'terminated'
+
+
+class FakeProvider(object):
+    """
+    Stand-in for the parts of a CloudBridge provider used by the library.
+
+    Each API call takes ``api_latency`` seconds and each instance takes
+    ``boot_time`` seconds to become ready.
+    """
+
+    def __init__(self, api_latency=0.0, boot_time=0.0, ip_prefix='10.1'):
+        """Initialize a provider with no instances."""
+        self.api_latency = api_latency
+        self.boot_time = boot_time
+        self.calls = 0
+        self.lock = threading.Lock()
+        self.instances = {}  # ID -> FakeInstance
+        self._ips = ("{0}.{1}.{2}".format(ip_prefix, i // 250, i % 250 + 2)
+                     for i in itertools.count())
+        self.compute = Bunch(
+            images=Bunch(get=lambda image_id: Bunch(id=image_id)),
+            instances=Bunch(create=self._create, list=self._list))
+
+    def api_call(self):
+        """Record a simulated API call and wait for its latency."""
+        with self.lock:
+            self.calls += 1
+        if self.api_latency:
+            time.sleep(self.api_latency)
+
+    def _create(self, name, image=None, instance_type=None, key_pair=None,
+                security_groups=None, subnet=None):
+        """Launch a new instance."""
+        self.api_call()
+        with self.lock:
+            instance = FakeInstance(self, name, next(self._ips))
+            self.instances[instance.id] = instance
+        return instance
+
+    def _list(self):
+        """List all instances."""
+        self.api_call()
+        with self.lock:
+            return list(self.instances.values())
+
+
+class FakeReadinessProbe(object):
+    """Stand-in for :class:`.SSHReadinessProbe` reporting all hosts ready."""
+
+    def __init__(self, latency=0.0):
+        """
+        Initialize the probe.
+
+        :type latency: ``float``
+        :param latency: Number of seconds hosts take to become ready.
+        """
+        self.latency = latency
+
+    def check(self, host):
+        """Report the host as ready."""
+        return True
+
+    def wait_all(self, hosts):
+        """Wait for the simulated latency and report all hosts as ready."""
+        if hosts and self.latency:
+            time.sleep(self.latency)
+        return dict((host, True) for host in hosts)
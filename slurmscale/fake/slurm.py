@@ -0,0 +1,218 @@
+"""An in-memory stand-in for the parts of ``pyslurm`` used by the library."""
+import collections
+import random
+import threading
+import time
+
+from slurmscale.util import hostlist
+
+NODE_STATE_DOWN = 0x0001
+NODE_RESUME = 0x0100
+NODE_STATE_DRAIN = 0x0200
+
+_STATE_NAMES = {
+    NODE_STATE_DOWN: 'DOWN',
+    NODE_RESUME: 'IDLE',
+    NODE_STATE_DRAIN: 'DRAINED',
+}
+
+
+def _next_state(current, update):
+    """Get a node's state after an update, as Slurm reports it."""
+    busy = current in ('ALLOCATED', 'MIXED', 'DRAINING')
+    if update == NODE_STATE_DRAIN:
+        return 'DRAINING' if busy else 'DRAINED'
+    if update == NODE_RESUME:
+        return 'ALLOCATED' if busy else 'IDLE'
+    return _STATE_NAMES.get(update, current)
+
+
+class FakeCluster(object):
+    """
+    State of a simulated Slurm cluster.
+
+    Every call through the fake ``pyslurm`` classes is counted in ``calls``
+    and delayed by ``latency`` seconds to approximate controller RPCs.
+    """
+
+    def __init__(self, nodes=0, jobs=0, prefix='jetstream-iu-large',
+                 latency=0.0, pending_ratio=0.2, node_cpus=10,
+                 node_memory=30720, seed=0):
+        """
+        Initialize the cluster.
+
+        :type nodes: ``int``
+        :param nodes: Number of worker nodes to create.
+
+        :type jobs: ``int``
+        :param jobs: Number of jobs to create.
+
+        :type prefix: ``str``
+        :param prefix: Prefix for the names of created nodes.
+
+        :type latency: ``float``
+        :param latency: Number of seconds each simulated RPC takes.
+
+        :type pending_ratio: ``float``
+        :param pending_ratio: Fraction of created jobs that are pending; the
+                              rest are running.
+
+        :type node_cpus: ``int``
+        :param node_cpus: Number of CPUs on each node.
+
+        :type node_memory: ``int``
+        :param node_memory: Memory on each node, in MB.
+
+        :type seed: ``int``
+        :param seed: Seed for the generated job mix.
+        """
+        self.latency = latency
+        self.node_cpus = node_cpus
+        self.node_memory = node_memory
+        self.calls = collections.Counter()
+        self.nodes = {}
+        self.jobs = {}
+        self.partitions = {'multi': {'name': 'multi', 'state': 'UP'}}
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+        for i in range(nodes):
+            self.add_node("{0}{1}".format(prefix, i),
+                          "10.0.{0}.{1}".format(i // 250, i % 250 + 2))
+        self.add_jobs(jobs, pending_ratio)
+
+    def rpc(self, name):
+        """Record a simulated RPC and wait for its latency."""
+        with self._lock:
+            self.calls[name] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def add_node(self, name, ip, state='IDLE'):
+        """Add a node to the cluster."""
+        with self._lock:
+            self.nodes[name] = {
+                'name': name,
+                'node_addr': ip,
+                'node_hostname': name,
+                'state': state,
+                'cpus': self.node_cpus,
+                'real_memory': self.node_memory,
+                'partitions': ['multi'],
+            }
+
+    def set_workers(self, servers):
+        """
+        Make the supplied servers the cluster's nodes.
+
+        Existing nodes keep their state, new nodes start ``IDLE`` and nodes
+        not among the servers are removed, as after a Slurm reconfiguration.
+
+        :type servers: ``list`` of ``tuple``
+        :param servers: ``(name, ip, host_vars)`` tuples; new nodes get the
+                        ``slurm_cpus`` and ``slurm_memory`` of their host
+                        variables, if set.
+        """
+        with self._lock:
+            nodes = {}
+            for name, ip, host_vars in servers:
+                node = self.nodes.get(name)
+                if node is None or node['node_addr'] != ip:
+                    node = {'name': name, 'node_addr': ip,
+                            'node_hostname': name, 'state': 'IDLE',
+                            'cpus': int(host_vars.get('slurm_cpus',
+                                                      self.node_cpus)),
+                            'real_memory': int(host_vars.get(
+                                'slurm_memory', self.node_memory)),
+                            'partitions': ['multi']}
+                nodes[name] = node
+            self.nodes = nodes
+
+    def add_jobs(self, count, pending_ratio=0.2):
+        """Add ``count`` jobs with a mix of states and resource requests."""
+        now = int(time.time())
+        with self._lock:
+            start = max(self.jobs) + 1 if self.jobs else 1
+            for job_id in range(start, start + count):
+                pending = self._random.random() < pending_ratio
+                num_nodes = 1 if self._random.random() < 0.95 else 2
+                self.jobs[job_id] = {
+                    'job_id': job_id,
+                    'name': 'job{0}'.format(job_id),
+                    'job_state': 'PENDING' if pending else 'RUNNING',
+                    'state_reason': (self._random.choice(
+                        ['Resources', 'Priority', 'Dependency'])
+                        if pending else 'None'),
+                    'submit_time': now - self._random.randint(0, 3600),
+                    'eligible_time': now - self._random.randint(0, 3600),
+                    'run_time': 0 if pending else
+                    self._random.randint(0, 3600),
+                    'num_nodes': num_nodes,
+                    'num_cpus': num_nodes * self._random.choice(
+                        [1, 1, 2, 4, 8]),
+                    'pn_min_cpus': 1,
+                    'pn_min_memory': self._random.choice(
+                        [1024, 2048, 4096, 8192]),
+                    'partition': 'multi',
+                }
+
+
+# Cluster used by the fake ``pyslurm`` classes
+cluster = FakeCluster()
+
+
+class node(object):
+    """Stand-in for ``pyslurm.node``."""
+
+    def get(self):
+        """Return a dict of node dicts, keyed by node name."""
+        cluster.rpc('node.get')
+        with cluster._lock:
+            return dict((k, dict(v)) for k, v in cluster.nodes.items())
+
+    def get_node(self, name):
+        """Return a dict with the named node's dict, keyed by its name."""
+        cluster.rpc('node.get_node')
+        with cluster._lock:
+            n = cluster.nodes.get(name)
+            return {name: dict(n)} if n else {}
+
+    def update(self, node_dict):
+        """Update the state of the nodes in ``node_dict['node_names']``."""
+        cluster.rpc('node.update')
+        names = hostlist.expand(node_dict.get('node_names', ''))
+        with cluster._lock:
+            if any(n not in cluster.nodes for n in names):
+                return -1
+            for n in names:
+                cluster.nodes[n]['state'] = _next_state(
+                    cluster.nodes[n]['state'], node_dict.get('node_state'))
+                if node_dict.get('reason'):
+                    cluster.nodes[n]['reason'] = node_dict['reason']
+        return 0
+
+
+class job(object):
+    """Stand-in for ``pyslurm.job``."""
+
+    def get(self):
+        """Return a dict of job dicts, keyed by job ID."""
+        cluster.rpc('job.get')
+        with cluster._lock:
+            return dict((k, dict(v)) for k, v in cluster.jobs.items())
+
+    def find_id(self, job_id):
+        """Return a list with the dict of the job with the supplied ID."""
+        cluster.rpc('job.find_id')
+        with cluster._lock:
+            j = cluster.jobs.get(int(job_id))
+            return [dict(j)] if j else []
+
+
+class partition(object):
+    """Stand-in for ``pyslurm.partition``."""
+
+    def get(self):
+        """Return a dict of partition dicts, keyed by partition name."""
+        cluster.rpc('partition.get')
+        with cluster._lock:
+            return dict((k, dict(v)) for k, v in cluster.partitions.items())
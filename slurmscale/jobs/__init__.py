@@ -2,3 +2,4 @@
 
 from .jobs import Jobs  # noqa
 from .job import Job  # noqa
+from .summary import JobSummary  # noqa
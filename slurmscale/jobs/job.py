@@ -1,6 +1,9 @@
 """Represents a single job."""
 import pyslurm
 
+from slurmscale.util import metrics
+from slurmscale.util.snapshot import snapshot
+
 
 class Job(object):
     """An encapsulated Job object."""
@@ -33,7 +36,7 @@ class Job(object):
                  ``CONFIGURING``, ``COMPLETING``, ``COMPLETED``, ``FAILED``,
                  ``TIMEOUT``, ``PREEMPTED``, ``NODE_FAIL`` and ``SPECIAL_EXIT``
         """
-        self.update()  # Always get fresh data
+        self.update()  # Get data from the current snapshot
         return self._job.get('job_state')
 
     @property
@@ -54,7 +57,7 @@ class Job(object):
         :rtype: ``int``
         :return: Runtime of the job.
         """
-        self.update()  # Always get fresh data
+        self.update()  # Get data from the current snapshot
         return self._job.get('run_time', 0)
 
     @property
@@ -69,9 +72,19 @@ class Job(object):
         sr = self._job.get('state_reason')
         return None if sr == 'None' else sr  # Map string "None" to None
 
-    def update(self):
-        """Refresh info about the job by querying the scheduler."""
-        self._job = pyslurm.job().find_id(str(self.id))[0]
+    def update(self, fresh=False):
+        """
+        Refresh info about the job from the current cluster snapshot.
+
+        :type fresh: ``bool``
+        :param fresh: If set, query the scheduler for this job directly
+                      instead of reading it from the shared cluster snapshot.
+        """
+        if fresh:
+            self._job = pyslurm.job().find_id(str(self.id))[0]
+            metrics.inc('slurmscale_pyslurm_calls_total', call='job.find_id')
+        else:
+            self._job = snapshot.jobs().get(self.id, self._job)
 
     def show(self):
         """
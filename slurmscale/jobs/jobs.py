@@ -1,18 +1,17 @@
 """Get info about jobs running on this cluster."""
-import pyslurm
-
 from job import Job
+from summary import JobSummary
+from slurmscale.util.snapshot import snapshot
 
 
 class Jobs(object):
     """A service object to inspect jobs."""
 
-    @property
-    def _jobs(self):
-        """Fetch fresh data."""
-        return pyslurm.job().get()
+    def _jobs(self, fresh=False):
+        """Get job data from the current cluster snapshot."""
+        return snapshot.jobs(fresh=fresh)
 
-    def list(self, states=None):
+    def list(self, states=None, fresh=False):
         """
         List the current jobs on the cluster.
 
@@ -22,11 +21,14 @@ class Jobs(object):
                       ``COMPLETING``, ``COMPLETED``, ``FAILED``, ``TIMEOUT``,
                       ``PREEMPTED``, ``NODE_FAIL`` and ``SPECIAL_EXIT``.
 
+        :type fresh: ``bool``
+        :param fresh: If set, bypass the cluster snapshot and query Slurm.
+
         :rtype: List of ``Job``
         :return: A list of current cluster jobs, possibly filtered by supplied
                  states.
         """
-        current_jobs = self._jobs
+        current_jobs = self._jobs(fresh)
         jobs = []
         if states:
             for i in current_jobs:
@@ -35,3 +37,24 @@ class Jobs(object):
         else:
             jobs = [Job(current_jobs[j]) for j in current_jobs]
         return jobs
+
+    def summary(self, fresh=False):
+        """
+        Summarize the current jobs on the cluster.
+
+        Unlike ``list``, this does not create a ``Job`` object per job and is
+        the cheaper way to answer aggregate questions about a large queue,
+        for example::
+
+            summary = Jobs().summary()
+            waiting = summary.waiting(grace=300)
+            summary.count_by_partition(waiting)
+            summary.total_cpus(waiting)
+
+        :type fresh: ``bool``
+        :param fresh: If set, bypass the cluster snapshot and query Slurm.
+
+        :rtype: ``JobSummary``
+        :return: A column-oriented summary of all the current jobs.
+        """
+        return JobSummary(self._jobs(fresh))
@@ -0,0 +1,224 @@
+"""A compact, column-oriented summary of the job queue."""
+from array import array
+import time
+
+from slurmscale.util.pools import job_partitions
+from slurmscale.util.sizing import WAITING_REASONS
+from slurmscale.util.sizing import job_request
+from slurmscale.util.sizing import job_tasks
+
+
+class JobSummary(object):
+    """
+    Job queue data stored as one compact array per field.
+
+    The summary is built in a single pass over the job dicts provided by
+    Slurm, without creating a ``Job`` object per job, and answers aggregate
+    questions about the queue by scanning the arrays. String fields (state,
+    reason and partition) are stored as small integer codes. A pending
+    array job, which Slurm lists as a single record, counts as one job per
+    pending task.
+    """
+
+    def __init__(self, jobs):
+        """
+        Build the summary.
+
+        :type jobs: ``dict``
+        :param jobs: A dict of job dicts, as returned by
+                     ``pyslurm.job().get()``.
+        """
+        values = list(jobs.values())
+        columns = list(zip(*[(j.get('job_id') or 0, j.get('job_state'),
+                              j.get('state_reason'), j.get('partition'),
+                              j.get('eligible_time') or 0,
+                              j.get('array_task_str'))
+                             for j in values])) or [()] * 6
+        self._codes = {}
+        self.job_ids = array('l', columns[0])
+        self.states = self._encode('state', columns[1])
+        self.reasons = self._encode('reason', columns[2])
+        self.partitions = self._encode('partition', columns[3])
+        self.eligible_times = array('l', columns[4])
+        self.tasks = array('l', [
+            job_tasks({'array_task_str': spec}, throttle=False) if spec
+            else 1 for spec in columns[5]])
+        self._values = values
+        self._requests = None
+
+    def __len__(self):
+        """Return the number of jobs in the summary."""
+        return len(self.job_ids)
+
+    def _request_columns(self):
+        """Build the requested resource columns on first use."""
+        if self._requests is None:
+            nodes, cpus, memory = array('l'), array('l'), array('l')
+            for job, tasks in zip(self._values, self.tasks):
+                n, cpus_per_node, mem = job_request(job)
+                nodes.append(n)
+                cpus.append(tasks * max(int(job.get('num_cpus') or 1),
+                                        n * cpus_per_node))
+                memory.append(mem)
+            self._requests = (nodes, cpus, memory)
+            self._values = None
+        return self._requests
+
+    @property
+    def nodes(self):
+        """Number of nodes requested by each job (or array task)."""
+        return self._request_columns()[0]
+
+    @property
+    def cpus(self):
+        """Total number of CPUs requested by each job, across its tasks."""
+        return self._request_columns()[1]
+
+    @property
+    def memory(self):
+        """Memory requested per node by each job, in MB."""
+        return self._request_columns()[2]
+
+    def _encode(self, field, column):
+        """Store a string column as an array of small integer codes."""
+        codes = self._codes[field] = dict(
+            (value, code) for code, value in enumerate(set(column)))
+        return array('h', map(codes.__getitem__, column))
+
+    def _codes_for(self, field, values):
+        """Return the set of codes for the supplied field values."""
+        codes = self._codes[field]
+        return set(codes[v] for v in values if v in codes)
+
+    def _partition_codes(self, partition):
+        """Return the codes of partition values listing ``partition``."""
+        return set(code for value, code in self._codes['partition'].items()
+                   if partition in job_partitions({'partition': value}))
+
+    def _names(self, field):
+        """Return a list mapping codes back to field values."""
+        names = [None] * len(self._codes[field])
+        for value, code in self._codes[field].items():
+            names[code] = value
+        return names
+
+    def select(self, states=None, reasons=None, partition=None,
+               min_age=None, now=None):
+        """
+        Get the positions of jobs matching all of the supplied criteria.
+
+        :type states: ``list`` of ``str``
+        :param states: Job states to include.
+
+        :type reasons: ``list`` of ``str``
+        :param reasons: Job state reasons to include.
+
+        :type partition: ``str``
+        :param partition: Partition to include; jobs submitted to several
+                          partitions are included if it is one of them.
+
+        :type min_age: ``int``
+        :param min_age: Include only jobs eligible for more than this many
+                        seconds.
+
+        :type now: ``int``
+        :param now: Current time as a Unix timestamp; defaults to the clock.
+
+        :rtype: ``list`` of ``int``
+        :return: Positions of the matching jobs in the summary arrays.
+        """
+        selected = range(len(self))
+        if states is not None:
+            codes = self._codes_for('state', states)
+            selected = [i for i in selected if self.states[i] in codes]
+        if reasons is not None:
+            codes = self._codes_for('reason', reasons)
+            selected = [i for i in selected if self.reasons[i] in codes]
+        if partition is not None:
+            codes = self._partition_codes(partition)
+            selected = [i for i in selected if self.partitions[i] in codes]
+        if min_age is not None:
+            cutoff = (int(time.time()) if now is None else now) - min_age
+            selected = [i for i in selected
+                        if self.eligible_times[i] < cutoff]
+        return list(selected)
+
+    def waiting(self, grace=300, now=None):
+        """
+        Get the positions of jobs waiting for capacity.
+
+        These are ``PENDING`` jobs with a ``Resources`` or ``Priority``
+        reason that have been eligible to run for more than ``grace``
+        seconds.
+
+        :rtype: ``list`` of ``int``
+        :return: Positions of the waiting jobs in the summary arrays.
+        """
+        return self.select(states=['PENDING'], reasons=WAITING_REASONS,
+                           min_age=grace, now=now)
+
+    def count_by_partition(self, selected=None):
+        """
+        Count jobs per partition.
+
+        :type selected: ``list`` of ``int``
+        :param selected: Positions of the jobs to count; all jobs if not
+                         supplied.
+
+        :rtype: ``dict``
+        :return: Number of jobs keyed by partition name. Jobs submitted to
+                 several partitions count towards each of them; jobs with no
+                 partition are counted under ``None``. Pending array jobs
+                 count once per pending task.
+        """
+        names = [job_partitions({'partition': name}) or [None]
+                 for name in self._names('partition')]
+        counts = {}
+        for i in (range(len(self)) if selected is None else selected):
+            for name in names[self.partitions[i]]:
+                counts[name] = counts.get(name, 0) + self.tasks[i]
+        return counts
+
+    def total_cpus(self, selected=None):
+        """
+        Sum the CPUs requested by jobs.
+
+        :type selected: ``list`` of ``int``
+        :param selected: Positions of the jobs to include; all jobs if not
+                         supplied.
+
+        :rtype: ``int``
+        :return: Total number of requested CPUs.
+        """
+        if selected is None:
+            return sum(self.cpus)
+        cpus = self.cpus
+        return sum(cpus[i] for i in selected)
+
+    def age_percentiles(self, percentiles=(50, 90, 99), selected=None,
+                        now=None):
+        """
+        Compute percentiles of the time jobs have been eligible to run.
+
+        :type percentiles: ``list`` of ``int``
+        :param percentiles: Percentiles to compute, between 0 and 100.
+
+        :type selected: ``list`` of ``int``
+        :param selected: Positions of the jobs to include; all jobs if not
+                         supplied.
+
+        :type now: ``int``
+        :param now: Current time as a Unix timestamp; defaults to the clock.
+
+        :rtype: ``dict``
+        :return: Age in seconds keyed by percentile; empty if no jobs match.
+        """
+        now = int(time.time()) if now is None else now
+        if selected is None:
+            selected = range(len(self))
+        ages = sorted(now - self.eligible_times[i] for i in selected)
+        if not ages:
+            return {}
+        return dict((p, ages[min(len(ages) - 1,
+                                 max(0, -(-p * len(ages) // 100) - 1))])
+                    for p in percentiles)
@@ -2,3 +2,4 @@
 
 from .nodes import Nodes  # noqa
 from .node import Node  # noqa
+from .drain import DrainPipeline  # noqa
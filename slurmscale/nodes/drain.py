@@ -0,0 +1,273 @@
+"""Remove nodes from the cluster once they finish their jobs."""
+import threading
+import time
+
+import pyslurm
+from bunch import Bunch
+
+from .node import Node
+from .nodes import Nodes
+from slurmscale.util import journal
+from slurmscale.util.pools import get_pools
+from slurmscale.util.snapshot import snapshot
+
+import slurmscale as ss
+
+import logging
+log = logging.getLogger(__name__)
+
+# Slurm node states (with any ``*``, ``~``, ``#`` or similar flag suffix
+# removed) of drained nodes that are not running any jobs
+DRAINED_STATES = ('DRAINED', 'IDLE+DRAIN', 'DOWN', 'DOWN+DRAIN')
+
+
+def is_drained(node):
+    """
+    Check if a draining node has finished all its jobs.
+
+    :type node: ``dict``
+    :param node: A node dict, as provided by ``pyslurm.node().get()``.
+
+    :rtype: ``bool``
+    :return: ``True`` if the node is drained or down.
+    """
+    state = node.get('state', '').rstrip('*~#!%$@^-')
+    if state in DRAINED_STATES:
+        return True
+    return state == 'DRAIN' and not node.get('alloc_cpus')
+
+
+def is_draining(node):
+    """
+    Check if a node is (still) draining or drained.
+
+    :rtype: ``bool``
+    :return: ``False`` if the drain was cancelled, e.g., by an administrator
+             resuming the node.
+    """
+    state = node.get('state', '')
+    return 'DRAIN' in state or state.startswith('DOWN')
+
+
+class DrainPipeline(object):
+    """
+    Gracefully remove nodes from the cluster.
+
+    Nodes are first drained in bulk, so they take no new jobs, and then
+    watched through cluster snapshots with :meth:`poll`. Each node is
+    removed as soon as it finishes its jobs, or once its deadline passes;
+    all the nodes ready at the same time are removed with a single
+    reconfiguration and a single round of instance deletions. Nodes whose
+    removal fails stay in the pipeline and are retried on the next poll.
+    """
+
+    # Number of polls the VM of a node that has left the cluster is deleted
+    # on before it is left to :meth:`.Nodes.recover`
+    DELETE_ATTEMPTS = 3
+
+    def __init__(self, nodes=None, timeout=None):
+        """
+        Initialize an empty pipeline.
+
+        :type nodes: :class:`.Nodes`
+        :param nodes: Service object used to drain and remove nodes.
+
+        :type timeout: ``float``
+        :param timeout: Number of seconds a node may take to finish its jobs
+                        before it is removed regardless. If not supplied,
+                        ``drain_timeout`` config value is used.
+        """
+        self._nodes = nodes or Nodes()
+        self.timeout = float(timeout if timeout is not None else
+                             ss.config.get_config_value('drain_timeout',
+                                                        3600))
+        self._lock = threading.Lock()
+        # node name -> Bunch(ip, started, deadline, delete, removing,
+        #                    attempts)
+        self._draining = {}
+
+    def __len__(self):
+        """Return the number of nodes in the pipeline."""
+        with self._lock:
+            return len(self._draining)
+
+    def names(self):
+        """
+        Get the names of the nodes in the pipeline.
+
+        Nodes that are being removed are included until their removal is
+        complete.
+
+        :rtype: ``list`` of ``str``
+        :return: Node names, most recently drained first.
+        """
+        with self._lock:
+            return [name for name, _ in sorted(
+                self._draining.items(), key=lambda item: -item[1].started)]
+
+    def drain(self, nodes, delete=True, timeout=None):
+        """
+        Drain nodes and add them to the pipeline.
+
+        :type nodes: ``list`` of :class:`.Node`
+        :param nodes: Nodes to drain and then remove.
+
+        :type delete: ``bool``
+        :param delete: If ``True``, also delete the VMs of the nodes.
+
+        :type timeout: ``float``
+        :param timeout: Deadline for the nodes, in seconds, instead of the
+                        pipeline's ``timeout``.
+
+        :rtype: ``list`` of ``str``
+        :return: Names of the nodes that started draining.
+        """
+        with self._lock:
+            nodes = [n for n in nodes if n.name not in self._draining]
+        if not nodes:
+            return []
+        results = self._nodes.drain(nodes, delete=delete)
+        now = time.time()
+        deadline = now + (timeout if timeout is not None else self.timeout)
+        names = [n.name for n in nodes if results.get(n.name)]
+        with self._lock:
+            for node in nodes:
+                if node.name in names:
+                    self._draining[node.name] = Bunch(
+                        ip=node.ip, started=now, deadline=deadline,
+                        delete=delete, removing=False, attempts=0)
+        log.info("Draining node(s) {0}".format(names))
+        return names
+
+    def resume(self, count=None, pool=None):
+        """
+        Take nodes out of the pipeline and return them to service.
+
+        Used to reclaim draining nodes instead of provisioning new ones when
+        jobs are waiting. Nodes drained most recently, which are most likely
+        still running jobs, are resumed first.
+
+        :type count: ``int``
+        :param count: Maximum number of nodes to resume; all if not supplied.
+
+        :type pool: :class:`.pools.NodePool`
+        :param pool: If supplied, only resume nodes of this pool; nodes that
+                     match no pool belong to the default pool.
+
+        :rtype: ``list`` of ``str``
+        :return: Names of the resumed nodes.
+        """
+        pools = get_pools()
+        with self._lock:
+            names = [name for name, entry in sorted(
+                self._draining.items(), key=lambda item: -item[1].started)
+                if not entry.removing and
+                (pool is None or pools.for_node(name) is pool)]
+            names = names[:count] if count is not None else names
+            entries = dict((name, self._draining.pop(name)) for name in names)
+        if not names:
+            return []
+        results = self._nodes.set_state(names, pyslurm.NODE_RESUME)
+        resumed = [name for name in names if results.get(name)]
+        self._nodes._record([Bunch(name=name) for name in resumed],
+                            journal.CONFIGURED, operation=journal.ADD)
+        with self._lock:
+            for name in names:
+                if name not in resumed:
+                    log.warn("Could not resume node {0}".format(name))
+                    self._draining[name] = entries[name]
+        log.info("Resumed draining node(s) {0}".format(resumed))
+        return resumed
+
+    def poll(self, now=None):
+        """
+        Remove nodes that have finished their jobs or passed their deadline.
+
+        :type now: ``float``
+        :param now: Current time as a Unix timestamp; defaults to the clock.
+
+        Nodes that have left the cluster by other means, e.g., by a removal
+        that could not delete their VM, are recorded as removed and their VMs
+        are deleted if their removal called for it.
+
+        :rtype: ``list`` of ``str``
+        :return: Names of the nodes removed from the cluster.
+        """
+        now = time.time() if now is None else now
+        data = snapshot.nodes()
+        ready = {True: [], False: []}  # delete -> nodes
+        gone = []
+        with self._lock:
+            for name, entry in list(self._draining.items()):
+                if entry.removing:
+                    continue
+                node = data.get(name)
+                if node is None:
+                    gone.append(name)
+                    entry.removing = True
+                elif not is_draining(node):
+                    log.info("Node {0} is no longer draining; leaving it in "
+                             "the cluster".format(name))
+                    del self._draining[name]
+                    self._nodes._record([Bunch(name=name)],
+                                        journal.CONFIGURED,
+                                        operation=journal.ADD)
+                elif is_drained(node) or now >= entry.deadline:
+                    if not is_drained(node):
+                        log.warn("Node {0} did not finish its jobs within "
+                                 "the drain deadline".format(name))
+                    ready[entry.delete].append(Node(node))
+                    entry.removing = True
+        removed = self._finish(gone)
+        for delete, nodes in ready.items():
+            if not nodes:
+                continue
+            names = [n.name for n in nodes]
+            log.info("Removing drained node(s) {0}".format(names))
+            failed = self._nodes._remove(nodes, delete)
+            if failed:
+                log.warn("Could not remove drained node(s) {0}; retrying on "
+                         "the next poll".format(failed))
+            removed += [name for name in names if name not in failed]
+            self._done(names, failed)
+        return removed
+
+    def _finish(self, names):
+        """
+        Complete the removal of nodes that have left the cluster.
+
+        :rtype: ``list`` of ``str``
+        :return: Names of the nodes whose removal is complete.
+        """
+        if not names:
+            return []
+        with self._lock:
+            entries = dict((name, self._draining[name]) for name in names)
+        log.info("Draining node(s) {0} left the cluster".format(names))
+        nodes = [Bunch(name=name, ip=entries[name].ip) for name in names]
+        self._nodes._record(nodes, journal.REMOVED)
+        failed = []
+        delete = [n for n in nodes if entries[n.name].delete]
+        if delete:
+            deleted = self._nodes._provision_manager.delete(delete)
+            self._nodes._record([n for n in delete if deleted.get(n.name)],
+                                journal.DELETED)
+            failed = [n.name for n in delete if not deleted.get(n.name)]
+        with self._lock:
+            for name in failed[:]:
+                entries[name].attempts += 1
+                if entries[name].attempts >= self.DELETE_ATTEMPTS:
+                    log.warn("Could not delete the VM of node {0}; leaving "
+                             "it to recovery".format(name))
+                    failed.remove(name)
+        self._done(names, failed)
+        return [name for name in names if name not in failed]
+
+    def _done(self, names, failed):
+        """Drop removed nodes from the pipeline and requeue failed ones."""
+        with self._lock:
+            for name in names:
+                if name in failed:
+                    self._draining[name].removing = False
+                else:
+                    self._draining.pop(name, None)
@@ -1,6 +1,9 @@
 """Represents and manage a worker node."""
 import pyslurm
 
+from slurmscale.util import metrics
+from slurmscale.util.snapshot import snapshot
+
 
 class Node(object):
     """Represent a worker node."""
@@ -17,6 +20,14 @@ class Node(object):
         """Compare nodes based on their name and IP."""
         return self.name == other.name and self.ip == other.ip
 
+    def __ne__(self, other):
+        """Compare nodes based on their name and IP."""
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        """Hash nodes based on their name and IP, consistent with ``==``."""
+        return hash((self.name, self.ip))
+
     @property
     def name(self):
         """Name of the node, as reported by Slurm."""
@@ -33,6 +44,16 @@ class Node(object):
         """IP address for the node."""
         return self._node.get('node_addr')
 
+    @property
+    def cpus(self):
+        """Number of CPUs of the node, as configured in Slurm."""
+        return self._node.get('cpus')
+
+    @property
+    def memory(self):
+        """Memory of the node in MB, as configured in Slurm."""
+        return self._node.get('real_memory')
+
     def _set_node_state(self, state, reason=None):
         """Set the node state to the provided argument."""
         node_dict = {
@@ -43,15 +64,25 @@ class Node(object):
             node_dict['reason'] = reason
 
         rc = pyslurm.node().update(node_dict)
+        metrics.inc('slurmscale_pyslurm_calls_total', call='node.update')
+        snapshot.refresh('nodes')
         if rc == -1:
             return False
         return True
 
-    def update(self):
+    def update(self, fresh=False):
         """
         Refresh reference to the underlying node.
+
+        :type fresh: ``bool``
+        :param fresh: If set, query Slurm for this node directly instead of
+                      reading it from the shared cluster snapshot.
         """
-        self._node = pyslurm.node().get_node(self.name).get(self.name, {})
+        if fresh:
+            self._node = pyslurm.node().get_node(self.name).get(self.name, {})
+            metrics.inc('slurmscale_pyslurm_calls_total', call='node.get_node')
+        else:
+            self._node = snapshot.nodes().get(self.name, {})
 
     def enable(self):
         """
@@ -1,28 +1,44 @@
 """Represent and manage nodes of the target cluster."""
-import re
+import threading
+import time
 from bunch import Bunch
 
 import pyslurm
 
 from .node import Node
+from slurmscale.util import hostlist
+from slurmscale.util import journal
+from slurmscale.util import metrics
 from slurmscale.util.config_manager import ConfigManagerFactory
+from slurmscale.util.flavors import get_flavor
+from slurmscale.util.names import get_allocator
+from slurmscale.util.pools import get_pools
 from slurmscale.util.provision_manager import ProvisionManagerFactory
+from slurmscale.util.snapshot import snapshot
 
 import slurmscale as ss
 
 import logging
 log = logging.getLogger(__name__)
 
+# Serializes changes to cluster membership (computing the new set of nodes
+# and configuring it) across threads
+_membership_lock = threading.RLock()
+
 
 class Nodes(object):
     """A service object to inspect and manage worker nodes."""
 
-    def __init__(self, provision_manager_name=None, config_manager_name=None):
+    def __init__(self, provision_manager_name=None, config_manager_name=None,
+                 warm_pool=None, provision_manager=None, config_manager=None,
+                 node_journal=None, pool=None):
         """
         Initialize manager names.
 
         Nodes are managed by a provision manager and a config manager. Supply
-        the class names for the respective managers.
+        the class names for the respective managers. The managers are only
+        created when first needed, so inspecting nodes does not set up a
+        cloud provider.
 
         :type provision_manager_name: ``str``
         :param: provision_manager_name: Class name for the manager to be used
@@ -35,32 +51,100 @@ class Nodes(object):
                                     when provisioning nodes. Only
                                     ``GalaxyJetstreamIUConfigManager`` is
                                     supported at the moment.
+
+        :type warm_pool: :class:`.warm_pool.WarmPool`
+        :param warm_pool: A pool of standby instances to claim from before
+                          provisioning new ones when adding nodes.
+
+        :type provision_manager: :class:`.provision_manager.ProvisionManager`
+        :param provision_manager: An already created provision manager to use
+                                  instead of one named by
+                                  ``provision_manager_name``.
+
+        :type config_manager: :class:`.config_manager.ConfigManager`
+        :param config_manager: An already created config manager to use
+                               instead of one named by
+                               ``config_manager_name``.
+
+        :type node_journal: :class:`.journal.Journal`
+        :param node_journal: Journal recording node lifecycle transitions
+                             instead of the shared one (see
+                             :func:`.journal.get_journal`).
+
+        :type pool: :class:`.pools.NodePool`
+        :param pool: Node pool new nodes are added to, which sets their name
+                     prefix and launch settings; the default pool if not
+                     supplied. Other operations apply to nodes of any pool.
         """
-        self._provision_manager_name = ss.config.get_config_value(
-            'provision_manager_name', 'JetstreamIUProvisionManager')
-        self._config_manager_name = ss.config.get_config_value(
-            'config_manager_name', 'GalaxyJetstreamIUConfigManager')
-        self._provision_manager = ProvisionManagerFactory.get_provision_manger(
-            self._provision_manager_name)
-        self._config_manager = ConfigManagerFactory.get_config_manager(
-            self._config_manager_name)
+        self._provision_manager_name = (
+            provision_manager_name or ss.config.get_config_value(
+                'provision_manager_name', 'JetstreamIUProvisionManager'))
+        self._config_manager_name = (
+            config_manager_name or ss.config.get_config_value(
+                'config_manager_name', 'GalaxyJetstreamIUConfigManager'))
+        self._provision_manager_obj = provision_manager
+        self._config_manager_obj = config_manager
+        self._warm_pool = warm_pool
+        self._journal = node_journal
+        self._pool = pool or get_pools().default
 
     @property
-    def _nodes(self):
-        """Fetch fresh data."""
-        return pyslurm.node().get()
+    def _provision_manager(self):
+        """The provision manager, created on first use."""
+        if self._provision_manager_obj is None:
+            self._provision_manager_obj = (
+                ProvisionManagerFactory.get_provision_manger(
+                    self._provision_manager_name,
+                    None if self._pool.default else self._pool.name))
+        return self._provision_manager_obj
+
+    @_provision_manager.setter
+    def _provision_manager(self, provision_manager):
+        self._provision_manager_obj = provision_manager
 
-    def list(self, only_idle=False):
+    @property
+    def _config_manager(self):
+        """The config manager, created on first use."""
+        if self._config_manager_obj is None:
+            self._config_manager_obj = (
+                ConfigManagerFactory.get_config_manager(
+                    self._config_manager_name))
+        return self._config_manager_obj
+
+    @_config_manager.setter
+    def _config_manager(self, config_manager):
+        self._config_manager_obj = config_manager
+
+    def _record(self, nodes, state, operation=None, error=None):
+        """Record a lifecycle transition of the nodes in the journal."""
+        node_journal = self._journal or journal.get_journal()
+        if node_journal is None:
+            return
+        try:
+            node_journal.record(nodes, state, operation=operation,
+                                error=error)
+        except Exception as e:
+            log.warn("Could not record {0} state of node(s) {1} in the "
+                     "journal: {2}".format(state, [n.name for n in nodes], e))
+
+    def _nodes(self, fresh=False):
+        """Get node data from the current cluster snapshot."""
+        return snapshot.nodes(fresh=fresh)
+
+    def list(self, only_idle=False, fresh=False):
         """
         List the nodes available on the cluster.
 
         :type only_idle: ``bool``
         :param only_idle: If set, return only IDLE nodes.
 
+        :type fresh: ``bool``
+        :param fresh: If set, bypass the cluster snapshot and query Slurm.
+
         :rtype: ``list`` of :class:`.Node`
         :return: A list of ``Node`` objects.
         """
-        slurm_nodes = self._nodes
+        slurm_nodes = self._nodes(fresh)
         current_nodes = []
 
         for n in slurm_nodes:
@@ -88,66 +172,225 @@ class Nodes(object):
         :return: An object representing the node, or None if a matching node
                  cannot be found.
         """
-        for node in self.list():
-            if name == node.name or ip == node.ip:
-                return node
-        return None
-
-    def _next_node_name(self, prefix):
-        """
-        Get the next logical node name.
-
-        The returned name will be based on the supplied prefix with the
-        number incremented from the largest available suffix. For example, if
-        the following is a current list of nodes: ``jetstream-iu-large[0-5]``,
-        the method will return ``jetstream-iu-large6``.
-
-        :type prefix: ``str``
-        :param prefix: Common prefix for the name across existing nodes.
-
-        :rtype: ``str``
-        :return: The next logical name with the supplied prefix.
-        """
-        largest_suffix = 0
-        for node in self.list():
-            if prefix in node.name:
-                suffix = re.sub('^{0}'.format(prefix), '', node.name)
-                try:
-                    suffix = int(suffix)
-                    if suffix > largest_suffix:
-                        largest_suffix = suffix
-                except ValueError as e:
-                    log.warn("Value error figuring out suffix {0} for node "
-                             "{1}: {2}".format(suffix, node.name, e))
-        # First node number starts at 0
-        suffix = largest_suffix + 1 if largest_suffix or largest_suffix == 0 \
-            else 0
-        name = "{0}{1}".format(prefix, suffix)
-        log.debug("Next node name: {0}".format(name))
-        return name
-
-    def add(self):
-        """
-        Add a new node into the cluster.
-
-        This method will provision a new server from a cloud provider and
-        configure it for use with the cluster.
-
-        TODO:
-         - Allow a number of nodes to be added in one request
-
-        :rtype: object of :class:`.Node` or None
-        :return: Return a handle to the new node that was added.
-        """
-        instance_name = self._next_node_name(
-            prefix=ss.config.get_config_value('node_name_prefix',
-                                              'jetstream-iu-large'))
-        instance = self._provision_manager.create(instance_name=instance_name)
-        inst = Bunch(name=instance.name, ip=instance.private_ips[0])
-        ret_code, _ = self.configure(self.list() + [inst])
-        if ret_code == 0:
-            return self.get(name=instance_name)
-        return None
+        index = snapshot.node_index()
+        node = index.by_name.get(name) if name else None
+        if node is None and ip:
+            node = index.by_ip.get(ip)
+        return Node(node) if node else None
+
+    def set_state(self, nodes, state, reason=None):
+        """
+        Set the state of a number of nodes with a single Slurm update.
+
+        Node names are compressed into a hostlist expression (e.g.,
+        ``jetstream-iu-large[3-9,12]``) and updated in one call to the
+        controller. If that call fails, each node is updated individually to
+        find out which of the nodes failed.
+
+        :type nodes: ``list`` of :class:`.Node` or ``str``
+        :param nodes: Nodes, or node names, to update.
+
+        :type state: ``int``
+        :param state: Node state, e.g., ``pyslurm.NODE_RESUME``,
+                      ``pyslurm.NODE_STATE_DRAIN`` or
+                      ``pyslurm.NODE_STATE_DOWN``.
+
+        :type reason: ``str``
+        :param reason: Reason for the state change.
+
+        :rtype: ``dict``
+        :return: A dict mapping each node name to ``True`` if its state was
+                 successfully updated or ``False`` otherwise.
+        """
+        names = [getattr(node, 'name', node) for node in nodes]
+        if not names:
+            return {}
+
+        def _update(node_names):
+            node_dict = {
+                'node_names': node_names,
+                'node_state': state,
+            }
+            if reason:
+                node_dict['reason'] = reason
+            metrics.inc('slurmscale_pyslurm_calls_total', call='node.update')
+            try:
+                return pyslurm.node().update(node_dict) != -1
+            except ValueError as e:
+                log.warn("Exception updating node(s) {0}: {1}".format(
+                         node_names, e))
+                return False
+
+        if _update(hostlist.compress(names)):
+            results = dict((name, True) for name in names)
+        else:
+            results = dict((name, _update(name)) for name in names)
+        snapshot.refresh('nodes')
+        failed = [name for name in names if not results[name]]
+        if failed:
+            log.warn("Failed to update the state of node(s) {0}".format(
+                     failed))
+        return results
+
+    def drain(self, nodes, delete=True):
+        """
+        Drain nodes ahead of their removal from the cluster.
+
+        Draining nodes accept no new jobs but finish the ones they are
+        running. The nodes are recorded in the journal as being removed, so
+        their removal is completed after a restart.
+
+        :type nodes: ``list`` of :class:`.Node`
+        :param nodes: Nodes to drain.
+
+        :type delete: ``bool``
+        :param delete: Whether the VMs of the nodes will be deleted once the
+                       nodes are removed.
+
+        :rtype: ``dict``
+        :return: A dict mapping each node name to ``True`` if the node is
+                 draining or ``False`` otherwise.
+        """
+        results = self.set_state(nodes, pyslurm.NODE_STATE_DRAIN,
+                                 reason="Draining for removal by SlurmScale")
+        self._record([n for n in nodes if results.get(n.name)],
+                     journal.DRAINING,
+                     operation=journal.REMOVE if delete else journal.DETACH)
+        return results
+
+    def add(self, count=1, instance_types=None):
+        """
+        Add new node(s) into the cluster.
+
+        This method will provision new servers from a cloud provider and
+        configure them for use with the cluster. If a warm pool was supplied,
+        standby instances are claimed from it first for nodes of the default
+        flavor. All remaining servers are provisioned concurrently and then
+        configured into the cluster with a single run of the configuration
+        manager. If the configuration fails, the new instances are deleted,
+        as are those of nodes that did not join the cluster.
+
+        :type count: ``int``
+        :param count: Number of nodes to add.
+
+        :type instance_types: ``list`` of ``str``
+        :param instance_types: Flavor of each node to add; nodes without a
+                               flavor (or ``None``) get the configured
+                               ``instance_type``.
+
+        :rtype: ``list`` of ``Bunch``
+        :return: One result per requested node, each with ``name``, ``node``
+                 (a :class:`.Node` or ``None``) and ``error`` (a message if
+                 adding the node failed or ``None``) fields.
+        """
+        start = time.time()
+        allocator = get_allocator(self._pool.prefix)
+        names = allocator.reserve(count)
+        types = dict((name, instance_type) for name, instance_type
+                     in zip(names, instance_types or []) if instance_type)
+        self._record([Bunch(name=name) for name in names], journal.REQUESTED,
+                     operation=journal.ADD)
+        provisioned = []
+        if self._warm_pool:
+            default = [name for name in names if name not in types]
+            for name, instance in zip(default,
+                                      self._warm_pool.claim(len(default))):
+                # Nodes whose standby could not be renamed are launched anew
+                if self._warm_pool.assign(instance, name):
+                    provisioned.append(Bunch(name=name, instance=instance,
+                                             error=None))
+        claimed = set(pr.name for pr in provisioned)
+        provisioned += self._provision_manager.create_many(
+            [name for name in names if name not in claimed], types)
+        results = []
+        new_servers = []
+        no_ip = []  # E.g., standby instances whose network went away
+        for pr in provisioned:
+            result = Bunch(name=pr.name, node=None, error=pr.error)
+            if pr.instance and not pr.instance.private_ips:
+                result.error = "Instance has no private IP address"
+                no_ip.append(Bunch(name=pr.name, ip=None))
+            elif pr.instance:
+                # Shape of the node, for Slurm to expect its resources
+                shape = (get_flavor(types[pr.name]) if pr.name in types
+                         else self._pool)
+                # Standby instances booted with their standby name as their
+                # hostname, which slurmd would take for the node's name
+                new_servers.append(Bunch(name=pr.name,
+                                         ip=pr.instance.private_ips[0],
+                                         cpus=shape.cpus,
+                                         memory=shape.memory,
+                                         hostname=(pr.name if pr.name in
+                                                   claimed else None)))
+            elif not result.error:
+                result.error = "Provisioning failed"
+            results.append(result)
+        self._record(new_servers, journal.READY)
+        self._record([r for r in results if r.error], journal.FAILED)
+        undeleted = (self._discard(no_ip, "Instance has no private IP "
+                                   "address") if no_ip else [])
+        if new_servers:
+            with _membership_lock:
+                ret_code, _ = self.configure(self.list() + new_servers)
+            missing = set()  # Configured but not known to Slurm
+            for result in results:
+                if result.error:
+                    continue
+                if ret_code == 0:
+                    result.node = self.get(name=result.name)
+                    if result.node is None:
+                        result.error = "Node did not join the cluster"
+                        missing.add(result.name)
+                else:
+                    result.error = ("Configuration failed with exit code "
+                                    "{0}".format(ret_code))
+            if ret_code == 0:
+                joined = [s for s in new_servers if s.name not in missing]
+                self._record(joined, journal.CONFIGURED)
+                if missing:
+                    joined += self._discard(
+                        [s for s in new_servers if s.name in missing],
+                        "Node did not join the cluster")
+                new_servers = joined
+            else:
+                new_servers = self._discard(
+                    new_servers, "Configuration failed with exit code "
+                    "{0}".format(ret_code))
+        # Names of nodes whose instances still exist stay reserved
+        provisioned_names = set(server.name
+                                 for server in new_servers + undeleted)
+        allocator.release([r.name for r in results
+                           if r.node or r.name not in provisioned_names])
+        failed = [r.name for r in results if r.error]
+        if failed:
+            log.warn("Failed to add node(s) {0}".format(failed))
+        metrics.inc('slurmscale_nodes_added_total', len(results) - len(failed))
+        metrics.inc('slurmscale_node_add_failures_total', len(failed))
+        metrics.observe('slurmscale_add_seconds', time.time() - start)
+        return results
+
+    def _discard(self, servers, error):
+        """
+        Delete the instances of new servers that did not join the cluster.
+
+        Servers whose instance could not be deleted are recorded as removed
+        nodes pending the deletion, which :meth:`recover` retries.
+
+        :rtype: ``list`` of ``Bunch``
+        :return: The servers whose instance could not be deleted.
+        """
+        log.warn("Deleting the instances of node(s) {0}: {1}".format(
+                 [s.name for s in servers], error))
+        deleted = self._provision_manager.delete(servers)
+        self._record([s for s in servers if deleted.get(s.name)],
+                     journal.FAILED, error=error)
+        remaining = [s for s in servers if not deleted.get(s.name)]
+        if remaining:
+            log.warn("Could not delete the instances of node(s) {0}".format(
+                     [s.name for s in remaining]))
+            self._record(remaining, journal.REMOVED,
+                         operation=journal.REMOVE, error=error)
+        return remaining
 
     def remove(self, nodes, delete=True):
         """
@@ -163,26 +406,55 @@ class Nodes(object):
         :param delete: If ``True``, also delete VMs used by the removed nodes.
 
         :rtype: ``bool``
-        :return: ``True`` if removal was successful.
+        :return: ``True`` if removal (including deletion of the VMs, if
+                 requested) was successful.
         """
-        log.debug("Removing nodes {0}".format(nodes))
         if not isinstance(nodes, list):
             nodes = [nodes]
-        existing_nodes = set(self.list())
-        keep_set = [node for node in existing_nodes if node not in nodes]
+        return not self._remove(nodes, delete)
+
+    def _remove(self, nodes, delete):
+        """
+        Remove nodes from the cluster.
+
+        :rtype: ``list`` of ``str``
+        :return: Names of the nodes whose removal failed: all of them if the
+                 cluster could not be reconfigured, or those whose VM could
+                 not be deleted.
+        """
+        log.debug("Removing nodes {0}".format(nodes))
+        start = time.time()
+        remove_set = set(nodes)
         delete_nodes = []  # Keep a copy (node info no longer available later)
         for node in nodes:
             delete_nodes.append(Bunch(name=node.name, ip=node.ip))
-            node.disable(state=pyslurm.NODE_STATE_DOWN)
-        ret_code, _ = self.configure(servers=keep_set)
+        self._record(delete_nodes, journal.DRAINING,
+                     operation=journal.REMOVE if delete else journal.DETACH)
+        with _membership_lock:
+            keep_set = [node for node in self.list()
+                        if node not in remove_set]
+            self.set_state(nodes, pyslurm.NODE_STATE_DOWN,
+                           reason="Disabled by SlurmScale")
+            ret_code, _ = self.configure(servers=keep_set)
+        failed = [node.name for node in nodes] if ret_code != 0 else []
+        if ret_code == 0:
+            self._record(delete_nodes, journal.REMOVED)
         if ret_code == 0 and delete:
             log.debug("Reconfigured the cluster without node(s) {0}; deleting "
                       "the node(s) now.".format(nodes))
-            self._provision_manager.delete(delete_nodes)
-            return True
-        return False
-
-    def configure(self, servers):
+            deleted = self._provision_manager.delete(delete_nodes)
+            failed = [name for name, ok in deleted.items() if not ok]
+            if failed:
+                log.warn("Failed to delete VMs for node(s) {0}".format(
+                         failed))
+            self._record([n for n in delete_nodes if deleted.get(n.name)],
+                         journal.DELETED)
+        metrics.inc('slurmscale_nodes_removed_total', len(nodes) - len(failed))
+        metrics.inc('slurmscale_node_remove_failures_total', len(failed))
+        metrics.observe('slurmscale_remove_seconds', time.time() - start)
+        return failed
+
+    def configure(self, servers, full=False):
         """
         (Re)configure the supplied servers as cluster nodes.
 
@@ -198,7 +470,115 @@ class Nodes(object):
                         list must be an object (such as ``Node`` or ``Bunch``)
                         that has ``name`` and ``ip`` fields.
 
+        :type full: ``bool``
+        :param full: If set, have the configuration manager configure all the
+                     servers instead of only the ones that changed since
+                     its last run.
+
         :rtype: tuple of ``str``
         :return: A tuple with the process exit code and stdout.
         """
-        return self._config_manager.configure(servers)
+        result = self._config_manager.configure(servers, full=full)
+        snapshot.refresh('nodes')  # Cluster membership may have changed
+        return result
+
+    def recover(self, drainer=None):
+        """
+        Resume or roll back node operations interrupted by a crash or restart.
+
+        Uses the journal to find interrupted operations, so there is no need
+        to rescan Slurm and the cloud for stray instances:
+
+        * Nodes being added whose instance was requested but may not have
+          become ready are rolled back; any instance with the node's name is
+          deleted.
+        * Nodes being added whose instance was ready are configured into the
+          cluster; if that fails, their instances are deleted.
+        * Nodes being removed are removed again; their instances are
+          deleted if the removal called for it. If a ``drainer`` is
+          supplied, nodes still in the cluster are handed to it instead, so
+          they can finish their jobs first.
+        * Standby instances of the warm pool are deleted.
+
+        :type drainer: :class:`.DrainPipeline`
+        :param drainer: Pipeline to resume interrupted drains with.
+
+        :rtype: ``dict``
+        :return: The final journal state of each recovered node, keyed by
+                 node name.
+        """
+        node_journal = self._journal or journal.get_journal()
+        entries = node_journal.in_flight() if node_journal else []
+        if not entries:
+            return {}
+        log.info("Recovering interrupted operations for node(s) {0}".format(
+                 ["{0} ({1} {2})".format(e.name, e.operation, e.state)
+                  for e in entries]))
+        states = {}
+        slurm_nodes = dict((node.name, node) for node in self.list())
+
+        def _roll_back(servers, error):
+            deleted = self._provision_manager.delete(
+                [Bunch(name=s.name, ip=s.ip) for s in servers])
+            for server in servers:
+                if not deleted.get(server.name):
+                    log.warn("No instance deleted for node {0}; it may not "
+                             "have been created".format(server.name))
+                self._record([server], journal.FAILED, error=error)
+                states[server.name] = journal.FAILED
+
+        standbys = [e for e in entries if e.operation == journal.STANDBY]
+        if standbys:
+            _roll_back(standbys, "Standby instance left over from a restart")
+        entries = [e for e in entries if e.operation != journal.STANDBY]
+        adds = [e for e in entries if e.operation == journal.ADD]
+        # Requested: the instance may be partially provisioned
+        requested = [e for e in adds if e.state == journal.REQUESTED]
+        if requested:
+            _roll_back(requested, "Interrupted while provisioning")
+        # Ready: the instance is up but may not be configured
+        ready = [e for e in adds if e.state == journal.READY]
+        configured = [e for e in ready if e.name in slurm_nodes]
+        pending = [e for e in ready if e.name not in slurm_nodes]
+        if pending:
+            with _membership_lock:
+                ret_code, _ = self.configure(
+                    self.list() + [Bunch(name=e.name, ip=e.ip)
+                                   for e in pending])
+            if ret_code == 0:
+                configured += pending
+            else:
+                _roll_back(pending, "Configuration failed with exit code "
+                           "{0}".format(ret_code))
+        self._record(configured, journal.CONFIGURED)
+        states.update((e.name, journal.CONFIGURED) for e in configured)
+
+        removes = [e for e in entries if e.operation != journal.ADD]
+        for delete in (True, False):
+            group = [e for e in removes
+                     if (e.operation == journal.REMOVE) == delete]
+            in_cluster = [slurm_nodes[e.name] for e in group
+                          if e.name in slurm_nodes]
+            if in_cluster and drainer is not None:
+                drainer.drain(in_cluster, delete=delete)
+                states.update((n.name, journal.DRAINING) for n in in_cluster)
+            elif in_cluster:
+                self.remove(in_cluster, delete=delete)
+            gone = [Bunch(name=e.name, ip=e.ip) for e in group
+                    if e.name not in slurm_nodes]
+            self._record(gone, journal.REMOVED)
+            if gone and delete:
+                deleted = self._provision_manager.delete(gone)
+                self._record([n for n in gone if deleted.get(n.name)],
+                             journal.DELETED)
+        if removes:
+            remaining = dict((e.name, e.state)
+                             for e in node_journal.in_flight())
+            for e in removes:
+                if e.name in states:  # Still draining
+                    continue
+                states[e.name] = remaining.get(
+                    e.name, journal.DELETED if e.operation == journal.REMOVE
+                    else journal.REMOVED)
+        log.info("Recovered node(s): {0}".format(states))
+        return states
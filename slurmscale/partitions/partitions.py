@@ -1,7 +1,6 @@
 """Represent and manage partitions of the target cluster."""
-import pyslurm
-
 from partition import Partition
+from slurmscale.util.snapshot import snapshot
 
 import logging
 log = logging.getLogger(__name__)
@@ -10,19 +9,21 @@ log = logging.getLogger(__name__)
 class Partitions(object):
     """A service object to inspect and manage cluster partitions."""
 
-    @property
-    def _partitions(self):
-        """Fetch fresh data."""
-        return pyslurm.partition().get()
+    def _partitions(self, fresh=False):
+        """Get partition data from the current cluster snapshot."""
+        return snapshot.partitions(fresh=fresh)
 
-    def list(self):
+    def list(self, fresh=False):
         """
         List the partitions available on the cluster.
 
+        :type fresh: ``bool``
+        :param fresh: If set, bypass the cluster snapshot and query Slurm.
+
         :rtype: ``list`` of :class:`.Partition`
         :return: A list of ``Partition`` objects.
         """
-        current_partitions = self._partitions
+        current_partitions = self._partitions(fresh)
         partitions = []
         for key in current_partitions.iterkeys():
             log.debug("Adding partition {0} to .list".format(key))
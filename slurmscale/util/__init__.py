@@ -1,5 +1,6 @@
 """Utility module for the library."""
 import os
+import threading
 from os.path import expanduser
 
 try:
@@ -17,14 +18,29 @@ SlurmScaleConfigLocations.append(LibraryConfigPath)
 
 
 class Config(object):
-    """Library config class."""
+    """
+    Library config class.
+
+    The configuration files are read on first access to a config value.
+    """
 
     def __init__(self):
         """Initialize the config parser."""
-        self._config_parser = SafeConfigParser()
-        self._config_parser.read(SlurmScaleConfigLocations)
+        self._parser = None
+        self._lock = threading.Lock()
+
+    @property
+    def _config_parser(self):
+        """The config parser, reading the configuration files if needed."""
+        if self._parser is None:
+            with self._lock:
+                if self._parser is None:
+                    parser = SafeConfigParser()
+                    parser.read(SlurmScaleConfigLocations)
+                    self._parser = parser
+        return self._parser
 
-    def get_config_value(self, key, default_value):
+    def get_config_value(self, key, default_value, section=None):
         """
         Inspect the available configurations for the supplied key.
 
@@ -35,11 +51,59 @@ class Config(object):
         :param default_value: the default value to return if a value for the
                               ``key`` is not available
 
+        :type section: ``str``
+        :param section: Config file section to look in; ``slurmscale`` by
+                        default.
+
         :rtype: ``str``
         :return: a configuration value for the supplied ``key``
         """
-        section_name = 'slurmscale'
+        section_name = section or 'slurmscale'
         if (self._config_parser.has_option(section_name, key) and
                 self._config_parser.get(section_name, key)):
             return self._config_parser.get(section_name, key)
         return default_value
+
+    def set_config_value(self, key, value, section=None):
+        """
+        Set a configuration value for the current process.
+
+        The value takes precedence over the configuration files but is not
+        saved to them.
+
+        :type key: ``str``
+        :param key: Configuration value to set.
+
+        :type value: ``str``
+        :param value: The value to set.
+
+        :type section: ``str``
+        :param section: Config file section to set the value in;
+                        ``slurmscale`` by default.
+        """
+        section_name = section or 'slurmscale'
+        if not self._config_parser.has_section(section_name):
+            self._config_parser.add_section(section_name)
+        self._config_parser.set(section_name, key, str(value))
+
+    def get_config_bool(self, key, default_value):
+        """
+        Inspect the available configurations for the supplied boolean key.
+
+        Values ``true``, ``yes``, ``on`` and ``1`` (in any case) are
+        interpreted as ``True``; any other set value as ``False``.
+
+        :type key: ``str``
+        :param key: Configuration value to retrieve.
+
+        :type default_value: ``bool``
+        :param default_value: the default value to return if a value for the
+                              ``key`` is not available
+
+        :rtype: ``bool``
+        :return: a configuration value for the supplied ``key``
+        """
+        value = self.get_config_value(key, default_value)
+        if isinstance(value, bool):
+            return value
+        return value.strip().lower() in ('true', 'yes', 'on', '1')
@@ -1,5 +1,8 @@
 """A module for running Ansible-related steps."""
 from string import Template
+import os
+import stat
+import tempfile
 
 INVENTORY_TEMPLATE = Template("""
 jetstream-iu0.galaxyproject.org ansible_connection=local
@@ -41,17 +44,114 @@ galaxynodes
 
 [galaxynodes]
 [galaxynodes:children]
-jetstream-iu-large
+jetstream-iu-large${pool_groups}
 
 [jetstream-iu-large]
 #jetstream-iu-large0 ansible_host=10.0.0.72
 ${nodes}
+${pools}""")
+
+# Inventory group of the nodes of a pool serving a Slurm partition
+POOL_TEMPLATE = Template("""
+[${group}]
+${nodes}
+
+[${group}:vars]
+slurm_partition=${partition}
 """)
 
 
 class InventoryFile(object):
     """Module for creating Ansible inventory file."""
 
+    @staticmethod
+    def render(nodes):
+        """
+        Render the inventory for the supplied nodes.
+
+        :type nodes: ``list`` of ``dicts``
+        :param nodes: A list of nodes to be added into the inventory file. Each
+                      list item must be a dict with ``name`` and ``ip`` keys.
+                      Nodes with ``cpus`` and ``memory`` (in MB) keys get
+                      ``slurm_cpus`` and ``slurm_memory`` host variables, so
+                      the Slurm configuration can define nodes of different
+                      flavors. Nodes with a ``hostname`` key get a
+                      ``node_hostname`` host variable, for the playbook to
+                      set the hostname with. Nodes of a pool serving a Slurm
+                      partition
+                      also have ``group`` and ``partition`` keys; they are
+                      listed in their own group, with a ``slurm_partition``
+                      variable.
+
+        :rtype: ``str``
+        :return: The contents of the inventory file.
+        """
+        targets = []
+        groups = {}  # group -> (partition, hosts)
+        # Render in a stable order so the same set of nodes always produces
+        # the same file (and configuration fingerprint)
+        for node in sorted(nodes, key=lambda n: n.get('name')):
+            target = "{0} ansible_host={1}".format(node.get('name'),
+                                                   node.get('ip'))
+            if node.get('cpus') and node.get('memory'):
+                target += " slurm_cpus={0} slurm_memory={1}".format(
+                    node['cpus'], node['memory'])
+            if node.get('hostname'):
+                target += " node_hostname={0}".format(node['hostname'])
+            if node.get('group'):
+                groups.setdefault(node['group'], (node.get('partition'), []))[
+                    1].append(target)
+            else:
+                targets.append(target)
+        pools = [POOL_TEMPLATE.substitute(
+            {'group': group, 'partition': partition,
+             'nodes': '\n'.join(hosts)})
+            for group, (partition, hosts) in sorted(groups.items())]
+        return INVENTORY_TEMPLATE.substitute(
+            {'nodes': '\n'.join(targets),
+             'pool_groups': ''.join('\n' + group for group in sorted(groups)),
+             'pools': ''.join(pools)})
+
+    @staticmethod
+    def write(file_path, contents):
+        """
+        Atomically replace a file, unless it already has the given contents.
+
+        The contents are written to a temporary file in the same directory,
+        which is then renamed over the file, so readers see either the old or
+        the new file but never a partially written one.
+
+        :type file_path: ``str``
+        :param file_path: System path of the file.
+
+        :type contents: ``str``
+        :param contents: New contents of the file.
+
+        :rtype: ``bool``
+        :return: Whether the file was written.
+        """
+        try:
+            with open(file_path, 'r') as f:
+                if f.read() == contents:
+                    return False
+            mode = stat.S_IMODE(os.stat(file_path).st_mode)
+        except (IOError, OSError):
+            mode = 0o644
+        fd, tmp_path = tempfile.mkstemp(
+            dir=os.path.dirname(os.path.abspath(file_path)),
+            prefix='.' + os.path.basename(file_path) + '.')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(contents)
+                f.flush()
+                os.fsync(f.fileno())
+            os.chmod(tmp_path, mode)
+            os.rename(tmp_path, file_path)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+        return True
+
     @staticmethod
     def create(file_path, nodes):
         """
@@ -59,7 +159,8 @@ class InventoryFile(object):
 
         Currently, the inventory file is based on a pre-defined template
         where only the worker nodes are modified, according to the supplied
-        argument.
+        argument. The file is replaced atomically and left untouched if it
+        already lists the supplied nodes.
 
         :type file_path: ``str``
         :param file_path: System path for the file where the inventory will be
@@ -67,13 +168,10 @@ class InventoryFile(object):
                           overwritten.
 
         :type nodes: ``list`` of ``dicts``
-        :param nodes: A list of nodes to be added into the inventory file. Each
-                      list item must be a dict with ``name`` and ``ip`` keys.
+        :param nodes: A list of nodes to be added into the inventory file (see
+                      :meth:`render`).
+
+        :rtype: ``bool``
+        :return: Whether the file was written.
         """
-        targets = []
-        for node in nodes:
-            targets.append("{0} ansible_host={1}".format(node.get('name'),
-                                                         node.get('ip')))
-        with open(file_path, 'w') as f:
-            f.writelines(INVENTORY_TEMPLATE.substitute(
-                         {'nodes': '\n'.join(targets)}))
+        return InventoryFile.write(file_path, InventoryFile.render(nodes))
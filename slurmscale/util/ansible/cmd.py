@@ -1,38 +1,222 @@
 """A module for running Ansible by wrapping command line."""
+from collections import deque
 from os.path import join
+import os
+import re
+import signal
 import subprocess
+import threading
+import time
+
+from bunch import Bunch
+
+from slurmscale.util import metrics
+
+try:
+    from shlex import quote
+except ImportError:  # Python 2
+    from pipes import quote
 
 import logging
 log = logging.getLogger(__name__)
 
+TASK_RE = re.compile(r'^TASK \[(.*)\]')
+PLAY_RE = re.compile(r'^PLAY (\[|RECAP)')
+HOST_RE = re.compile(r'^(ok|changed|skipping|fatal|failed): \[([^\]]+)\]'
+                     r'(?::\s+(UNREACHABLE|FAILED)!)?')
+RECAP_RE = re.compile(r'^(\S+)\s+:\s+ok=\d+.*\sfailed=(\d+)')
+
 
 class AnsibleRunner(object):
-    """Responsible for running Ansible playbook."""
+    """
+    Responsible for running Ansible playbook.
+
+    The playbook output is read line by line as it is produced and turned
+    into per-host task events. The run can be aborted as soon as a host
+    becomes unreachable or fails and is killed if it exceeds a timeout. Only
+    the last ``max_output_lines`` lines of output are kept.
+
+    A failure is only reported once it is known whether Ansible ignored it
+    (``...ignoring`` follows the host's results for the task) or a
+    ``rescue`` section handled it (the host reports results for later tasks
+    of the play, or has no failures in the play recap). Otherwise, it is
+    reported when the next play starts or the playbook ends.
+    """
 
     def __init__(self, playbook_root, inventory_filename, playbook_path,
-                 venv_path, verbosity=0):
-        """Initialized the runner."""
+                 venv_path, verbosity=0, limit=None, abort_on=(),
+                 timeout=None, on_event=None, max_output_lines=1000):
+        """
+        Initialized the runner.
+
+        :type limit: ``str``
+        :param limit: An Ansible host pattern (e.g., ``slurmservers,node3``)
+                      restricting the run to a subset of the inventory. If
+                      not set, the playbook runs against all hosts.
+
+        :type abort_on: ``tuple`` of ``str``
+        :param abort_on: Host event statuses (``failed`` and/or
+                         ``unreachable``) that abort the whole run as soon as
+                         they are seen. Failures Ansible ignores or rescues
+                         do not count.
+
+        :type timeout: ``float``
+        :param timeout: Number of seconds after which the run is killed.
+
+        :type on_event: ``function``
+        :param on_event: Called with a ``Bunch`` with ``host``, ``task`` and
+                         ``status`` (``ok``, ``changed``, ``skipping``,
+                         ``failed``, ``ignored``, ``rescued`` or
+                         ``unreachable``) fields for each host task result.
+
+        :type max_output_lines: ``int``
+        :param max_output_lines: Number of the most recent output lines kept
+                                 and returned.
+        """
         self.inventory_filename = inventory_filename
         self.playbook_root = playbook_root
         self.playbook_path = playbook_path
         self.venv_path = venv_path
         self.verbosity = verbosity
+        self.limit = limit
+        self.abort_on = tuple(abort_on or ())
+        self.timeout = timeout
+        self.on_event = on_event
+        self.max_output_lines = max_output_lines
+
+    def _kill(self, p, reason):
+        """Kill the playbook process and its children."""
+        if p.poll() is not None:
+            return
+        log.warn("Killing ansible-playbook: {0}".format(reason))
+        try:
+            os.killpg(p.pid, signal.SIGTERM)
+        except OSError as e:
+            log.debug("Could not kill ansible-playbook: {0}".format(e))
+
+    def _event(self, p, event):
+        """Handle a host event; return ``True`` if the run was aborted."""
+        log.debug("Ansible {0} on {1}: {2}".format(
+                  event.status, event.host, event.task))
+        if event.status in ('failed', 'unreachable'):
+            metrics.inc('slurmscale_ansible_host_failures_total',
+                        status=event.status)
+        if self.on_event:
+            self.on_event(event)
+        if event.status in self.abort_on:
+            self._kill(p, "host {0} is {1} in task {2}".format(
+                       event.host, event.status, event.task))
+            return True
+        return False
+
+    def _settle(self, p, failures, host, status):
+        """
+        Report a host's held failures with the given status.
+
+        :rtype: ``bool``
+        :return: ``True`` if the run was aborted.
+        """
+        aborted = False
+        for event in failures.pop(host, (None, []))[1]:
+            event.status = status
+            aborted = self._event(p, event) or aborted
+        return aborted
 
     def run(self):
         """
         Run the initialized playbook.
 
         :rtype: tuple of ``str``
-        :return: A tuple with the process exit code and stdout.
+        :return: A tuple with the process exit code and the (last lines of)
+                 stdout and stderr. If the run was aborted or timed out, the
+                 exit code is non-zero.
         """
         cmd = "cd {0} && ansible-playbook -i {1} {2}".format(
             self.playbook_root, self.inventory_filename, self.playbook_path)
+        if self.limit:
+            cmd += " --limit {0}".format(quote(self.limit))
         if self.venv_path:
             cmd = "source {0};{1}".format(join(self.venv_path, 'bin/activate'),
                                           cmd)
         log.debug("Running Ansible with command: {0}".format(cmd))
-        p = subprocess.Popen(cmd, stdout=subprocess.PIPE, shell=True)
-        (out, err) = p.communicate()
-        p_status = p.wait()
+        start = time.time()
+        p = subprocess.Popen(cmd, stdout=subprocess.PIPE,
+                             stderr=subprocess.STDOUT, shell=True,
+                             preexec_fn=os.setsid)
+        timer = None
+        if self.timeout:
+            timer = threading.Timer(self.timeout, self._kill, args=(
+                p, "timed out after {0}s".format(self.timeout)))
+            timer.daemon = True
+            timer.start()
+        out = deque(maxlen=self.max_output_lines)
+        task = None
+        tasks = 0  # Number of tasks started, to tell them apart
+        host = None  # Host of the last task result
+        recap = False
+        # Failure events by host, as ``(task number, events)`` tuples, held
+        # until it is known whether they were ignored or rescued
+        failures = {}
+        aborted = False
+        try:
+            for line in iter(p.stdout.readline, b''):
+                line = line.decode('utf-8', 'replace').rstrip()
+                out.append(line)
+                if line.strip() == '...ignoring':
+                    if failures.get(host, (None,))[0] == tasks:
+                        aborted = self._settle(
+                            p, failures, host, 'ignored') or aborted
+                    continue
+                m = PLAY_RE.match(line)
+                if m:
+                    recap = m.group(1) == 'RECAP'
+                    if not recap:
+                        # Hosts that failed without a rescue leave the play
+                        for name in sorted(failures):
+                            aborted = self._settle(
+                                p, failures, name, 'failed') or aborted
+                    continue
+                m = RECAP_RE.match(line) if recap else None
+                if m:
+                    name, failed = m.groups()
+                    aborted = self._settle(
+                        p, failures, name,
+                        'failed' if int(failed) else 'rescued') or aborted
+                    continue
+                m = TASK_RE.match(line)
+                if m:
+                    task = m.group(1)
+                    tasks += 1
+                    continue
+                m = HOST_RE.match(line)
+                if m:
+                    status, host, fatal = m.groups()
+                    if failures.get(host, (tasks,))[0] != tasks:
+                        # The host carried on with a later task after failing
+                        aborted = self._settle(
+                            p, failures, host, 'rescued') or aborted
+                    if fatal == 'UNREACHABLE':
+                        status = 'unreachable'
+                    elif status == 'fatal':
+                        status = 'failed'
+                    event = Bunch(host=host, task=task, status=status)
+                    if status == 'failed':
+                        failures.setdefault(host, (tasks, []))[1].append(
+                            event)
+                    else:
+                        aborted = self._event(p, event) or aborted
+            for name in sorted(failures):
+                aborted = self._settle(p, failures, name, 'failed') or aborted
+        finally:
+            p.stdout.close()
+            p_status = p.wait()
+            if timer:
+                timer.cancel()
+        if aborted and p_status == 0:
+            p_status = 1
+        out = '\n'.join(out)
+        metrics.observe('slurmscale_ansible_run_seconds', time.time() - start)
+        metrics.inc('slurmscale_ansible_runs_total',
+                    status='ok' if p_status == 0 else 'failed')
         log.debug("Playbook stdout: %s\nstatus: %s" % (out, p_status))
         return (p_status, out)
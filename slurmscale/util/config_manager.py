@@ -1,24 +1,52 @@
 """A set of classes used to configure resources into Slurm nodes."""
+import hashlib
+import json
 import os
+import threading
+
+from bunch import Bunch
+
+try:
+    from ConfigParser import SafeConfigParser
+except ImportError:  # Python 3
+    from configparser import ConfigParser as SafeConfigParser
 
 from .ansible import InventoryFile
 # from .ansible.api import AnsibleRunner
 from .ansible.cmd import AnsibleRunner
+from . import metrics
+from .pools import get_pools
 
 import slurmscale as ss
 
 import logging
 log = logging.getLogger(__name__)
 
+# Directories never included in a configuration run's fingerprint
+FINGERPRINT_SKIP_DIRS = ('.git', '.hg', '.svn', '__pycache__')
+# Suffixes of files never included in a configuration run's fingerprint
+FINGERPRINT_SKIP_SUFFIXES = ('.retry', '.pyc', '.log')
+# Settings in ``ansible.cfg``'s ``[defaults]`` section, and the environment
+# variables overriding them, naming files Ansible writes while it runs
+ANSIBLE_RUNTIME_SETTINGS = (
+    ('log_path', 'ANSIBLE_LOG_PATH'),
+    ('fact_caching_connection', 'ANSIBLE_CACHE_PLUGIN_CONNECTION'))
+
 
 class ConfigManagerFactory(object):
     """A factory for configuration managers."""
 
+    _managers = {}
+    _lock = threading.Lock()
+
     @staticmethod
     def get_config_manager(config_manager_name):
         """
         Get a config manager based on the supplied argument.
 
+        A single manager is created per name and returned on every call, so
+        it must be safe to use from multiple threads.
+
         :type config_manager_name: ``str``
         :param config_manager_name: Name of the configuration manager class
                                     to instantiate. One of:
@@ -27,20 +55,37 @@ class ConfigManagerFactory(object):
         :rtype: :class:`.config_manager.ConfigManager`
         :return: A configuration manager object or ``None``.
         """
-        if config_manager_name == 'GalaxyJetstreamIUConfigManager':
-            return GalaxyJetstreamIUConfigManager()
-        assert 0, "Unrecognized config manager: " + config_manager_name
+        with ConfigManagerFactory._lock:
+            manager = ConfigManagerFactory._managers.get(config_manager_name)
+            if manager is None:
+                if config_manager_name == 'GalaxyJetstreamIUConfigManager':
+                    manager = GalaxyJetstreamIUConfigManager()
+                else:
+                    assert 0, ("Unrecognized config manager: " +
+                               config_manager_name)
+                ConfigManagerFactory._managers[config_manager_name] = manager
+            return manager
+
+    @staticmethod
+    def clear():
+        """Discard the cached config managers."""
+        with ConfigManagerFactory._lock:
+            ConfigManagerFactory._managers.clear()
 
 
 class ConfigManager(object):
     """Configuration manager interface."""
 
-    def configure(self, instances):
+    def configure(self, instances, full=False):
         """
         Configure the supplied instances.
 
         :type instances: list of ``CloudBridge.Instance`` objects
         :param instances: A list of objects representing the target nodes.
+
+        :type full: ``bool``
+        :param full: If set, configure all the instances even if the manager
+                     could limit the work to instances that changed.
         """
         pass
 
@@ -48,8 +93,17 @@ class ConfigManager(object):
 class GalaxyJetstreamIUConfigManager(ConfigManager):
     """Config manager for Galaxy node configuration on Jetstream at IU."""
 
-    def __init__(self):
-        """Initialize the object with variables from config file."""
+    def __init__(self, runner_class=AnsibleRunner):
+        """
+        Initialize the object with variables from config file.
+
+        :type runner_class: ``class``
+        :param runner_class: Class used to run the playbook; it must accept
+                             the same arguments as :class:`.AnsibleRunner`.
+        """
+        self._runner_class = runner_class
+        # Serializes runs against the shared inventory and applied record
+        self._lock = threading.Lock()
         self._playbook_root = ss.config.get_config_value(
             'ansible_playbook_root', None)
         self._inventory_path = os.path.join(
@@ -59,34 +113,232 @@ class GalaxyJetstreamIUConfigManager(ConfigManager):
             self._playbook_root, ss.config.get_config_value(
                 'ansible_playbook', None))
         self._venv_path = ss.config.get_config_value('config_venv_path', None)
+        # Record of the servers included in the last successful run and of
+        # the fingerprint of its inventory, playbook and variable files
+        self._applied_path = self._inventory_path + '.applied'
+        self._skip_unchanged = ss.config.get_config_bool(
+            'skip_unchanged_configure', True)
+        self._incremental = ss.config.get_config_bool(
+            'incremental_configure', True)
+        self._controller_hosts = ss.config.get_config_value(
+            'incremental_configure_hosts', 'slurmservers')
+        self._abort_on = [s.strip() for s in ss.config.get_config_value(
+            'ansible_abort_on', 'unreachable').split(',') if s.strip()]
+        self._timeout = float(ss.config.get_config_value(
+            'ansible_timeout', 3600))
+
+    def _load_applied(self):
+        """
+        Load the record of the last successful configuration run.
+
+        :rtype: ``Bunch`` or ``None``
+        :return: A ``Bunch`` with ``servers`` (a set of ``(name, ip)``
+                 tuples) and ``fingerprint`` (see :meth:`_fingerprint`, or
+                 ``None`` for records predating fingerprints) fields, or
+                 ``None`` if there is no (readable) record of a previous
+                 successful run.
+        """
+        try:
+            with open(self._applied_path, 'r') as f:
+                record = json.load(f)
+            if isinstance(record, list):
+                record = {'servers': record}
+            return Bunch(servers=set(tuple(n) for n in record['servers']),
+                         fingerprint=record.get('fingerprint'))
+        except (IOError, OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def _save_applied(self, servers, fingerprint):
+        """Record the servers included in a successful configuration run."""
+        try:
+            InventoryFile.write(self._applied_path, json.dumps(
+                {'servers': sorted(servers), 'fingerprint': fingerprint}))
+        except (IOError, OSError) as e:
+            log.warn("Could not record configured servers: {0}".format(e))
+
+    def _runtime_paths(self):
+        """
+        Get the paths of files written while nodes are configured.
+
+        These are the node journal (along with SQLite's companion files) and
+        Ansible's log and fact cache, as set in the environment or in the
+        ``ansible.cfg`` in use. Their contents change from run to run
+        without changing what a run does.
+
+        :rtype: ``set`` of ``str``
+        :return: Absolute paths of the files or directories.
+        """
+        journal = os.path.expanduser(ss.config.get_config_value(
+            'journal_path', '~/.slurmscale-journal.db'))
+        paths = [journal + suffix
+                 for suffix in ('', '-journal', '-wal', '-shm')]
+        cfg_path = os.environ.get('ANSIBLE_CONFIG') or os.path.join(
+            self._playbook_root, 'ansible.cfg')
+        parser = SafeConfigParser()
+        try:
+            parser.read(cfg_path)
+        except Exception as e:
+            log.debug("Could not read {0}: {1}".format(cfg_path, e))
+        for option, variable in ANSIBLE_RUNTIME_SETTINGS:
+            value = os.environ.get(variable)
+            if not value and parser.has_option('defaults', option):
+                value = parser.get('defaults', option, raw=True)
+            if value:
+                paths.append(os.path.join(os.path.dirname(cfg_path),
+                                          os.path.expanduser(value)))
+        return set(os.path.abspath(path) for path in paths)
+
+    def _fingerprint_paths(self):
+        """
+        Get the files whose contents make up a run's fingerprint.
+
+        These are the files under the playbook root, which holds the
+        playbook along with its roles, templates, included tasks, variable
+        files and ``ansible.cfg``, and an ``ANSIBLE_CONFIG`` file. Version
+        control metadata, the configuration virtualenv, the inventory and
+        its bookkeeping files, and files written while nodes are configured
+        (see :meth:`_runtime_paths`) are skipped.
+
+        :rtype: ``list`` of ``str``
+        :return: Paths of the files, sorted.
+        """
+        inventory = os.path.basename(self._inventory_path)
+        skip = self._runtime_paths()
+        if self._venv_path:
+            skip.add(os.path.abspath(self._venv_path))
+        paths = set([self._playbook_path])
+        if os.environ.get('ANSIBLE_CONFIG'):
+            paths.add(os.environ['ANSIBLE_CONFIG'])
+        for root in set([self._playbook_root,
+                         os.path.dirname(self._inventory_path)]):
+            for dirpath, dirnames, filenames in os.walk(root):
+                dirnames[:] = sorted(
+                    d for d in dirnames if d not in FINGERPRINT_SKIP_DIRS and
+                    os.path.abspath(os.path.join(dirpath, d)) not in skip)
+                paths.update(
+                    os.path.join(dirpath, f) for f in filenames
+                    if not f.startswith((inventory, '.' + inventory)) and
+                    not f.endswith(FINGERPRINT_SKIP_SUFFIXES) and
+                    os.path.abspath(os.path.join(dirpath, f)) not in skip)
+        return sorted(paths)
+
+    def _fingerprint(self, inventory):
+        """
+        Compute the fingerprint of a configuration run.
+
+        :type inventory: ``str``
+        :param inventory: The rendered inventory of the run.
+
+        :rtype: ``str``
+        :return: A SHA-256 digest of the inventory and of the contents of
+                 the files listed by :meth:`_fingerprint_paths`. Roles or
+                 files used by the playbook from outside the playbook root
+                 (e.g., from a ``roles_path``) are not covered.
+        """
+        digest = hashlib.sha256(inventory.encode('utf-8'))
+        for path in self._fingerprint_paths():
+            digest.update(b'\0' + path.encode('utf-8') + b'\0')
+            try:
+                with open(path, 'rb') as f:
+                    digest.update(f.read())
+            except (IOError, OSError):
+                digest.update(b'\0missing')
+        return digest.hexdigest()
+
+    def _clear_applied(self):
+        """Forget the last successful run so the next run is a full one."""
+        if os.path.exists(self._applied_path):
+            os.remove(self._applied_path)
+
+    def _run_playbook(self, limit=None):
+        """Run the playbook, possibly limited to the supplied host pattern."""
+        runner = self._runner_class(
+            playbook_root=self._playbook_root,
+            inventory_filename=self._inventory_path,
+            playbook_path=self._playbook_path,
+            venv_path=self._venv_path,
+            limit=limit,
+            abort_on=self._abort_on,
+            timeout=self._timeout)
+        return runner.run()
 
-    def configure(self, servers):
+    def configure(self, servers, full=False):
         """
         Configure the supplied servers.
 
+        If the last run succeeded with the same inventory and the same files
+        under the playbook root (and ``skip_unchanged_configure`` is
+        enabled), there is nothing to do and the playbook is not run, e.g.,
+        when a failed node removal is retried; use ``full`` to run it after
+        changing files kept outside the playbook root. Otherwise, if a
+        previous run succeeded (and ``incremental_configure`` is enabled),
+        the playbook is run only against servers that were not part of that
+        run plus the controller hosts (``incremental_configure_hosts`` config
+        value), which regenerate the Slurm configuration for the new set of
+        servers. If the limited run fails, a full run is attempted.
+
         :type servers: list of objects with ``name`` and ``ip`` properties
         :param servers: A list of servers to configure. Each element of the
                         list must be an object (such as ``Node`` or ``Bunch``)
-                        that has ``name`` and ``ip`` fields.
+                        that has ``name`` and ``ip`` fields, and optionally
+                        ``cpus`` and ``memory`` (in MB) fields with the shape
+                        of the server's flavor and a ``hostname`` field with
+                        a hostname to set on the server.
 
-        :type instances: list of ``CloudBridge.Instance`` objects
-        :param instances: A list of objects representing the target nodes.
+        :type full: ``bool``
+        :param full: If set, run the playbook against all the servers, even
+                     if nothing changed since the last run.
 
         :rtype: tuple of ``str``
         :return: A tuple with the process exit code and stdout.
         """
-        nodes = []
-        log.debug("Configuring servers {0}".format(servers))
-        # Format server info into a dict
-        for server in servers:
-            nodes.append({'name': server.name, 'ip': server.ip})
-        # Create the inventory file
-        InventoryFile.create(self._inventory_path, nodes)
-        # Run ansible-playbook
-        log.info("Starting to configure nodes via ansible-playbook.")
-        runner = AnsibleRunner(
-            playbook_root=self._playbook_root,
-            inventory_filename=self._inventory_path,
-            playbook_path=self._playbook_path,
-            venv_path=self._venv_path)
-        return runner.run()
+        with self._lock:
+            nodes = []
+            log.debug("Configuring servers {0}".format(servers))
+            # Format server info into a dict
+            pools = get_pools()
+            for server in servers:
+                node = {'name': server.name, 'ip': server.ip,
+                        'cpus': getattr(server, 'cpus', None),
+                        'memory': getattr(server, 'memory', None),
+                        'hostname': getattr(server, 'hostname', None)}
+                pool = pools.for_node(server.name)
+                if not pool.default:
+                    node.update(group=pool.prefix, partition=pool.partition)
+                nodes.append(node)
+            current = set((n['name'], n['ip']) for n in nodes)
+            # Create the inventory file
+            inventory = InventoryFile.render(nodes)
+            InventoryFile.write(self._inventory_path, inventory)
+            fingerprint = self._fingerprint(inventory)
+            previous = self._load_applied()
+            if (self._skip_unchanged and not full and previous is not None and
+                    previous.fingerprint == fingerprint):
+                log.info("Inventory, playbook and variables unchanged since "
+                         "the last successful run; skipping configuration.")
+                metrics.inc('slurmscale_configure_skipped_total')
+                return (0, '')
+            # Run ansible-playbook
+            limit = None
+            if self._incremental and not full and previous is not None:
+                added = sorted(name for name, _ in current - previous.servers)
+                log.debug("Incremental configuration; new servers: {0}, "
+                          "removed servers: {1}".format(added, sorted(
+                              name for name, _ in previous.servers - current)))
+                limit = ','.join([self._controller_hosts] + added)
+            log.info("Starting to configure nodes via ansible-playbook.")
+            with metrics.timer('slurmscale_configure_seconds',
+                               mode='incremental' if limit else 'full'):
+                ret_code, out = self._run_playbook(limit)
+            if ret_code != 0 and limit:
+                log.warn("Incremental configuration failed with exit code "
+                         "{0}; running a full configuration.".format(ret_code))
+                metrics.inc('slurmscale_configure_fallbacks_total')
+                with metrics.timer('slurmscale_configure_seconds',
+                                   mode='full'):
+                    ret_code, out = self._run_playbook()
+            if ret_code == 0:
+                self._save_applied(current, fingerprint)
+            else:
+                self._clear_applied()
+            return (ret_code, out)
@@ -0,0 +1,59 @@
+"""A catalog of the instance flavors nodes can be launched with."""
+from .sizing import Flavor
+
+import slurmscale as ss
+
+import logging
+log = logging.getLogger(__name__)
+
+# CPUs and memory (in MB) of Jetstream flavors; their cost defaults to the
+# number of CPUs, which is what an hour of an instance costs in SUs
+JETSTREAM_FLAVORS = {
+    'm1.tiny': (1, 2048),
+    'm1.small': (2, 4096),
+    'm1.quad': (4, 10240),
+    'm1.medium': (6, 16384),
+    'm1.large': (10, 30720),
+    'm1.xlarge': (24, 61440),
+    'm1.xxlarge': (44, 122880),
+}
+
+
+def get_flavor(name):
+    """
+    Get a flavor from the catalog.
+
+    The ``cpus``, ``memory`` (in MB) and ``cost`` of a flavor are read from
+    its ``flavor:<name>`` config section; the CPUs and memory of Jetstream
+    flavors need not be configured.
+
+    :type name: ``str``
+    :param name: Name of the flavor, e.g., ``m1.large``.
+
+    :rtype: :class:`.sizing.Flavor`
+    :return: The flavor.
+    """
+    section = 'flavor:' + name
+    cpus, memory = JETSTREAM_FLAVORS.get(name, (None, None))
+    cpus = ss.config.get_config_value('cpus', cpus, section=section)
+    memory = ss.config.get_config_value('memory', memory, section=section)
+    assert cpus and memory, (
+        "Unknown flavor {0}; set its cpus and memory in a [{1}] config "
+        "section".format(name, section))
+    return Flavor(name, cpus, memory,
+                  ss.config.get_config_value('cost', None, section=section))
+
+
+def get_flavors(names):
+    """
+    Get a number of flavors from the catalog.
+
+    :type names: ``str`` or ``list`` of ``str``
+    :param names: Flavor names, as a list or a comma-separated string.
+
+    :rtype: ``list`` of :class:`.sizing.Flavor`
+    :return: The flavors, in the order of ``names``.
+    """
+    if not isinstance(names, list):
+        names = names.split(',')
+    return [get_flavor(name.strip()) for name in names if name.strip()]
@@ -0,0 +1,255 @@
+"""Forecast job demand from the history of job submissions."""
+import collections
+import math
+import threading
+import time
+
+from . import sizing
+
+import slurmscale as ss
+
+import logging
+log = logging.getLogger(__name__)
+
+# Job states in which a job holds, or is waiting for, capacity
+ACTIVE_STATES = ('PENDING', 'CONFIGURING', 'RUNNING', 'COMPLETING',
+                 'SUSPENDED')
+
+
+def job_cpus(job):
+    """
+    Get the total number of CPUs requested by a job.
+
+    :type job: ``dict``
+    :param job: A job dict, as provided by ``pyslurm.job().get()``.
+
+    :rtype: ``int``
+    :return: Number of CPUs across all of the job's nodes.
+    """
+    nodes, cpus_per_node, _ = sizing.job_request(job)
+    return nodes * cpus_per_node
+
+
+class DemandForecaster(object):
+    """
+    Forecast the CPUs that jobs will request in the near future.
+
+    Job snapshots passed to :meth:`observe` are compared with the previous
+    ones to find the jobs submitted and completed since. Requested CPUs are
+    summed in fixed ``interval``-second buckets; when a bucket closes, its
+    totals update exponentially weighted moving averages (EWMA) of the
+    submission and completion rates. If a ``season`` is set (e.g., a day),
+    an EWMA is also kept for each bucket of the season, so recurring bursts
+    (e.g., every morning) are anticipated from what happened at the same
+    time in earlier seasons.
+    """
+
+    def __init__(self, interval=None, alpha=None, season=None, history=None):
+        """
+        Initialize the forecaster with no history.
+
+        :type interval: ``float``
+        :param interval: Bucket size, in seconds. If not supplied,
+                         ``forecast_interval`` config value is used.
+
+        :type alpha: ``float``
+        :param alpha: EWMA smoothing factor between 0 and 1; larger values
+                      follow recent buckets more closely. If not supplied,
+                      ``forecast_alpha`` config value is used.
+
+        :type season: ``float``
+        :param season: Length of the demand cycle, in seconds, or 0 for no
+                       seasonal estimates. If not supplied,
+                       ``forecast_season`` config value is used.
+
+        :type history: ``int``
+        :param history: Number of closed buckets kept in :attr:`history`.
+        """
+        config = ss.config.get_config_value
+        self.interval = float(interval or config('forecast_interval', 300))
+        self.alpha = float(alpha if alpha is not None else
+                           config('forecast_alpha', 0.3))
+        self.season = float(season if season is not None else
+                            config('forecast_season', 0))
+        # Closed buckets as (start time, CPUs submitted, CPUs completed)
+        self.history = collections.deque(maxlen=history or 288)
+        self._lock = threading.Lock()
+        self._bucket = None  # Start time of the open bucket
+        self._submitted = 0  # CPUs submitted in the open bucket
+        self._completed = 0  # CPUs completed in the open bucket
+        self._submit_rate = None  # EWMA of CPUs submitted per bucket
+        self._complete_rate = None  # EWMA of CPUs completed per bucket
+        self._seasonal = {}  # Bucket of the season -> EWMA of CPUs submitted
+        self._active = None  # Job ID -> CPUs, for the last observed jobs
+
+    def _ewma(self, average, value):
+        """Update a moving average with a new value."""
+        if average is None:
+            return float(value)
+        return self.alpha * value + (1 - self.alpha) * average
+
+    def _slot(self, when):
+        """Get the bucket of the season a point in time falls in."""
+        return int((when % self.season) // self.interval)
+
+    def _advance(self, now):
+        """Close all the buckets that ended by ``now``; call with the lock."""
+        start = now - now % self.interval
+        if self._bucket is None:
+            self._bucket = start
+            return
+        # After a long gap, only the buckets of the last season (or the
+        # last one) matter; older empty buckets would just decay averages
+        skip = max(self.interval, self.season)
+        if start - self._bucket > skip:
+            self._close()
+            self._bucket = start - skip
+        while self._bucket < start:
+            self._close()
+            self._bucket += self.interval
+
+    def _close(self):
+        """Fold the open bucket into the averages and start a new one."""
+        self._submit_rate = self._ewma(self._submit_rate, self._submitted)
+        self._complete_rate = self._ewma(self._complete_rate,
+                                         self._completed)
+        if self.season:
+            slot = self._slot(self._bucket)
+            self._seasonal[slot] = self._ewma(self._seasonal.get(slot),
+                                              self._submitted)
+        self.history.append((self._bucket, self._submitted, self._completed))
+        self._submitted = self._completed = 0
+
+    def record(self, submitted=0, completed=0, now=None):
+        """
+        Record CPUs requested by submitted jobs and freed by completed ones.
+
+        :type submitted: ``int``
+        :param submitted: CPUs requested by jobs submitted at ``now``.
+
+        :type completed: ``int``
+        :param completed: CPUs released by jobs completed at ``now``.
+
+        :type now: ``float``
+        :param now: Time of the events as a Unix timestamp; defaults to the
+                    clock. Events older than the open bucket are counted in
+                    the open bucket.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            self._advance(now)
+            self._submitted += submitted
+            self._completed += completed
+
+    def observe(self, jobs, now=None):
+        """
+        Update the history from a snapshot of the job queue.
+
+        The first snapshot only sets the baseline. Jobs in later snapshots
+        that were not active before count as submitted at their
+        ``submit_time`` and active jobs that are gone, or no longer active,
+        count as completed.
+
+        :type jobs: ``dict``
+        :param jobs: Job dicts keyed by job ID, as provided by
+                     ``pyslurm.job().get()`` or ``snapshot.jobs()``.
+
+        :type now: ``float``
+        :param now: Time of the snapshot as a Unix timestamp; defaults to the
+                    clock.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            previous = self._active
+            active = {}
+            submitted = []
+            for job_id, job in jobs.items():
+                if job.get('job_state') not in ACTIVE_STATES:
+                    continue
+                if previous is not None and job_id in previous:
+                    active[job_id] = previous[job_id]
+                    continue
+                active[job_id] = job_cpus(job)
+                submitted.append((job.get('submit_time') or now,
+                                  active[job_id]))
+            self._active = active
+            if previous is None:
+                self._advance(now)
+                return
+            for when, cpus in sorted(submitted):
+                self._advance(min(when, now))
+                self._submitted += cpus
+            self._advance(now)
+            self._completed += sum(cpus for job_id, cpus in previous.items()
+                                   if job_id not in active)
+
+    def _estimate(self, when):
+        """Estimate the CPUs submitted in the bucket containing ``when``."""
+        if self.season:
+            estimate = self._seasonal.get(self._slot(when))
+            if estimate is not None:
+                return estimate
+        return self._submit_rate or 0.0
+
+    def forecast(self, horizon, now=None):
+        """
+        Forecast the CPUs that will be requested over the next ``horizon``.
+
+        :type horizon: ``float``
+        :param horizon: Number of seconds to forecast.
+
+        :type now: ``float``
+        :param now: Current time as a Unix timestamp; defaults to the clock.
+
+        :rtype: ``tuple`` of ``float``
+        :return: A ``(submitted, completed)`` tuple with the CPUs expected
+                 to be requested by new jobs and to be released by
+                 completed jobs; ``(0, 0)`` before any bucket closed.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            self._advance(now)
+            if self._submit_rate is None:
+                return (0.0, 0.0)
+            submitted = 0.0
+            when, end = now, now + horizon
+            while when < end:
+                step = min(end, when - when % self.interval +
+                           self.interval) - when
+                submitted += self._estimate(when) * step / self.interval
+                when += step
+            completed = self._complete_rate * horizon / self.interval
+        return (submitted, completed)
+
+    def nodes_needed(self, shape, free_cpus=0, horizon=None, now=None):
+        """
+        Compute the number of nodes to add ahead of the forecast demand.
+
+        The CPUs expected to be requested over the ``horizon``, less those
+        expected to be released by completing jobs and ``free_cpus``, are
+        rounded to whole nodes of the supplied shape.
+
+        :type shape: :class:`.sizing.NodeShape`
+        :param shape: Resources of a node.
+
+        :type free_cpus: ``int``
+        :param free_cpus: Unallocated CPUs already in the cluster.
+
+        :type horizon: ``float``
+        :param horizon: Number of seconds to provision ahead for; should
+                        cover the time it takes to add nodes. If not
+                        supplied, ``forecast_horizon`` config value is used.
+
+        :rtype: ``int``
+        :return: Number of nodes to add.
+        """
+        if horizon is None:
+            horizon = float(ss.config.get_config_value('forecast_horizon',
+                                                       900))
+        submitted, completed = self.forecast(horizon, now)
+        deficit = submitted - completed - free_cpus
+        needed = max(0, int(math.floor(deficit / shape.cpus + 0.5)))
+        log.debug("Forecast {0:.0f} CPU(s) requested and {1:.0f} released "
+                  "in {2:.0f}s with {3} free; {4} node(s) needed".format(
+                      submitted, completed, horizon, free_cpus, needed))
+        return needed
@@ -0,0 +1,94 @@
+"""Convert between lists of node names and Slurm hostlist expressions."""
+import re
+
+NAME_RE = re.compile(r'^(.*?)(\d+)$')
+
+
+def _ranges(numbers):
+    """Collapse sorted, unique integers into ``(start, end)`` ranges."""
+    ranges = []
+    for number in numbers:
+        if ranges and number == ranges[-1][1] + 1:
+            ranges[-1][1] = number
+        else:
+            ranges.append([number, number])
+    return ranges
+
+
+def compress(names):
+    """
+    Compress a list of node names into a Slurm hostlist expression.
+
+    For example, ``['jetstream-iu-large3', 'jetstream-iu-large4',
+    'jetstream-iu-large5', 'jetstream-iu-large12']`` becomes
+    ``jetstream-iu-large[3-5,12]``. Zero-padded suffixes keep their width and
+    names without a numeric suffix are included as-is.
+
+    :type names: ``list`` of ``str``
+    :param names: Node names to compress.
+
+    :rtype: ``str``
+    :return: A hostlist expression matching all the supplied names.
+    """
+    groups = {}  # (prefix, padded width) -> set of suffix numbers
+    order = []
+    plain = []
+    for name in names:
+        m = NAME_RE.match(name)
+        if not m:
+            if name not in plain:
+                plain.append(name)
+            continue
+        prefix, digits = m.groups()
+        width = len(digits) if digits.startswith('0') and len(digits) > 1 \
+            else 0
+        key = (prefix, width)
+        if key not in groups:
+            groups[key] = set()
+            order.append(key)
+        groups[key].add(int(digits))
+    parts = []
+    for prefix, width in order:
+        numbers = sorted(groups[(prefix, width)])
+        fmt = "{0:0%dd}" % width if width else "{0}"
+        if len(numbers) == 1:
+            parts.append(prefix + fmt.format(numbers[0]))
+            continue
+        ranges = []
+        for start, end in _ranges(numbers):
+            if start == end:
+                ranges.append(fmt.format(start))
+            else:
+                ranges.append("{0}-{1}".format(fmt.format(start),
+                                               fmt.format(end)))
+        parts.append("{0}[{1}]".format(prefix, ','.join(ranges)))
+    return ','.join(parts + plain)
+
+
+def expand(expression):
+    """
+    Expand a Slurm hostlist expression into a list of node names.
+
+    Only a single bracketed range per name is supported (e.g.,
+    ``node[1-3,7],login``).
+
+    :type expression: ``str``
+    :param expression: A hostlist expression.
+
+    :rtype: ``list`` of ``str``
+    :return: Node names matching the expression.
+    """
+    names = []
+    for part in re.findall(r'[^,\[]+(?:\[[^\]]*\][^,]*)?', expression):
+        m = re.match(r'^([^\[]*)\[([^\]]*)\](.*)$', part)
+        if not m:
+            names.append(part)
+            continue
+        prefix, ranges, suffix = m.groups()
+        for r in ranges.split(','):
+            start, _, end = r.partition('-')
+            width = len(start) if start.startswith('0') else 0
+            for number in range(int(start), int(end or start) + 1):
+                names.append("{0}{1}{2}".format(
+                    prefix, str(number).zfill(width), suffix))
+    return names
@@ -0,0 +1,212 @@
+"""A durable record of node lifecycle transitions."""
+import os
+import sqlite3
+import threading
+import time
+
+from bunch import Bunch
+
+import slurmscale as ss
+
+import logging
+log = logging.getLogger(__name__)
+
+# Lifecycle states
+REQUESTED = 'requested'  # Name allocated; instance may be provisioning
+READY = 'ready'  # Instance provisioned and accepting ssh logins
+CONFIGURED = 'configured'  # Node configured into the cluster
+DRAINING = 'draining'  # Node disabled in Slurm, pending removal
+REMOVED = 'removed'  # Node configured out of the cluster
+DELETED = 'deleted'  # Node's instance terminated
+FAILED = 'failed'  # Operation failed and was rolled back
+CLAIMED = 'claimed'  # Standby instance became a node, under another name
+
+# Operations
+ADD = 'add'
+REMOVE = 'remove'  # Remove the node and delete its instance
+DETACH = 'detach'  # Remove the node but keep its instance
+STANDBY = 'standby'  # Keep an instance in the warm pool
+
+# States in which each operation is complete
+_DONE = {ADD: (CONFIGURED,), REMOVE: (DELETED,), DETACH: (REMOVED, DELETED),
+         STANDBY: (CLAIMED, DELETED)}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    time REAL NOT NULL,
+    name TEXT NOT NULL,
+    operation TEXT NOT NULL,
+    state TEXT NOT NULL,
+    ip TEXT,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS nodes (
+    name TEXT PRIMARY KEY,
+    operation TEXT NOT NULL,
+    state TEXT NOT NULL,
+    ip TEXT,
+    error TEXT,
+    updated REAL NOT NULL
+);
+"""
+
+
+class Journal(object):
+    """
+    Record node lifecycle transitions in a local SQLite database.
+
+    Each transition is appended to an ``events`` table and reflected in a
+    ``nodes`` table holding the latest state of each node, in a single
+    transaction that is committed before the call returns. Operations that
+    were interrupted (e.g., by a crash) are listed by :meth:`in_flight` so
+    they can be resumed or rolled back.
+    """
+
+    def __init__(self, path):
+        """
+        Open (and create if needed) the journal.
+
+        :type path: ``str``
+        :param path: Path to the journal database file.
+        """
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._db.executescript(_SCHEMA)
+            self._db.commit()
+
+    def record(self, nodes, state, operation=None, error=None):
+        """
+        Record a state transition for a number of nodes.
+
+        :type nodes: ``list`` of objects with ``name`` and ``ip`` fields
+        :param nodes: Nodes (e.g., :class:`.Node` or ``Bunch`` objects)
+                      making the transition. ``ip`` may be ``None`` if not
+                      yet known.
+
+        :type state: ``str``
+        :param state: New state, e.g., ``journal.READY``.
+
+        :type operation: ``str``
+        :param operation: Operation the transition belongs to (``add``,
+                          ``remove``, ``detach`` or ``standby``). If not
+                          supplied, the node's current operation is kept.
+
+        :type error: ``str``
+        :param error: Failure message, if any.
+        """
+        if not nodes:
+            return
+        now = time.time()
+        with self._lock:
+            with self._db:  # Commits, or rolls back on error
+                for node in nodes:
+                    name = node.name
+                    row = self._db.execute(
+                        "SELECT operation, ip FROM nodes WHERE name = ?",
+                        (name,)).fetchone()
+                    op = operation or (row[0] if row else ADD)
+                    ip = getattr(node, 'ip', None) or (row[1] if row else None)
+                    self._db.execute(
+                        "INSERT INTO events (time, name, operation, state, "
+                        "ip, error) VALUES (?, ?, ?, ?, ?, ?)",
+                        (now, name, op, state, ip, error))
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO nodes (name, operation, "
+                        "state, ip, error, updated) VALUES (?, ?, ?, ?, ?, ?)",
+                        (name, op, state, ip, error, now))
+        log.debug("Journal: {0} -> {1}".format(
+                  [node.name for node in nodes], state))
+
+    def in_flight(self):
+        """
+        List nodes whose last operation has not completed.
+
+        :rtype: ``list`` of ``Bunch``
+        :return: One entry per node with ``name``, ``operation``, ``state``,
+                 ``ip``, ``error`` and ``updated`` fields, oldest first.
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT name, operation, state, ip, error, updated FROM nodes "
+                "WHERE state != ? ORDER BY updated", (FAILED,)).fetchall()
+        return [Bunch(name=r[0], operation=r[1], state=r[2], ip=r[3],
+                      error=r[4], updated=r[5])
+                for r in rows if r[2] not in _DONE.get(r[1], ())]
+
+    def history(self, name):
+        """
+        Get all recorded transitions of a node.
+
+        :type name: ``str``
+        :param name: Name of the node.
+
+        :rtype: ``list`` of ``Bunch``
+        :return: Transitions, oldest first, with ``time``, ``operation``,
+                 ``state``, ``ip`` and ``error`` fields.
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT time, operation, state, ip, error FROM events "
+                "WHERE name = ? ORDER BY id", (name,)).fetchall()
+        return [Bunch(time=r[0], operation=r[1], state=r[2], ip=r[3],
+                      error=r[4]) for r in rows]
+
+    def prune(self, max_age):
+        """
+        Remove history of completed operations older than ``max_age`` seconds.
+
+        :type max_age: ``float``
+        :param max_age: Number of seconds completed history is kept.
+
+        :rtype: ``int``
+        :return: Number of events removed.
+        """
+        cutoff = time.time() - max_age
+        active = [e.name for e in self.in_flight()]
+        with self._lock:
+            with self._db:
+                cur = self._db.execute(
+                    "DELETE FROM events WHERE time < ? AND name NOT IN "
+                    "({0})".format(','.join('?' * len(active))),
+                    [cutoff] + active)
+                self._db.execute(
+                    "DELETE FROM nodes WHERE updated < ? AND name NOT IN "
+                    "({0})".format(','.join('?' * len(active))),
+                    [cutoff] + active)
+        return cur.rowcount
+
+    def close(self):
+        """Close the journal database."""
+        with self._lock:
+            self._db.close()
+
+
+_journal = None
+_journal_lock = threading.Lock()
+
+
+def get_journal():
+    """
+    Get the journal shared by the library.
+
+    The journal is opened on first use at ``journal_path`` (by default,
+    ``~/.slurmscale-journal.db``) unless ``journal`` config value is
+    disabled.
+
+    :rtype: :class:`Journal` or ``None``
+    :return: The shared journal or ``None`` if journaling is disabled.
+    """
+    global _journal
+    if not ss.config.get_config_bool('journal', True):
+        return None
+    with _journal_lock:
+        if _journal is None:
+            _journal = Journal(os.path.expanduser(ss.config.get_config_value(
+                'journal_path', '~/.slurmscale-journal.db')))
+        return _journal
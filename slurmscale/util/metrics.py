@@ -0,0 +1,229 @@
+"""
+Counters and timing histograms exposed in Prometheus text format.
+
+Recording is disabled by default; while disabled, :func:`inc`,
+:func:`observe` and :func:`timer` return immediately, so instrumented code
+pays only for a function call. Enable recording with :func:`enable` (the
+autoscaler does so when ``metrics_port`` is configured).
+"""
+import threading
+import time
+
+try:
+    from http.server import BaseHTTPRequestHandler
+    from http.server import HTTPServer
+except ImportError:  # Python 2
+    from BaseHTTPServer import BaseHTTPRequestHandler
+    from BaseHTTPServer import HTTPServer
+
+import logging
+log = logging.getLogger(__name__)
+
+# Upper bounds, in seconds, of histogram buckets
+BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600, 1800,
+           float('inf'))
+
+enabled = False
+_lock = threading.Lock()
+_counters = {}  # name -> {labels: value}
+_histograms = {}  # name -> {labels: [bucket counts, sum, count]}
+
+
+def enable(on=True):
+    """
+    Turn recording of metrics on or off.
+
+    :type on: ``bool``
+    :param on: Whether to record metrics.
+    """
+    global enabled
+    enabled = on
+
+
+def reset():
+    """Discard all recorded metrics."""
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+
+def _key(labels):
+    """Turn a labels dict into a hashable, ordered key."""
+    return tuple(sorted(labels.items()))
+
+
+def inc(name, value=1, **labels):
+    """
+    Increment a counter.
+
+    :type name: ``str``
+    :param name: Metric name, e.g., ``slurmscale_nodes_added_total``.
+
+    :type value: ``float``
+    :param value: Amount to increment by.
+
+    :type labels: ``str``
+    :param labels: Label names and values for this sample.
+    """
+    if not enabled:
+        return
+    key = _key(labels)
+    with _lock:
+        series = _counters.setdefault(name, {})
+        series[key] = series.get(key, 0) + value
+
+
+def observe(name, seconds, **labels):
+    """
+    Record a duration in a histogram.
+
+    :type name: ``str``
+    :param name: Metric name, e.g., ``slurmscale_add_seconds``.
+
+    :type seconds: ``float``
+    :param seconds: Observed duration.
+
+    :type labels: ``str``
+    :param labels: Label names and values for this sample.
+    """
+    if not enabled:
+        return
+    key = _key(labels)
+    with _lock:
+        series = _histograms.setdefault(name, {})
+        hist = series.get(key)
+        if hist is None:
+            hist = series[key] = [[0] * len(BUCKETS), 0.0, 0]
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                hist[0][i] += 1
+        hist[1] += seconds
+        hist[2] += 1
+
+
+class _Timer(object):
+    """Context manager recording the duration of its block."""
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.name, time.time() - self.start, **self.labels)
+        return False
+
+
+class _NullTimer(object):
+    """Context manager doing nothing, used while recording is disabled."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_null_timer = _NullTimer()
+
+
+def timer(name, **labels):
+    """
+    Time a block of code into a histogram.
+
+    For example::
+
+        with metrics.timer('slurmscale_ansible_run_seconds'):
+            runner.run()
+
+    :type name: ``str``
+    :param name: Metric name.
+
+    :type labels: ``str``
+    :param labels: Label names and values for this sample.
+    """
+    if not enabled:
+        return _null_timer
+    return _Timer(name, labels)
+
+
+def _format_labels(key, extra=None):
+    """Format a labels key as ``{name="value",...}``."""
+    items = list(key) + (extra or [])
+    if not items:
+        return ''
+    return '{' + ','.join('{0}="{1}"'.format(
+        k, str(v).replace('\\', '\\\\').replace('"', '\\"'))
+        for k, v in items) + '}'
+
+
+def render():
+    """
+    Render all recorded metrics in Prometheus text exposition format.
+
+    :rtype: ``str``
+    :return: The metrics, one sample per line.
+    """
+    lines = []
+    with _lock:
+        for name in sorted(_counters):
+            lines.append("# TYPE {0} counter".format(name))
+            for key, value in sorted(_counters[name].items()):
+                lines.append("{0}{1} {2}".format(
+                    name, _format_labels(key), value))
+        for name in sorted(_histograms):
+            lines.append("# TYPE {0} histogram".format(name))
+            for key, (buckets, total, count) in sorted(
+                    _histograms[name].items()):
+                for bound, n in zip(BUCKETS, buckets):
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append("{0}_bucket{1} {2}".format(
+                        name, _format_labels(key, [('le', le)]), n))
+                lines.append("{0}_sum{1} {2}".format(
+                    name, _format_labels(key), total))
+                lines.append("{0}_count{1} {2}".format(
+                    name, _format_labels(key), count))
+    return '\n'.join(lines) + '\n'
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    """Serve rendered metrics on ``/metrics``."""
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        log.debug("Metrics request: " + format % args)
+
+
+def serve(port, address=''):
+    """
+    Serve metrics over HTTP on ``/metrics`` from a background thread.
+
+    :type port: ``int``
+    :param port: Port to listen on.
+
+    :type address: ``str``
+    :param address: Address to bind to; all interfaces by default.
+
+    :rtype: ``HTTPServer``
+    :return: The running server; call ``shutdown()`` to stop it.
+    """
+    server = HTTPServer((address, port), _MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever,
+                              name='metrics_server')
+    thread.daemon = True
+    thread.start()
+    log.info("Serving metrics on port {0}".format(port))
+    return server
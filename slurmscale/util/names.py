@@ -0,0 +1,135 @@
+"""Allocate names for new cluster nodes."""
+import re
+import threading
+
+from . import journal
+from .snapshot import snapshot
+
+import slurmscale as ss
+
+import logging
+log = logging.getLogger(__name__)
+
+
+class NameAllocator(object):
+    """
+    Hand out unused node names of the form ``<prefix><number>``.
+
+    Numbers in use are kept in an index that is rebuilt only when the
+    cluster snapshot changes. A name counts as used if Slurm knows a node by
+    that name, if the journal has an unfinished operation for it or if it
+    is reserved. Names are reserved atomically, so concurrent additions
+    never get the same name, and stay reserved until released.
+    """
+
+    def __init__(self, prefix, reuse_gaps=None):
+        """
+        Initialize the allocator.
+
+        :type prefix: ``str``
+        :param prefix: Common prefix of the node names.
+
+        :type reuse_gaps: ``bool``
+        :param reuse_gaps: If set, hand out the lowest unused numbers,
+                           filling gaps left by removed nodes, which keeps
+                           Slurm hostlist expressions short. Otherwise, the
+                           numbers continue from the largest one in use. If
+                           not supplied, ``reuse_node_names`` config value
+                           is used.
+        """
+        self.prefix = prefix
+        self.reuse_gaps = (reuse_gaps if reuse_gaps is not None else
+                           ss.config.get_config_bool('reuse_node_names',
+                                                     False))
+        self._pattern = re.compile('^{0}([0-9]+)$'.format(re.escape(prefix)))
+        self._lock = threading.Lock()
+        self._indexed = None  # Node data the index was built from
+        self._in_cluster = set()
+        self._reserved = set()
+
+    def _number(self, name):
+        """Get the number in a node name, or ``None`` if it does not match."""
+        m = self._pattern.match(name or '')
+        return int(m.group(1)) if m else None
+
+    def _used(self):
+        """Get all the numbers currently in use; call with the lock held."""
+        nodes = snapshot.nodes()
+        if nodes is not self._indexed:
+            self._in_cluster = set(n for n in map(self._number, nodes)
+                                   if n is not None)
+            self._indexed = nodes
+        used = self._in_cluster | self._reserved
+        node_journal = journal.get_journal()
+        if node_journal:
+            used.update(n for n in (self._number(e.name)
+                                    for e in node_journal.in_flight())
+                        if n is not None)
+        return used
+
+    def reserve(self, count=1):
+        """
+        Reserve names for new nodes.
+
+        For example, with nodes ``jetstream-iu-large[1-3,5]``, reserving two
+        names returns ``jetstream-iu-large6`` and ``jetstream-iu-large7``, or
+        ``jetstream-iu-large4`` and ``jetstream-iu-large6`` if gaps are
+        reused.
+
+        :type count: ``int``
+        :param count: Number of names to reserve.
+
+        :rtype: ``list`` of ``str``
+        :return: Reserved names, in increasing order.
+        """
+        with self._lock:
+            used = self._used()
+            if self.reuse_gaps:
+                numbers = []
+                candidate = 1
+                while len(numbers) < count:
+                    if candidate not in used:
+                        numbers.append(candidate)
+                    candidate += 1
+            else:
+                start = max(used) + 1 if used else 1
+                numbers = list(range(start, start + count))
+            self._reserved.update(numbers)
+        names = ["{0}{1}".format(self.prefix, n) for n in numbers]
+        log.debug("Reserved node name(s): {0}".format(names))
+        return names
+
+    def release(self, names):
+        """
+        Release reserved names.
+
+        Release names once the nodes are part of the cluster or if they
+        could not be provisioned.
+
+        :type names: ``list`` of ``str``
+        :param names: Names returned by :meth:`reserve`.
+        """
+        with self._lock:
+            self._reserved.difference_update(
+                n for n in map(self._number, names) if n is not None)
+        log.debug("Released node name(s): {0}".format(names))
+
+
+_allocators = {}
+_allocators_lock = threading.Lock()
+
+
+def get_allocator(prefix):
+    """
+    Get the name allocator shared by all users of the supplied prefix.
+
+    :type prefix: ``str``
+    :param prefix: Common prefix of the node names.
+
+    :rtype: :class:`NameAllocator`
+    :return: The allocator for the prefix.
+    """
+    with _allocators_lock:
+        if prefix not in _allocators:
+            _allocators[prefix] = NameAllocator(prefix)
+        return _allocators[prefix]
@@ -0,0 +1,271 @@
+"""Groups of nodes that serve Slurm partitions."""
+import re
+import threading
+
+from .flavors import get_flavors
+from .sizing import FLAVOR_OBJECTIVES
+
+import slurmscale as ss
+
+import logging
+log = logging.getLogger(__name__)
+
+# Name of the pool configured by the ``slurmscale`` config section
+DEFAULT_POOL = 'default'
+
+
+def job_partitions(job):
+    """
+    Get the partitions a job was submitted to.
+
+    :type job: ``dict``
+    :param job: A job dict, as provided by ``pyslurm.job().get()``.
+
+    :rtype: ``list`` of ``str``
+    :return: Partition names; a job may be submitted to several.
+    """
+    return [p.strip() for p in (job.get('partition') or '').split(',')
+            if p.strip()]
+
+
+class NodePool(object):
+    """
+    A group of identical nodes serving a Slurm partition.
+
+    Each pool has its own node name prefix, instance flavor and node shape,
+    and its own scaling policy: node count bounds, the number of nodes added
+    at a time and for how long nodes stay idle before they are removed.
+
+    If ``flavors`` are configured for the pool, the flavors of new nodes are
+    chosen from them to suit the waiting jobs, optimizing for the number of
+    instances or for cost (``flavor_objective``); otherwise, all nodes are
+    of the pool's ``instance_type``.
+    """
+
+    def __init__(self, name, partition=None, prefix=None, cpus=None,
+                 memory=None, min_nodes=None, max_nodes=None,
+                 max_nodes_per_cycle=None, min_idle_time=None):
+        """
+        Initialize the pool.
+
+        Settings that are not supplied are read from the ``pool:<name>``
+        config section, or the ``slurmscale`` section for the default pool.
+        Except for the partition, the node name prefix and ``min_nodes``,
+        settings missing from a ``pool:<name>`` section fall back to the
+        ``slurmscale`` ones.
+
+        :type name: ``str``
+        :param name: Name of the pool.
+
+        :type partition: ``str``
+        :param partition: Slurm partition the pool's nodes serve; the pool's
+                          name by default. The default pool serves jobs of
+                          all partitions that no other pool serves.
+
+        :type prefix: ``str``
+        :param prefix: Common prefix of the names of the pool's nodes
+                       (``node_name_prefix``); by default, the default
+                       pool's prefix followed by ``-<name>``.
+
+        :type cpus: ``int``
+        :param cpus: Number of CPUs of a node (``instance_cpus``).
+
+        :type memory: ``int``
+        :param memory: Memory of a node, in MB (``instance_memory``).
+
+        :type min_nodes: ``int``
+        :param min_nodes: Number of nodes never removed (``min_nodes``).
+
+        :type max_nodes: ``int``
+        :param max_nodes: Largest number of nodes in the pool, or 0 for no
+                          limit (``max_nodes``).
+
+        :type max_nodes_per_cycle: ``int``
+        :param max_nodes_per_cycle: Largest number of nodes added at a time
+                                    (``max_nodes_per_cycle``).
+
+        :type min_idle_time: ``float``
+        :param min_idle_time: Number of seconds a node is idle before it is
+                              removed (``min_idle_time``).
+        """
+        self.name = name
+        self.section = None if name == DEFAULT_POOL else 'pool:' + name
+        self.partition = (None if name == DEFAULT_POOL else
+                          partition or self._setting('partition', name,
+                                                     inherit=False))
+        default_prefix = ss.config.get_config_value('node_name_prefix',
+                                                    'jetstream-iu-large')
+        self.prefix = prefix or (default_prefix if self.default else
+                                 self._setting('node_name_prefix', None,
+                                               inherit=False) or
+                                 "{0}-{1}".format(default_prefix, name))
+        self.cpus = int(cpus or self._setting('instance_cpus', 10))
+        self.memory = int(memory or self._setting('instance_memory', 30720))
+        self.min_nodes = int(min_nodes if min_nodes is not None else
+                             self._setting('min_nodes', 0, inherit=False))
+        self.max_nodes = int(max_nodes if max_nodes is not None else
+                             self._setting('max_nodes', 0))
+        self.max_nodes_per_cycle = int(
+            max_nodes_per_cycle if max_nodes_per_cycle is not None else
+            self._setting('max_nodes_per_cycle', 5))
+        self.min_idle_time = float(
+            min_idle_time if min_idle_time is not None else
+            self._setting('min_idle_time', 600))
+        self.instance_type = self._setting('instance_type', 'm1.large')
+        self.flavors = get_flavors(self._setting('flavors', ''))
+        self.flavor_objective = self._setting('flavor_objective', 'count')
+        assert self.flavor_objective in FLAVOR_OBJECTIVES, (
+            "Unknown flavor_objective {0} for pool {1}; use one of {2}".format(
+                self.flavor_objective, name, ', '.join(FLAVOR_OBJECTIVES)))
+        self._pattern = re.compile('^{0}[0-9]+$'.format(re.escape(
+            self.prefix)))
+
+    def __repr__(self):
+        """Return human-readable NodePool representation."""
+        return "<SS-NodePool-{0} ({1})>".format(
+            self.name, self.partition or '*')
+
+    def _setting(self, key, default_value, inherit=True):
+        """Get a setting from the pool's config section."""
+        if self.section:
+            value = ss.config.get_config_value(key, None,
+                                               section=self.section)
+            if value is not None or not inherit:
+                return value if value is not None else default_value
+        return ss.config.get_config_value(key, default_value)
+
+    @property
+    def default(self):
+        """Whether this is the default pool."""
+        return self.name == DEFAULT_POOL
+
+    def task(self, operation):
+        """
+        Get the name of a scaling operation on this pool.
+
+        :rtype: ``str``
+        :return: The operation name, qualified with the pool's name unless
+                 this is the default pool.
+        """
+        if self.default:
+            return operation
+        return "{0}:{1}".format(operation, self.name)
+
+    def owns(self, name):
+        """Check if a node, by name, belongs to this pool."""
+        return bool(self._pattern.match(name or ''))
+
+
+class NodePools(object):
+    """The node pools of the cluster, with the default pool last."""
+
+    def __init__(self, pools):
+        """
+        Initialize the pools.
+
+        :type pools: ``list`` of :class:`NodePool`
+        :param pools: Pools, including the default pool.
+        """
+        self.pools = ([p for p in pools if not p.default] +
+                      [p for p in pools if p.default])
+        # Each node name must belong to a single pool
+        assert not any(p.owns(other.prefix + '1') for p in self.pools
+                       for other in self.pools if other is not p), (
+            "Node pools must have distinct, non-overlapping node name "
+            "prefixes")
+
+    @staticmethod
+    def from_config():
+        """
+        Create the pools from the config file.
+
+        Pools are listed by name in the ``node_pools`` config value and
+        configured in ``pool:<name>`` config sections. The default pool,
+        configured by the ``slurmscale`` section, is always included.
+
+        :rtype: :class:`NodePools`
+        :return: The configured pools.
+        """
+        names = [name.strip() for name in ss.config.get_config_value(
+            'node_pools', '').split(',')]
+        return NodePools([NodePool(name) for name in names
+                          if name and name != DEFAULT_POOL] +
+                         [NodePool(DEFAULT_POOL)])
+
+    def __iter__(self):
+        """Iterate over the pools."""
+        return iter(self.pools)
+
+    def __len__(self):
+        """Return the number of pools."""
+        return len(self.pools)
+
+    @property
+    def default(self):
+        """The default pool."""
+        return self.pools[-1]
+
+    def for_node(self, name):
+        """
+        Get the pool a node belongs to.
+
+        :rtype: :class:`NodePool`
+        :return: The pool whose prefix the node's name has; nodes that do
+                 not match any pool belong to the default pool.
+        """
+        for pool in self.pools:
+            if pool.owns(name):
+                return pool
+        return self.default
+
+    def for_job(self, job):
+        """
+        Get the pool that should run a job.
+
+        :type job: ``dict``
+        :param job: A job dict, as provided by ``pyslurm.job().get()``.
+
+        :rtype: :class:`NodePool`
+        :return: The first pool serving one of the job's partitions, or the
+                 default pool.
+        """
+        partitions = job_partitions(job)
+        for pool in self.pools:
+            if pool.partition in partitions:
+                return pool
+        return self.default
+
+    def split_jobs(self, jobs):
+        """
+        Group jobs by the pool that should run them.
+
+        :type jobs: ``dict``
+        :param jobs: Job dicts keyed by job ID, as provided by
+                     ``pyslurm.job().get()``.
+
+        :rtype: ``dict``
+        :return: Dicts of job dicts keyed by job ID, keyed by pool name.
+        """
+        groups = dict((pool.name, {}) for pool in self.pools)
+        for job_id, job in jobs.items():
+            groups[self.for_job(job).name][job_id] = job
+        return groups
+
+
+_pools = None
+_pools_lock = threading.Lock()
+
+
+def get_pools():
+    """
+    Get the node pools configured for the cluster.
+
+    :rtype: :class:`NodePools`
+    :return: The pools, read from the config file on first use.
+    """
+    global _pools
+    with _pools_lock:
+        if _pools is None:
+            _pools = NodePools.from_config()
+            log.debug("Node pools: {0}".format(_pools.pools))
+        return _pools
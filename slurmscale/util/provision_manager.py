@@ -1,165 +1,770 @@
 """A set of classes used to provision required resources."""
-import paramiko
-import socket
-import subprocess
+import os
+import re
+import threading
 import time
-from cloudbridge.cloud.factory import CloudProviderFactory
-from cloudbridge.cloud.factory import ProviderList
-from paramiko.ssh_exception import AuthenticationException
-from paramiko.ssh_exception import BadHostKeyException
-from paramiko.ssh_exception import SSHException
+from bunch import Bunch
+from multiprocessing.pool import ThreadPool
+
+from . import metrics
+from .readiness import SSHReadinessProbe
 
 import slurmscale as ss
 
 import logging
 log = logging.getLogger(__name__)
 
+_provider = None
+_provider_lock = threading.Lock()
+
+
+def openstack_provider():
+    """
+    Get the OpenStack cloud provider shared by all provision managers.
+
+    The provider is created on first use from ``~/.cloudbridge`` config and
+    reused afterwards, together with its authenticated session and HTTP
+    connections; the session renews its token as it nears expiry.
+    CloudBridge and the OpenStack client libraries are imported only when
+    the provider is first needed.
+
+    :rtype: ``CloudBridge.CloudProvider`` object
+    :return: The shared OpenStack provider.
+    """
+    global _provider
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                from cloudbridge.cloud.factory import CloudProviderFactory
+                from cloudbridge.cloud.factory import ProviderList
+                # ~/.cloudbridge file with access configs is required
+                _provider = CloudProviderFactory().create_provider(
+                    ProviderList.OPENSTACK, {})
+    return _provider
+
 
 class ProvisionManagerFactory(object):
     """A factory for provision managers."""
 
+    _managers = {}
+    _lock = threading.Lock()
+
     @staticmethod
-    def get_provision_manger(provision_manager_name):
+    def get_provision_manger(provision_manager_name, pool=None):
         """
         Get a provision manager based on the supplied argument.
 
+        A single manager is created per name (and pool) and returned on
+        every call, so it must be safe to use from multiple threads.
+
         :type provision_manager_name: ``str``
         :param provision_manager_name: Name of the provision manager class
                                        to instantiate. One of:
-                                       ``JetstreamIUProvisionManager``
+                                       ``JetstreamIUProvisionManager`` or
+                                       ``CompositeProvisionManager``
+
+        :type pool: ``str``
+        :param pool: Name of a node pool whose ``pool:<name>`` config
+                     section overrides the launch settings; the default
+                     settings are used if not supplied.
 
         :rtype: :class:`.provision_manager.ProvisionManager`
         :return: A provision manager object or ``None``.
         """
-        if provision_manager_name == 'JetstreamIUProvisionManager':
-            return JetstreamIUProvisionManager()
-        assert 0, "Unrecognized provision manager: " + provision_manager_name
+        key = (provision_manager_name if pool is None else
+               (provision_manager_name, pool))
+        with ProvisionManagerFactory._lock:
+            manager = ProvisionManagerFactory._managers.get(key)
+            if manager is None:
+                if provision_manager_name == 'JetstreamIUProvisionManager':
+                    manager = JetstreamIUProvisionManager(pool=pool)
+                elif provision_manager_name == 'CompositeProvisionManager':
+                    manager = CompositeProvisionManager.from_config(pool)
+                else:
+                    assert 0, ("Unrecognized provision manager: " +
+                               provision_manager_name)
+                ProvisionManagerFactory._managers[key] = manager
+            return manager
+
+    @staticmethod
+    def clear():
+        """Discard the cached provision managers."""
+        with ProvisionManagerFactory._lock:
+            ProvisionManagerFactory._managers.clear()
 
 
 class ProvisionManager(object):
     """Instance provision manager interface."""
 
-    def create(self, instance_name):
+    def create(self, instance_name, instance_type=None):
         """
         Provision a new instance/VM.
 
         :type instance_name: str
         :param instance_name: Name for the instance to be launched.
 
+        :type instance_type: ``str``
+        :param instance_type: Flavor of the instance instead of the
+                              configured ``instance_type``.
+
         :rtype: ``CloudBridge.Instance`` object
         :return: Launched instance object.
         """
         pass
 
+    def create_many(self, instance_names, instance_types=None):
+        """
+        Provision a number of new instances/VMs concurrently.
+
+        The default implementation runs :meth:`create` for each name in a
+        pool of threads, sized by ``provision_concurrency`` config value.
+
+        :type instance_names: ``list`` of ``str``
+        :param instance_names: Names for the instances to be launched.
+
+        :type instance_types: ``dict``
+        :param instance_types: Flavors of some of the instances, keyed by
+                               name, instead of the configured
+                               ``instance_type``.
+
+        :rtype: ``list`` of ``Bunch``
+        :return: One result per requested name, in the same order. Each
+                 result has ``name``, ``instance`` (a ``CloudBridge.Instance``
+                 object or ``None`` if provisioning failed) and ``error`` (a
+                 failure message or ``None``) fields.
+        """
+        instance_types = instance_types or {}
+
+        def _create(name):
+            # Implementations predating flavors only take a name
+            args = ((name, instance_types[name])
+                    if instance_types.get(name) else (name,))
+            try:
+                return Bunch(name=name, instance=self.create(*args),
+                             error=None)
+            except Exception as e:
+                log.exception("Exception provisioning instance {0}".format(
+                              name))
+                return Bunch(name=name, instance=None, error=str(e))
+
+        return self._map(_create, instance_names)
+
+    def delete(self, nodes):
+        """
+        Delete/terminate the supplied virtual machines.
+
+        :type nodes: list of :class:`Node` objects
+        :param nodes: List of nodes to terminate.
+
+        :rtype: ``dict``
+        :return: A dict mapping each node name to ``True`` if its instance
+                 was terminated or ``False`` otherwise.
+        """
+        pass
+
+    def rename(self, instance, name):
+        """
+        Rename an existing instance.
+
+        :type instance: ``CloudBridge.Instance`` object
+        :param instance: Instance to rename.
+
+        :type name: ``str``
+        :param name: New name for the instance.
+
+        :rtype: ``bool``
+        :return: ``True`` if the instance was renamed.
+        """
+        try:
+            instance.name = name
+            return True
+        except Exception as e:
+            log.warn("Could not rename instance {0} to {1}: {2}".format(
+                     instance.name, name, e))
+            return False
+
+    def _map(self, func, items):
+        """
+        Apply ``func`` to each of the ``items`` in a pool of threads.
+
+        The pool is sized by ``provision_concurrency`` config value.
+
+        :rtype: ``list``
+        :return: Results of ``func``, in the order of ``items``.
+        """
+        if not items:
+            return []
+        concurrency = int(ss.config.get_config_value(
+            'provision_concurrency', 10))
+        pool = ThreadPool(max(1, min(concurrency, len(items))))
+        try:
+            return pool.map(func, items)
+        finally:
+            pool.close()
+            pool.join()
+
 
 class JetstreamIUProvisionManager(ProvisionManager):
     """A provisioner class for obtaining resources from Jetstream at IU."""
 
-    def __init__(self):
-        """Initialize target properties and credentials."""
-        # ~/.cloudbridge file with access configs is required
-        self.provider = CloudProviderFactory().create_provider(
-            ProviderList.OPENSTACK, {})
+    def __init__(self, provider=None, ssh_probe=None, backend=None,
+                 pool=None):
+        """
+        Initialize target properties and credentials.
+
+        Launch settings (``image_id``, ``instance_type``, ``subnet_id``,
+        ``key_pair``, ``security_groups`` and ``zone``) are read from the
+        ``slurmscale`` section of the config file. If a ``pool`` name is
+        supplied, values set in the ``pool:<name>`` section take precedence,
+        and if a ``backend`` name is supplied, values set in the
+        ``backend:<name>`` section take precedence over both.
+
+        :type provider: ``CloudBridge.CloudProvider`` object
+        :param provider: Cloud provider to use instead of the shared
+                         OpenStack provider (see :func:`openstack_provider`).
+
+        :type ssh_probe: :class:`.readiness.SSHReadinessProbe`
+        :param ssh_probe: Probe used to wait for new instances to become
+                          ready instead of one created from config values.
+
+        :type backend: ``str``
+        :param backend: Name of a config file section (without the
+                        ``backend:`` prefix) with launch settings overriding
+                        the default ones.
+
+        :type pool: ``str``
+        :param pool: Name of the node pool the instances are for.
+        """
+        self._provider = provider
+        self.backend = backend
+        self.pool = pool
 
         # Configs come from slurmscale.ini config file
-        self.image_id = ss.config.get_config_value(
+        self.image_id = self._setting(
             'image_id', '736e206d-9c2c-4369-88db-8c3293bd2ad7')
-        self.instance_type = ss.config.get_config_value(
-            'instance_type', 'm1.large')
-        self.subnet_id = ss.config.get_config_value(
+        self.instance_type = self._setting('instance_type', 'm1.large')
+        self.subnet_id = self._setting(
             'subnet_id', '04d0dbf2-c5c2-4c23-b9a9-16f9038f8dac')
-        self.key_pair = ss.config.get_config_value(
-            'key_pair', 'elasticity_kp')
-        self.security_groups = ss.config.get_config_value(
+        self.key_pair = self._setting('key_pair', 'elasticity_kp')
+        self.zone = self._setting('zone', None)
+        self.security_groups = self._setting(
             'security_groups', ['gxy-workers-sg'])
         if not isinstance(self.security_groups, list):
             self.security_groups = self.security_groups.split(',')
+        self.terminate_timeout = float(ss.config.get_config_value(
+            'terminate_timeout', 300))
+        self.ssh_probe = ssh_probe or SSHReadinessProbe(
+            user=ss.config.get_config_value('ssh_user', 'centos'),
+            timeout=float(ss.config.get_config_value('ssh_ready_timeout',
+                                                     600)))
 
-    def _remove_known_host(self, host):
-        """
-        Remove a host from ~/.ssh/known_hosts.
+    def _setting(self, key, default_value):
+        """Get a launch setting for this manager's backend and pool."""
+        sections = [('backend:' + self.backend) if self.backend else None,
+                    ('pool:' + self.pool) if self.pool else None]
+        for section in sections:
+            if section:
+                value = ss.config.get_config_value(key, None,
+                                                   section=section)
+                if value is not None:
+                    return value
+        return ss.config.get_config_value(key, default_value)
 
-        :type host: ``str``
-        :param host: Hostname or IP address of the host to remove from the
-                         known hosts file.
+    @property
+    def provider(self):
+        """
+        The cloud provider; the shared OpenStack provider unless supplied.
 
-        :rtype: ``bool``
-        :return: True if the host was successfully removed.
+        See :func:`openstack_provider`.
         """
-        cmd = "ssh-keygen -R {0}".format(host)
-        p = subprocess.Popen(
-            cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True)
-        (out, err) = p.communicate()
-        if p.wait() == 0:
-            return True
-        return False
+        if self._provider is None:
+            self._provider = openstack_provider()
+        return self._provider
+
+    @provider.setter
+    def provider(self, provider):
+        self._provider = provider
 
-    def _check_ssh(self, ip, user='centos'):
+    def _launch(self, instance_name, instance_type=None):
         """
-        Check for ssh availability on a host.
+        Launch a single instance and wait for it to reach the running state.
 
-        This method assumes the default ssh key (~/.ssh/id_rsa) exists and will
-        be used for authentication.
+        If the instance fails to get to the running state or has no private
+        IP address, it is terminated.
 
-        :type ip: ``str``
-        :param ip: IP address or hostname of the host to check.
+        :type instance_name: ``str``
+        :param instance_name: Name for the instance to be launched.
 
-        :type user: ``str``
-        :param user: Username to use when trying to login.
+        :type instance_type: ``str``
+        :param instance_type: Flavor of the instance instead of the
+                              configured ``instance_type``.
 
-        :rtype: ``bool``
-        :return: True if ssh connection was successful.
+        :rtype: ``Bunch``
+        :return: A result with ``name``, ``instance`` and ``error`` fields.
         """
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        inst = None
         try:
-            ssh.connect(ip, username=user)
-            self._remove_known_host(ip)
-            return True
-        except (BadHostKeyException, AuthenticationException,
-                SSHException, socket.error) as e:
-            log.warn("ssh connection exception for {0}: {1}".format(ip, e))
-        self._remove_known_host(ip)
-        return False
+            img = self.provider.compute.images.get(self.image_id)
+            instance_type = instance_type or self.instance_type
+            log.info("Starting a new {0} instance named {1}".format(
+                     instance_type, instance_name))
+            placement = {'zone': self.zone} if self.zone else {}
+            with metrics.timer('slurmscale_instance_create_seconds'):
+                inst = self.provider.compute.instances.create(
+                    name=instance_name, image=img,
+                    instance_type=instance_type, key_pair=self.key_pair,
+                    security_groups=self.security_groups,
+                    subnet=self.subnet_id, **placement)
+            with metrics.timer('slurmscale_instance_ready_seconds'):
+                inst.wait_till_ready()
+            if not inst.private_ips:
+                log.warn("Instance {0} has no private IP address".format(
+                         instance_name))
+                metrics.inc('slurmscale_provision_failures_total',
+                            stage='network')
+                inst.terminate()
+                return Bunch(name=instance_name, instance=None,
+                             error="Instance has no private IP address")
+            return Bunch(name=instance_name, instance=inst, error=None)
+        except Exception as e:
+            log.exception("Exception launching instance {0}".format(
+                          instance_name))
+            metrics.inc('slurmscale_provision_failures_total',
+                        stage='launch')
+            if inst:
+                inst.terminate()
+            return Bunch(name=instance_name, instance=None, error=str(e))
 
-    def create(self, instance_name):
+    def create(self, instance_name, instance_type=None):
         """
         Provision a new instance/VM.
 
         :type name: ``str``
         :param name: Name for the instance to be launched.
 
+        :type instance_type: ``str``
+        :param instance_type: Flavor of the instance instead of the
+                              configured ``instance_type``.
+
         :rtype: ``CloudBridge.Instance`` object
-        :return: Launched instance object.
+        :return: Launched instance object or ``None`` if the instance did not
+                 become ready.
+        """
+        return self.create_many(
+            [instance_name], {instance_name: instance_type})[0].instance
+
+    def create_many(self, instance_names, instance_types=None):
         """
-        img = self.provider.compute.images.get(self.image_id)
-        log.info("Starting a new instance named {0}".format(instance_name))
-        inst = self.provider.compute.instances.create(
-            name=instance_name, image=img, instance_type=self.instance_type,
-            key_pair=self.key_pair, security_groups=self.security_groups,
-            subnet=self.subnet_id)
-        inst.wait_till_ready()
-        while not self._check_ssh(inst.private_ips[0]):
-            log.debug("Waiting for ssh on {0}...".format(inst.name))
-            time.sleep(5)
-        log.info("Instance {0} ({1}) started.".format(
-                 inst.name, inst.private_ips[0]))
-        return inst
+        Provision a number of new instances/VMs concurrently.
+
+        All the instances are launched concurrently and then probed together
+        until they accept ssh logins (see :class:`.SSHReadinessProbe`).
+        Instances that do not become ready within ``ssh_ready_timeout``
+        seconds are terminated.
+
+        :type instance_names: ``list`` of ``str``
+        :param instance_names: Names for the instances to be launched.
+
+        :type instance_types: ``dict``
+        :param instance_types: Flavors of some of the instances, keyed by
+                               name, instead of the configured
+                               ``instance_type``.
+
+        :rtype: ``list`` of ``Bunch``
+        :return: One result per requested name, in the same order. Each
+                 result has ``name``, ``instance`` (a ``CloudBridge.Instance``
+                 object or ``None`` if provisioning failed) and ``error`` (a
+                 failure message or ``None``) fields.
+        """
+        instance_types = instance_types or {}
+        results = self._map(
+            lambda name: self._launch(name, instance_types.get(name)),
+            instance_names)
+        launched = [r for r in results if r.instance]
+        with metrics.timer('slurmscale_ssh_wait_seconds'):
+            ready = self.ssh_probe.wait_all(
+                [r.instance.private_ips[0] for r in launched])
+        for r in launched:
+            if ready.get(r.instance.private_ips[0]):
+                log.info("Instance {0} ({1}) started.".format(
+                         r.instance.name, r.instance.private_ips[0]))
+            else:
+                r.instance.terminate()
+                r.instance = None
+                r.error = "Timed out waiting for ssh"
+                metrics.inc('slurmscale_provision_failures_total',
+                            stage='ssh')
+        return results
+
+    def _find_instances(self, prefix):
+        """
+        List instances whose name starts with the supplied prefix.
+
+        The OpenStack API is asked to filter instances by name so that
+        unrelated instances in a shared project are not fetched; if that is
+        not possible, all instances are listed and filtered locally.
+
+        :type prefix: ``str``
+        :param prefix: Common prefix of the names of instances to list.
+
+        :rtype: ``list`` of ``CloudBridge.Instance`` objects
+        :return: Matching instances.
+        """
+        try:
+            from cloudbridge.cloud.providers.openstack.resources import \
+                OpenStackInstance
+            servers = self.provider.nova.servers.list(
+                search_opts={'name': '^' + re.escape(prefix)})
+            instances = [OpenStackInstance(self.provider, server)
+                         for server in servers]
+        except Exception as e:
+            log.debug("Could not filter instances by name at the provider; "
+                      "listing all instances instead: {0}".format(e))
+            instances = self.provider.compute.instances.list()
+        return [i for i in instances if (i.name or '').startswith(prefix)]
+
+    def _terminate(self, instance):
+        """
+        Terminate an instance and wait until it is gone.
+
+        :rtype: ``bool``
+        :return: ``True`` if the instance was confirmed terminated.
+        """
+        try:
+            try:
+                from cloudbridge.cloud.interfaces import InstanceState
+                gone = [InstanceState.TERMINATED, InstanceState.UNKNOWN]
+                failed = [InstanceState.ERROR]
+            except ImportError:  # E.g., instances of the fake provider
+                gone, failed = ['terminated', 'unknown'], ['error']
+            with metrics.timer('slurmscale_instance_terminate_seconds'):
+                instance.terminate()
+                instance.wait_for(gone, terminal_states=failed,
+                                  timeout=self.terminate_timeout)
+            return True
+        except Exception as e:
+            log.warn("Exception terminating instance {0}: {1}".format(
+                     instance.name, e))
+            metrics.inc('slurmscale_provision_failures_total',
+                        stage='terminate')
+            return False
 
     def delete(self, nodes):
         """
         Delete/terminate the supplied virtual machines.
 
+        Instances are matched to nodes by name and IP address and terminated
+        concurrently; each termination is confirmed by waiting for the
+        instance to disappear.
+
         :type nodes: list of :class:`Node` objects
         :param nodes: List of nodes to terminate.
+
+        :rtype: ``dict``
+        :return: A dict mapping each node name to ``True`` if its instance
+                 was terminated or ``False`` otherwise.
         """
-        instances = self.provider.compute.instances.list()
+        if not nodes:
+            return {}
+        by_name = {}
+        by_ip = {}
+        for instance in self._find_instances(
+                os.path.commonprefix([node.name for node in nodes])):
+            by_name[instance.name] = instance
+            for ip in instance.private_ips:
+                by_ip[ip] = instance
         terminate = []
+        results = {}
         for node in nodes:
-            for instance in instances:
-                if (node.ip in instance.private_ips and
-                        node.name == instance.name):
-                    terminate.append(instance)
-        log.info("Deleting instances {0}".format(terminate))
-        for instance in terminate:
-            instance.terminate()
+            instance = by_name.get(node.name)
+            if node.ip and (instance is None or
+                            node.ip not in instance.private_ips):
+                # E.g., a standby instance that could not be renamed
+                instance = by_ip.get(node.ip)
+            if instance is None:
+                log.warn("No instance found for node {0} ({1})".format(
+                         node.name, node.ip))
+                results[node.name] = False
+            else:
+                terminate.append((node.name, instance))
+        instances = [target for _, target in terminate]
+        log.info("Deleting instances {0}".format(instances))
+        terminated = self._map(self._terminate, instances)
+        for (name, _), ok in zip(terminate, terminated):
+            results[name] = ok
+        return results
+
+
+class CompositeProvisionManager(ProvisionManager):
+    """
+    Spread provisioning across several backends (zones, clouds or flavors).
+
+    A batch of instances is split across the backends in proportion to their
+    weights and the backends provision their shares concurrently. Instances
+    a backend fails to provision are retried on the other backends. A
+    backend whose failure looks like exhausted quota or capacity is skipped
+    for ``backend_cooldown`` seconds.
+    """
+
+    # Errors indicating that a backend has run out of quota or capacity
+    QUOTA_RE = re.compile(r'quota|exceed|insufficient|capacity|no valid host',
+                          re.IGNORECASE)
+
+    def __init__(self, backends, cooldown=None):
+        """
+        Initialize the composite manager.
+
+        :type backends: ``list`` of ``tuple``
+        :param backends: ``(name, provision manager, weight)`` tuples, in
+                         order of preference for failover.
+
+        :type cooldown: ``float``
+        :param cooldown: Number of seconds a backend that ran out of quota or
+                         capacity is skipped. If not supplied,
+                         ``backend_cooldown`` config value is used.
+        """
+        self._backends = [Bunch(name=name, manager=manager,
+                                weight=float(weight))
+                          for name, manager, weight in backends]
+        assert self._backends, "No provisioning backends configured"
+        self.cooldown = float(cooldown if cooldown is not None else
+                              ss.config.get_config_value('backend_cooldown',
+                                                         300))
+        self._lock = threading.Lock()
+        self._cooling = {}  # backend name -> time it can be used again
+        self._owners = {}  # instance name -> backend name
+
+    @staticmethod
+    def from_config(pool=None):
+        """
+        Create a composite manager from the config file.
+
+        Backends are listed by name in the ``provision_backends`` config
+        value. Each backend has a ``backend:<name>`` config section with
+        launch settings overriding the default ones (see
+        :class:`JetstreamIUProvisionManager`) and an optional ``weight``
+        (``1`` by default).
+
+        :type pool: ``str``
+        :param pool: Name of the node pool the instances are for; its
+                     ``pool:<name>`` config section may list its own
+                     ``provision_backends``.
+
+        :rtype: :class:`CompositeProvisionManager`
+        :return: A composite manager over the configured backends.
+        """
+        names = ss.config.get_config_value(
+            'provision_backends', '', section='pool:' + pool) if pool else ''
+        names = names or ss.config.get_config_value('provision_backends', '')
+        backends = []
+        for name in names.split(','):
+            name = name.strip()
+            if name:
+                weight = ss.config.get_config_value(
+                    'weight', 1, section='backend:' + name)
+                backends.append(
+                    (name, JetstreamIUProvisionManager(backend=name,
+                                                       pool=pool), weight))
+        return CompositeProvisionManager(backends)
+
+    def _available(self, exclude=()):
+        """Get backends that are not cooling down or excluded."""
+        now = time.time()
+        with self._lock:
+            return [b for b in self._backends if b.name not in exclude and
+                    self._cooling.get(b.name, 0) <= now]
+
+    def _assign(self, names, tried):
+        """
+        Assign each name to a backend by weight.
+
+        Uses smooth weighted round-robin, so a batch is split across the
+        backends in proportion to their weights. Each name only goes to a
+        backend it has not been tried on.
+
+        :rtype: ``dict``
+        :return: Names to provision, keyed by backend name; names that have
+                 no backend left are listed under ``None``.
+        """
+        current = dict((b.name, 0.0) for b in self._backends)
+        groups = {}
+        for name in names:
+            candidates = [b for b in self._available(tried[name])
+                          if b.weight > 0]
+            if not candidates:
+                groups.setdefault(None, []).append(name)
+                continue
+            for b in candidates:
+                current[b.name] += b.weight
+            chosen = max(candidates, key=lambda b: current[b.name])
+            current[chosen.name] -= sum(b.weight for b in candidates)
+            groups.setdefault(chosen.name, []).append(name)
+        return groups
+
+    def _backend(self, name):
+        """Get a backend by name."""
+        for b in self._backends:
+            if b.name == name:
+                return b
+        return None
+
+    def create(self, instance_name, instance_type=None):
+        """
+        Provision a new instance/VM on one of the backends.
+
+        :type instance_name: ``str``
+        :param instance_name: Name for the instance to be launched.
+
+        :type instance_type: ``str``
+        :param instance_type: Flavor of the instance instead of the
+                              backend's configured ``instance_type``.
+
+        :rtype: ``CloudBridge.Instance`` object
+        :return: Launched instance object or ``None`` if no backend could
+                 provision it.
+        """
+        return self.create_many(
+            [instance_name], {instance_name: instance_type})[0].instance
+
+    def create_many(self, instance_names, instance_types=None):
+        """
+        Provision a number of new instances/VMs across the backends.
+
+        :type instance_names: ``list`` of ``str``
+        :param instance_names: Names for the instances to be launched.
+
+        :type instance_types: ``dict``
+        :param instance_types: Flavors of some of the instances, keyed by
+                               name, instead of the backends' configured
+                               ``instance_type``.
+
+        :rtype: ``list`` of ``Bunch``
+        :return: One result per requested name, in the same order. Each
+                 result has ``name``, ``instance`` (a ``CloudBridge.Instance``
+                 object or ``None`` if provisioning failed), ``error`` (a
+                 failure message or ``None``) and ``backend`` (name of the
+                 backend that provisioned the instance) fields.
+        """
+        results = dict((name, Bunch(name=name, instance=None, error=None,
+                                    backend=None))
+                       for name in instance_names)
+        tried = dict((name, set()) for name in instance_names)
+        pending = list(instance_names)
+        while pending:
+            groups = self._assign(pending, tried)
+            for name in groups.pop(None, []):
+                if not results[name].error:
+                    results[name].error = "No provisioning backend available"
+            if not groups:
+                break
+            log.debug("Provisioning {0}".format(
+                      dict((k, len(v)) for k, v in groups.items())))
+            batches = self._map(
+                lambda item: (item[0], self._backend(item[0]).manager
+                              .create_many(item[1], instance_types)),
+                list(groups.items()))
+            pending = []
+            for backend, batch in batches:
+                for r in batch:
+                    tried[r.name].add(backend)
+                    if r.instance:
+                        results[r.name].update(instance=r.instance,
+                                               error=None, backend=backend)
+                        with self._lock:
+                            self._owners[r.name] = backend
+                        metrics.inc('slurmscale_backend_provisions_total',
+                                    backend=backend, result='ok')
+                        continue
+                    results[r.name].error = r.error
+                    metrics.inc('slurmscale_backend_provisions_total',
+                                backend=backend, result='failed')
+                    if r.error and self.QUOTA_RE.search(r.error):
+                        self._cool_down(backend, r.error)
+                    pending.append(r.name)
+            if pending:
+                log.info("Retrying {0} instance(s) on other backends".format(
+                         len(pending)))
+                metrics.inc('slurmscale_backend_failovers_total',
+                            len(pending))
+        return [results[name] for name in instance_names]
+
+    def _cool_down(self, backend, error):
+        """Skip a backend that ran out of quota or capacity for a while."""
+        with self._lock:
+            if self._cooling.get(backend, 0) > time.time():
+                return
+            self._cooling[backend] = time.time() + self.cooldown
+        log.warn("Backend {0} is out of capacity ({1}); skipping it for "
+                 "{2}s".format(backend, error, self.cooldown))
+
+    def rename(self, instance, name):
+        """
+        Rename an existing instance.
+
+        :type instance: ``CloudBridge.Instance`` object
+        :param instance: Instance to rename.
+
+        :type name: ``str``
+        :param name: New name for the instance.
+
+        :rtype: ``bool``
+        :return: ``True`` if the instance was renamed.
+        """
+        old_name = instance.name
+        with self._lock:
+            backend = self._owners.get(old_name)
+        manager = (self._backend(backend).manager if backend
+                   else self._backends[0].manager)
+        if not manager.rename(instance, name):
+            return False
+        with self._lock:
+            if backend:
+                self._owners.pop(old_name, None)
+                self._owners[name] = backend
+        return True
+
+    def delete(self, nodes):
+        """
+        Delete/terminate the supplied virtual machines.
+
+        Each node is deleted by the backend that provisioned it; nodes the
+        backend could not delete, or whose backend is not known (e.g., after
+        a restart), are tried on the other backends in turn.
+
+        :type nodes: list of :class:`Node` objects
+        :param nodes: List of nodes to terminate.
+
+        :rtype: ``dict``
+        :return: A dict mapping each node name to ``True`` if its instance
+                 was terminated or ``False`` otherwise.
+        """
+        results = dict((node.name, False) for node in nodes)
+        tried = dict((node.name, set()) for node in nodes)
+        pending = list(nodes)
+        while pending:
+            groups = {}
+            for node in pending:
+                with self._lock:
+                    owner = self._owners.get(node.name)
+                order = [b.name for b in self._backends]
+                if owner in order:
+                    order.remove(owner)
+                    order.insert(0, owner)
+                order = [b for b in order if b not in tried[node.name]]
+                if order:
+                    groups.setdefault(order[0], []).append(node)
+            batches = self._map(
+                lambda item: (item[0], self._backend(item[0]).manager
+                              .delete(item[1]) or {}),
+                list(groups.items()))
+            pending = []
+            for backend, deleted in batches:
+                for node in groups[backend]:
+                    tried[node.name].add(backend)
+                    if deleted.get(node.name):
+                        results[node.name] = True
+                        with self._lock:
+                            self._owners.pop(node.name, None)
+                    else:
+                        pending.append(node)
+        return results
@@ -0,0 +1,248 @@
+"""Wait for newly provisioned hosts to become reachable over ssh."""
+import base64
+import hashlib
+import hmac
+import os
+import random
+import socket
+import tempfile
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+
+from . import metrics
+
+import logging
+log = logging.getLogger(__name__)
+
+_known_hosts_lock = threading.Lock()
+
+
+def _host_matches(entry, hosts):
+    """
+    Check if a known_hosts host pattern matches any of the supplied hosts.
+
+    :type entry: ``str``
+    :param entry: A single host pattern from a known_hosts line; either a
+                  plain hostname/IP (optionally as ``[host]:port``) or a
+                  hashed ``|1|salt|hash`` entry.
+
+    :type hosts: ``set`` of ``str``
+    :param hosts: Hostnames or IP addresses to look for.
+    """
+    if entry.startswith('|1|'):
+        try:
+            salt, digest = entry[3:].split('|', 1)
+            salt = base64.b64decode(salt)
+            digest = base64.b64decode(digest)
+        except (ValueError, TypeError):
+            return False
+        for host in hosts:
+            if hmac.new(salt, host.encode('utf-8'),
+                        hashlib.sha1).digest() == digest:
+                return True
+        return False
+    if entry.startswith('[') and ']:' in entry:
+        entry = entry[1:entry.index(']:')]
+    return entry in hosts
+
+
+def remove_known_hosts(hosts, path=None):
+    """
+    Remove all the supplied hosts from an ssh known_hosts file in one pass.
+
+    This is equivalent to running ``ssh-keygen -R`` for each host but reads
+    and rewrites the file only once. The file is replaced atomically.
+
+    :type hosts: ``list`` of ``str``
+    :param hosts: Hostnames or IP addresses to remove.
+
+    :type path: ``str``
+    :param path: Path to the known_hosts file. Defaults to
+                 ``~/.ssh/known_hosts``.
+
+    :rtype: ``int``
+    :return: Number of lines removed from the file.
+    """
+    path = path or os.path.expanduser('~/.ssh/known_hosts')
+    hosts = set(hosts)
+    if not hosts or not os.path.exists(path):
+        return 0
+    with _known_hosts_lock:
+        with open(path, 'r') as f:
+            lines = f.readlines()
+        keep = []
+        for line in lines:
+            fields = line.split()
+            if (not fields or fields[0].startswith('#') or
+                    fields[0].startswith('@')):
+                keep.append(line)
+                continue
+            if any(_host_matches(e, hosts) for e in fields[0].split(',')):
+                continue
+            keep.append(line)
+        removed = len(lines) - len(keep)
+        if removed:
+            fd, tmp_path = tempfile.mkstemp(
+                dir=os.path.dirname(path), prefix='.known_hosts.')
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    f.writelines(keep)
+                os.chmod(tmp_path, os.stat(path).st_mode & 0o777)
+                os.rename(tmp_path, path)
+            except (IOError, OSError):
+                os.remove(tmp_path)
+                raise
+    log.debug("Removed {0} known_hosts line(s) for {1} host(s)".format(
+              removed, len(hosts)))
+    return removed
+
+
+class SSHReadinessProbe(object):
+    """
+    Probe a set of hosts concurrently until they accept ssh logins.
+
+    Each host is first checked with a cheap TCP connection to the ssh port
+    and only then with a full ssh login. Failed attempts are retried with
+    jittered exponential backoff until the host is ready or its deadline
+    passes.
+    """
+
+    def __init__(self, user='centos', port=22, timeout=600, concurrency=20,
+                 connect_timeout=10, initial_delay=2, max_delay=30):
+        """
+        Initialize the probe.
+
+        This probe assumes the default ssh key (~/.ssh/id_rsa) exists and will
+        be used for authentication.
+
+        :type user: ``str``
+        :param user: Username to use when trying to login.
+
+        :type port: ``int``
+        :param port: Port the ssh server listens on.
+
+        :type timeout: ``float``
+        :param timeout: Number of seconds each host has to become ready.
+
+        :type concurrency: ``int``
+        :param concurrency: Maximum number of hosts probed at the same time.
+
+        :type connect_timeout: ``float``
+        :param connect_timeout: Number of seconds a single connection attempt
+                                may take.
+
+        :type initial_delay: ``float``
+        :param initial_delay: Delay, in seconds, before the first retry.
+
+        :type max_delay: ``float``
+        :param max_delay: Upper bound for the delay between retries.
+        """
+        self.user = user
+        self.port = port
+        self.timeout = timeout
+        self.concurrency = concurrency
+        self.connect_timeout = connect_timeout
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+
+    def _port_open(self, host):
+        """Check if the ssh port on the host accepts TCP connections."""
+        try:
+            sock = socket.create_connection((host, self.port),
+                                            self.connect_timeout)
+            sock.close()
+            return True
+        except (socket.error, socket.timeout):
+            return False
+
+    def _login(self, host):
+        """Check if an ssh login to the host succeeds."""
+        # paramiko is slow to import; load it only once hosts are probed
+        import paramiko
+        from paramiko.ssh_exception import AuthenticationException
+        from paramiko.ssh_exception import BadHostKeyException
+        from paramiko.ssh_exception import SSHException
+        ssh = paramiko.SSHClient()
+        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        try:
+            ssh.connect(host, port=self.port, username=self.user,
+                        timeout=self.connect_timeout)
+            return True
+        except (BadHostKeyException, AuthenticationException,
+                SSHException, socket.error, EOFError) as e:
+            log.debug("ssh connection exception for {0}: {1}".format(host, e))
+            return False
+        finally:
+            ssh.close()
+
+    def check(self, host):
+        """
+        Check once if a host is ready.
+
+        :type host: ``str``
+        :param host: IP address or hostname of the host to check.
+
+        :rtype: ``bool``
+        :return: ``True`` if an ssh login to the host succeeded.
+        """
+        return self._port_open(host) and self._login(host)
+
+    def wait(self, host):
+        """
+        Wait until a host is ready or the probe timeout passes.
+
+        :type host: ``str``
+        :param host: IP address or hostname of the host to wait for.
+
+        :rtype: ``bool``
+        :return: ``True`` if the host became ready before the deadline.
+        """
+        start = time.time()
+        deadline = start + self.timeout
+        delay = self.initial_delay
+        while not self.check(host):
+            metrics.inc('slurmscale_ssh_probes_total', result='failed')
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                log.warn("Timed out waiting for ssh on {0}".format(host))
+                metrics.observe('slurmscale_ssh_ready_seconds',
+                                time.time() - start, result='timeout')
+                return False
+            log.debug("Waiting for ssh on {0}...".format(host))
+            time.sleep(min(remaining, delay / 2.0 +
+                           random.uniform(0, delay / 2.0)))
+            delay = min(self.max_delay, delay * 2)
+        metrics.inc('slurmscale_ssh_probes_total', result='ready')
+        metrics.observe('slurmscale_ssh_ready_seconds', time.time() - start,
+                        result='ready')
+        return True
+
+    def wait_all(self, hosts):
+        """
+        Wait for all the supplied hosts concurrently.
+
+        Once probing is done, the hosts are removed from the local
+        known_hosts file so stale keys for reused addresses do not interfere
+        with later ssh connections.
+
+        :type hosts: ``list`` of ``str``
+        :param hosts: IP addresses or hostnames of the hosts to wait for.
+
+        :rtype: ``dict``
+        :return: A dict mapping each host to ``True`` if it became ready or
+                 ``False`` if it timed out.
+        """
+        if not hosts:
+            return {}
+        pool = ThreadPool(max(1, min(self.concurrency, len(hosts))))
+        try:
+            ready = pool.map(self.wait, hosts)
+        finally:
+            pool.close()
+            pool.join()
+        try:
+            remove_known_hosts(hosts)
+        except (IOError, OSError) as e:
+            log.warn("Could not update known_hosts file: {0}".format(e))
+        return dict(zip(hosts, ready))
@@ -0,0 +1,291 @@
+"""Estimate the number of nodes needed to run pending jobs."""
+import time
+
+import logging
+log = logging.getLogger(__name__)
+
+# Flag Slurm sets on ``pn_min_memory`` when memory is requested per CPU
+MEM_PER_CPU = 0x8000000000000000
+# Job reasons that indicate a job is waiting for more capacity
+WAITING_REASONS = ('Resources', 'Priority')
+# What :func:`flavor_mix` can optimize for
+FLAVOR_OBJECTIVES = ('count', 'cost')
+
+
+class NodeShape(object):
+    """Resources available on a single worker node."""
+
+    def __init__(self, cpus, memory):
+        """
+        Initialize the shape.
+
+        :type cpus: ``int``
+        :param cpus: Number of CPUs on the node.
+
+        :type memory: ``int``
+        :param memory: Memory on the node, in MB.
+        """
+        self.cpus = int(cpus)
+        self.memory = int(memory)
+
+    def __repr__(self):
+        """Return human-readable NodeShape representation."""
+        return "<NodeShape {0} CPUs, {1} MB>".format(self.cpus, self.memory)
+
+    def fits(self, cpus, memory):
+        """Check if a request for ``cpus`` and ``memory`` fits on a node."""
+        return cpus <= self.cpus and memory <= self.memory
+
+
+def is_waiting(job, grace=300, now=None):
+    """
+    Check if a job is pending for capacity for longer than ``grace`` seconds.
+
+    :type job: ``dict``
+    :param job: A job dict, as provided by ``pyslurm.job().get()``.
+
+    :type grace: ``int``
+    :param grace: Number of seconds a job needs to be queued and ready to run
+                  before it gets counted as waiting.
+
+    :type now: ``int``
+    :param now: Current time as a Unix timestamp; defaults to the clock.
+
+    :rtype: ``bool``
+    :return: ``True`` if the job is waiting for capacity.
+    """
+    now = int(time.time()) if now is None else now
+    return (job.get('job_state') == 'PENDING' and
+            job.get('state_reason') in WAITING_REASONS and
+            now - grace > job.get('eligible_time', 0))
+
+
+def job_request(job):
+    """
+    Get the per-node resources requested by a job.
+
+    :type job: ``dict``
+    :param job: A job dict, as provided by ``pyslurm.job().get()``.
+
+    :rtype: ``tuple`` of ``int``
+    :return: A ``(nodes, cpus_per_node, memory_per_node)`` tuple; memory is
+             in MB.
+    """
+    nodes = max(1, int(job.get('num_nodes') or 1))
+    cpus = max(1, int(job.get('num_cpus') or 1))
+    cpus_per_node = max(int(job.get('pn_min_cpus') or 1),
+                        -(-cpus // nodes))  # Ceiling division
+    memory = int(job.get('pn_min_memory') or 0)
+    if memory & MEM_PER_CPU or job.get('mem_per_cpu') is True:
+        memory = (memory & ~MEM_PER_CPU) * cpus_per_node
+    return (nodes, cpus_per_node, memory)
+
+
+def job_tasks(job, throttle=True):
+    """
+    Get the number of array tasks a job record stands for.
+
+    Slurm keeps the pending tasks of an array job in a single record whose
+    ``array_task_str`` lists their indexes (e.g., ``1-100`` or
+    ``1,3,5-11:2%4``); a task gets a record of its own once it starts.
+
+    :type job: ``dict``
+    :param job: A job dict, as provided by ``pyslurm.job().get()``.
+
+    :type throttle: ``bool``
+    :param throttle: If set, count no more tasks than the array may run at
+                     once (its ``%`` limit or ``array_max_tasks``).
+
+    :rtype: ``int``
+    :return: Number of tasks; 1 for jobs other than pending array jobs.
+    """
+    spec = job.get('array_task_str')
+    if not spec:
+        return 1
+    spec, _, limit = str(spec).partition('%')
+    tasks = 0
+    for part in spec.split(','):
+        bounds, _, step = part.partition(':')
+        first, _, last = bounds.partition('-')
+        try:
+            first, last = int(first), int(last or first)
+            step = int(step or 1)
+        except ValueError:  # E.g., a list Slurm truncated with '...'
+            continue
+        if first <= last and step > 0:
+            tasks += (last - first) // step + 1
+    limit = int(limit) if limit.isdigit() else int(
+        job.get('array_max_tasks') or 0)
+    if throttle and limit > 0:
+        tasks = min(tasks, limit)
+    return max(1, tasks)
+
+
+class Flavor(NodeShape):
+    """An instance flavor: a node shape with a name and a relative cost."""
+
+    def __init__(self, name, cpus, memory, cost=None):
+        """
+        Initialize the flavor.
+
+        :type name: ``str``
+        :param name: Name of the flavor, e.g., ``m1.large``.
+
+        :type cpus: ``int``
+        :param cpus: Number of CPUs of an instance.
+
+        :type memory: ``int``
+        :param memory: Memory of an instance, in MB.
+
+        :type cost: ``float``
+        :param cost: Relative cost of running an instance, e.g., per hour;
+                     the number of CPUs by default.
+        """
+        super(Flavor, self).__init__(cpus, memory)
+        self.name = name
+        self.cost = float(cost if cost is not None else self.cpus)
+
+    def __repr__(self):
+        """Return human-readable Flavor representation."""
+        return "<Flavor {0}: {1} CPUs, {2} MB, cost {3:g}>".format(
+            self.name, self.cpus, self.memory, self.cost)
+
+
+def _requests(jobs, shapes):
+    """
+    Get the per-node requests of jobs, largest first.
+
+    Jobs requesting more than any of the ``shapes`` can provide are skipped.
+    A pending array job makes one request per task that may run at once
+    (see :func:`job_tasks`).
+
+    :rtype: ``list`` of ``tuple``
+    :return: ``(cpus_per_node, memory_per_node, nodes)`` tuples.
+    """
+    requests = []
+    for job in jobs:
+        n, cpus, memory = job_request(job)
+        if not any(shape.fits(cpus, memory) for shape in shapes):
+            log.warn("Job {0} requests {1} CPUs and {2} MB per node, which "
+                     "does not fit {3}; skipping it.".format(
+                         job.get('job_id'), cpus, memory,
+                         shapes[0] if len(shapes) == 1 else shapes))
+            continue
+        requests.extend([(cpus, memory, n)] * job_tasks(job))
+    requests.sort(reverse=True)
+    return requests
+
+
+def _pack(requests, new_node, limit=None):
+    """
+    Bin-pack per-node requests onto nodes using first-fit-decreasing.
+
+    The parts of a multi-node job are always placed on distinct nodes.
+
+    :type requests: ``list`` of ``tuple``
+    :param requests: Requests, as returned by :func:`_requests`.
+
+    :type new_node: ``function``
+    :param new_node: Called with the CPUs and memory of a request that fits
+                     none of the nodes so far; returns the shape of the node
+                     to add for it.
+
+    :type limit: ``int``
+    :param limit: Stop packing once this many nodes are needed.
+
+    :rtype: ``list`` of ``list``
+    :return: A ``[shape, free cpus, free memory]`` list per node.
+    """
+    bins = []
+    for cpus, memory, n in requests:
+        used = set()
+        for _ in range(n):
+            for i, free in enumerate(bins):
+                if i not in used and free[1] >= cpus and free[2] >= memory:
+                    break
+            else:
+                shape = new_node(cpus, memory)
+                bins.append([shape, shape.cpus, shape.memory])
+                i = len(bins) - 1
+            bins[i][1] -= cpus
+            bins[i][2] -= memory
+            used.add(i)
+        if limit and len(bins) >= limit:
+            return bins[:limit]
+    return bins
+
+
+def nodes_needed(jobs, shape, limit=None):
+    """
+    Compute the number of nodes needed to run the supplied jobs.
+
+    Per-node job requests are bin-packed onto nodes of the supplied shape
+    using the first-fit-decreasing heuristic; the parts of a multi-node job
+    are always placed on distinct nodes. Jobs requesting more than a single
+    node can provide are skipped.
+
+    :type jobs: ``list`` of ``dict``
+    :param jobs: Job dicts, as provided by ``pyslurm.job().get()``.
+
+    :type shape: :class:`.NodeShape`
+    :param shape: Resources available on each node.
+
+    :type limit: ``int``
+    :param limit: Stop packing once this many nodes are needed.
+
+    :rtype: ``int``
+    :return: Number of nodes needed.
+    """
+    return len(_pack(_requests(jobs, [shape]), lambda cpus, memory: shape,
+                     limit))
+
+
+def flavor_mix(jobs, flavors, objective='count', limit=None):
+    """
+    Choose the flavors of the nodes to add to run the supplied jobs.
+
+    Per-node job requests are bin-packed using first-fit-decreasing, as in
+    :func:`nodes_needed`. Whenever a request fits none of the nodes so far,
+    a node is added with the flavor that fits the request and is the
+    largest one, for the fewest instances (``count`` objective), or the one
+    with the lowest cost per CPU (``cost`` objective). Once all the requests
+    are placed, each node is downsized to the cheapest flavor that still
+    fits the requests placed on it.
+
+    :type jobs: ``list`` of ``dict``
+    :param jobs: Job dicts, as provided by ``pyslurm.job().get()``.
+
+    :type flavors: ``list`` of :class:`.Flavor`
+    :param flavors: Flavors to choose from.
+
+    :type objective: ``str``
+    :param objective: ``count`` or ``cost``.
+
+    :type limit: ``int``
+    :param limit: Largest number of nodes to add.
+
+    :rtype: ``list`` of :class:`.Flavor`
+    :return: The flavor of each node to add, largest first.
+    """
+    assert objective in FLAVOR_OBJECTIVES, (
+        "Unknown flavor objective {0}; use one of {1}".format(
+            objective, ', '.join(FLAVOR_OBJECTIVES)))
+    if objective == 'cost':
+        def preference(f):
+            return (f.cost / f.cpus, -f.cpus, -f.memory)
+    else:
+        def preference(f):
+            return (-f.cpus, -f.memory, f.cost)
+
+    def new_node(cpus, memory):
+        return min((f for f in flavors if f.fits(cpus, memory)),
+                   key=preference)
+
+    mix = []
+    for flavor, free_cpus, free_memory in _pack(_requests(jobs, flavors),
+                                                new_node, limit):
+        cpus, memory = flavor.cpus - free_cpus, flavor.memory - free_memory
+        mix.append(min((f for f in flavors if f.fits(cpus, memory)),
+                       key=lambda f: (f.cost, -f.cpus, -f.memory)))
+    mix.sort(key=lambda f: (-f.cpus, -f.memory))
+    return mix
@@ -0,0 +1,167 @@
+"""A time-bound cache of cluster state as reported by Slurm."""
+import threading
+import time
+
+import pyslurm
+
+from . import metrics
+
+import slurmscale as ss
+
+import logging
+log = logging.getLogger(__name__)
+
+
+class NodeIndex(object):
+    """Lookup tables over a single snapshot of node data."""
+
+    def __init__(self, nodes):
+        """
+        Build the indexes.
+
+        :type nodes: ``dict``
+        :param nodes: A dict of node dicts, keyed by node name, as returned
+                      by ``pyslurm.node().get()``.
+        """
+        self.by_name = nodes
+        self.by_ip = {}
+        for node in nodes.values():
+            if node.get('node_addr'):
+                self.by_ip[node.get('node_addr')] = node
+
+
+class ClusterSnapshot(object):
+    """
+    Cache bulk node, job and partition data fetched from Slurm.
+
+    Each kind of data is fetched with a single ``pyslurm`` call and reused by
+    all callers until it is older than ``ttl`` seconds, at which point the
+    next access fetches it again. Objects such as ``Node`` and ``Job`` read
+    their fields from the current snapshot instead of querying the
+    controller on every property access.
+    """
+
+    FETCHERS = {
+        'nodes': ('node.get', lambda: pyslurm.node().get()),
+        'jobs': ('job.get', lambda: pyslurm.job().get()),
+        'partitions': ('partition.get', lambda: pyslurm.partition().get()),
+    }
+
+    def __init__(self, ttl=None):
+        """
+        Initialize an empty snapshot.
+
+        :type ttl: ``float``
+        :param ttl: Number of seconds fetched data is considered current. If
+                    not supplied, ``snapshot_ttl`` config value is used.
+        """
+        self._ttl = ttl
+        self._lock = threading.RLock()
+        self._data = {}  # kind -> (fetch timestamp, data)
+        self._node_index = (None, None)  # (indexed node data, index)
+
+    @property
+    def ttl(self):
+        """Number of seconds fetched data is considered current."""
+        if self._ttl is None:
+            return float(ss.config.get_config_value('snapshot_ttl', 5))
+        return self._ttl
+
+    def _get(self, kind, fresh=False):
+        """
+        Return cached data of the given kind, fetching it if stale.
+
+        :type kind: ``str``
+        :param kind: One of ``nodes``, ``jobs`` or ``partitions``.
+
+        :type fresh: ``bool``
+        :param fresh: If set, ignore any cached data and fetch it anew.
+        """
+        with self._lock:
+            cached = self._data.get(kind)
+            now = time.time()
+            if fresh or not cached or now - cached[0] > self.ttl:
+                ss.configure_logging()
+                log.debug("Fetching fresh {0} data from Slurm".format(kind))
+                call, fetch = self.FETCHERS[kind]
+                with metrics.timer('slurmscale_pyslurm_call_seconds',
+                                   call=call):
+                    cached = (now, fetch() or {})
+                metrics.inc('slurmscale_pyslurm_calls_total', call=call)
+                if metrics.enabled:
+                    # Approximate size of the data returned by the call
+                    metrics.inc('slurmscale_pyslurm_response_bytes_total',
+                                len(repr(cached[1])), call=call)
+                self._data[kind] = cached
+            return cached[1]
+
+    def nodes(self, fresh=False):
+        """
+        Get node data for the current snapshot.
+
+        :type fresh: ``bool``
+        :param fresh: If set, bypass the cache and query Slurm.
+
+        :rtype: ``dict``
+        :return: A dict of node dicts, keyed by node name.
+        """
+        return self._get('nodes', fresh)
+
+    def node_index(self, fresh=False):
+        """
+        Get name and IP indexes over node data for the current snapshot.
+
+        The index is built once per fetch of node data and shared until that
+        data is discarded.
+
+        :type fresh: ``bool``
+        :param fresh: If set, bypass the cache and query Slurm.
+
+        :rtype: :class:`.NodeIndex`
+        :return: Index object with ``by_name`` and ``by_ip`` dicts.
+        """
+        with self._lock:
+            nodes = self.nodes(fresh)
+            if self._node_index[0] is not nodes:
+                self._node_index = (nodes, NodeIndex(nodes))
+            return self._node_index[1]
+
+    def jobs(self, fresh=False):
+        """
+        Get job data for the current snapshot.
+
+        :type fresh: ``bool``
+        :param fresh: If set, bypass the cache and query Slurm.
+
+        :rtype: ``dict``
+        :return: A dict of job dicts, keyed by job ID.
+        """
+        return self._get('jobs', fresh)
+
+    def partitions(self, fresh=False):
+        """
+        Get partition data for the current snapshot.
+
+        :type fresh: ``bool``
+        :param fresh: If set, bypass the cache and query Slurm.
+
+        :rtype: ``dict``
+        :return: A dict of partition dicts, keyed by partition name.
+        """
+        return self._get('partitions', fresh)
+
+    def refresh(self, *kinds):
+        """
+        Discard cached data so the next access fetches it from Slurm.
+
+        :type kinds: ``str``
+        :param kinds: Kinds of data to discard (``nodes``, ``jobs`` or
+                      ``partitions``). If none are supplied, discard all.
+        """
+        with self._lock:
+            for kind in kinds or list(self._data.keys()):
+                self._data.pop(kind, None)
+
+
+# Snapshot shared by all library objects within a process
+snapshot = ClusterSnapshot()
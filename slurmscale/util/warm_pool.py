@@ -0,0 +1,228 @@
+"""A pool of provisioned, ssh-ready instances kept on standby."""
+import threading
+import time
+import uuid
+
+from bunch import Bunch
+
+from slurmscale.util import journal
+
+import slurmscale as ss
+
+import logging
+log = logging.getLogger(__name__)
+
+
+class WarmPool(object):
+    """
+    Keep a number of booted, ssh-ready instances for fast scale-up.
+
+    Instances are provisioned ahead of time by a provision manager and handed
+    out by :meth:`claim`, after which the pool is refilled in the background.
+    Instances idle in the pool for longer than ``max_age`` seconds are
+    terminated and replaced. Standby instances are recorded in the journal,
+    so instances left over by a crash are deleted by :meth:`.Nodes.recover`.
+    """
+
+    def __init__(self, provision_manager, size=None, max_age=None,
+                 refill_interval=60, node_journal=None):
+        """
+        Initialize an empty pool.
+
+        :type provision_manager: :class:`.provision_manager.ProvisionManager`
+        :param provision_manager: Manager used to create and delete the
+                                  standby instances.
+
+        :type size: ``int``
+        :param size: Number of standby instances to keep. If not supplied,
+                     ``warm_pool_size`` config value is used.
+
+        :type max_age: ``int``
+        :param max_age: Number of seconds an instance may stay in the pool
+                        before it is recycled. If not supplied,
+                        ``warm_pool_max_age`` config value is used.
+
+        :type refill_interval: ``int``
+        :param refill_interval: Number of seconds between background checks
+                                of the pool.
+
+        :type node_journal: :class:`.journal.Journal`
+        :param node_journal: Journal to record standby instances in; the
+                             configured journal if not supplied.
+        """
+        self._provision_manager = provision_manager
+        self._journal = node_journal
+        self.size = int(size if size is not None else
+                        ss.config.get_config_value('warm_pool_size', 0))
+        self.max_age = int(max_age if max_age is not None else
+                           ss.config.get_config_value('warm_pool_max_age',
+                                                      3600))
+        self.refill_interval = refill_interval
+        self._name_prefix = "{0}-warm-".format(ss.config.get_config_value(
+            'node_name_prefix', 'jetstream-iu-large'))
+        self._lock = threading.Lock()
+        self._refill_lock = threading.Lock()
+        self._instances = []  # Bunch(instance, ready_at), oldest first
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __len__(self):
+        """Return the number of instances currently in the pool."""
+        with self._lock:
+            return len(self._instances)
+
+    def _record(self, instances, state, operation=None):
+        """Record a lifecycle transition of standby instances."""
+        node_journal = self._journal or journal.get_journal()
+        if node_journal is None or not instances:
+            return
+        entries = [Bunch(name=i.name, ip=(i.private_ips or [None])[0])
+                   for i in instances]
+        try:
+            node_journal.record(entries, state, operation=operation)
+        except Exception as e:
+            log.warn("Could not record {0} state of standby instance(s) {1} "
+                     "in the journal: {2}".format(
+                         state, [entry.name for entry in entries], e))
+
+    def claim(self, count):
+        """
+        Take up to ``count`` instances out of the pool.
+
+        Instances that are no longer running are discarded. Claiming wakes up
+        the background refill.
+
+        :type count: ``int``
+        :param count: Maximum number of instances to claim.
+
+        :rtype: ``list`` of ``CloudBridge.Instance`` objects
+        :return: Claimed instances; possibly fewer than requested.
+        """
+        claimed = []
+        while len(claimed) < count:
+            with self._lock:
+                if not self._instances:
+                    break
+                entry = self._instances.pop(0)
+            try:
+                entry.instance.refresh()
+                if entry.instance.state == 'running':
+                    claimed.append(entry.instance)
+                    continue
+            except Exception as e:
+                log.warn("Exception checking standby instance {0}: {1}"
+                         .format(entry.instance.name, e))
+            log.warn("Discarding standby instance {0} that is no longer "
+                     "running".format(entry.instance.name))
+            self._terminate(entry.instance)
+        if claimed:
+            log.info("Claimed {0} standby instance(s) from the warm pool"
+                     .format(len(claimed)))
+            self._wake.set()
+        return claimed
+
+    def assign(self, instance, name):
+        """
+        Turn a claimed instance into a node by giving it the node's name.
+
+        If the instance cannot be renamed, it is terminated, as its name
+        would not match the node's.
+
+        :type instance: ``CloudBridge.Instance`` object
+        :param instance: An instance returned by :meth:`claim`.
+
+        :type name: ``str``
+        :param name: Name of the node.
+
+        :rtype: ``bool``
+        :return: ``True`` if the instance was renamed.
+        """
+        standby = Bunch(name=instance.name, private_ips=instance.private_ips)
+        if not self._provision_manager.rename(instance, name):
+            log.warn("Could not rename standby instance {0} to {1}; "
+                     "terminating it".format(standby.name, name))
+            self._terminate(instance)
+            return False
+        self._record([standby], journal.CLAIMED)
+        return True
+
+    def _recycle(self):
+        """Terminate instances that have been in the pool for too long."""
+        cutoff = time.time() - self.max_age
+        with self._lock:
+            old = [e for e in self._instances if e.ready_at < cutoff]
+            self._instances = [e for e in self._instances
+                               if e.ready_at >= cutoff]
+        for entry in old:
+            log.info("Recycling standby instance {0}".format(
+                     entry.instance.name))
+            self._terminate(entry.instance)
+
+    def _terminate(self, instance):
+        """Terminate a standby instance, logging any failure."""
+        try:
+            instance.terminate()
+            self._record([instance], journal.DELETED)
+        except Exception as e:
+            log.warn("Exception terminating standby instance {0}: {1}"
+                     .format(instance.name, e))
+
+    def refill(self):
+        """Recycle old instances and provision enough to fill the pool."""
+        with self._refill_lock:
+            self._recycle()
+            missing = self.size - len(self)
+            if missing <= 0:
+                return
+            names = [self._name_prefix + uuid.uuid4().hex[:8]
+                     for _ in range(missing)]
+            log.debug("Provisioning {0} standby instance(s)".format(missing))
+            self._record([Bunch(name=name, private_ips=[]) for name in names],
+                         journal.REQUESTED, operation=journal.STANDBY)
+            results = self._provision_manager.create_many(names)
+            self._record([r.instance for r in results if r.instance],
+                         journal.READY)
+            self._record([Bunch(name=r.name, private_ips=[]) for r in results
+                          if not r.instance], journal.FAILED)
+            for result in results:
+                if result.instance:
+                    with self._lock:
+                        self._instances.append(Bunch(
+                            instance=result.instance, ready_at=time.time()))
+
+    def _run(self):
+        """Keep the pool filled until stopped."""
+        while not self._stop.is_set():
+            try:
+                self.refill()
+            except Exception:
+                log.exception("Refilling the warm pool failed")
+            self._wake.wait(self.refill_interval)
+            self._wake.clear()
+
+    def start(self):
+        """Start filling the pool in a background thread."""
+        if self.size <= 0 or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='warm_pool')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, terminate=True):
+        """
+        Stop the background refill.
+
+        :type terminate: ``bool``
+        :param terminate: If set, also terminate instances left in the pool.
+        """
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join()
+        if terminate:
+            with self._lock:
+                instances, self._instances = self._instances, []
+            for entry in instances:
+                self._terminate(entry.instance)
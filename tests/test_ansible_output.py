@@ -0,0 +1,136 @@
+"""Check how playbook output is turned into host events."""
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+
+from slurmscale.util.ansible.cmd import AnsibleRunner
+
+# Stands in for ansible-playbook, printing the "playbook" file as its output
+PLAYBOOK_COMMAND = '#!/bin/sh\ncat "$3"\n'
+
+LOOP_IGNORED = """
+PLAY [slurmclients] ***
+
+TASK [install packages] ***
+ok: [node1] => (item=munge)
+failed: [node2] (item=munge) => {"item": "munge", "msg": "No package"}
+ok: [node1] => (item=slurm)
+failed: [node2] (item=slurm) => {"item": "slurm", "msg": "No package"}
+...ignoring
+
+TASK [start slurmd] ***
+changed: [node1]
+changed: [node2]
+
+PLAY RECAP ***
+node1 : ok=2    changed=1    unreachable=0    failed=0    skipped=0
+node2 : ok=2    changed=1    unreachable=0    failed=0    skipped=0
+"""
+
+LOOP_FAILED = """
+PLAY [slurmclients] ***
+
+TASK [install packages] ***
+failed: [node2] (item=munge) => {"item": "munge", "msg": "No package"}
+ok: [node1] => (item=munge)
+failed: [node2] (item=slurm) => {"item": "slurm", "msg": "No package"}
+ok: [node1] => (item=slurm)
+fatal: [node2]: FAILED! => {"msg": "One or more items failed"}
+
+TASK [start slurmd] ***
+changed: [node1]
+
+PLAY RECAP ***
+node1 : ok=2    changed=1    unreachable=0    failed=0    skipped=0
+node2 : ok=0    changed=0    unreachable=0    failed=1    skipped=0
+"""
+
+RESCUED = """
+PLAY [slurmclients] ***
+
+TASK [configure slurmd] ***
+fatal: [node2]: FAILED! => {"msg": "Could not write slurm.conf"}
+changed: [node1]
+
+TASK [restore slurm.conf] ***
+changed: [node2]
+
+PLAY [slurmservers] ***
+
+TASK [reconfigure slurmctld] ***
+changed: [controller]
+
+PLAY RECAP ***
+controller : ok=1    changed=1    unreachable=0    failed=0    skipped=0
+node1 : ok=1    changed=1    unreachable=0    failed=0    skipped=0
+node2 : ok=1    changed=1    unreachable=0    failed=0    skipped=0
+"""
+
+RESCUED_LAST = """
+PLAY [slurmclients] ***
+
+TASK [configure slurmd] ***
+changed: [node1]
+fatal: [node2]: FAILED! => {"msg": "Could not write slurm.conf"}
+
+PLAY RECAP ***
+node1 : ok=1    changed=1    unreachable=0    failed=0    rescued=0
+node2 : ok=0    changed=0    unreachable=0    failed=0    rescued=1
+"""
+
+
+class AnsibleOutputTest(unittest.TestCase):
+    """Run canned playbook output through :class:`AnsibleRunner`."""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix='slurmscale-test-')
+        command = os.path.join(self.root, 'ansible-playbook')
+        with open(command, 'w') as f:
+            f.write(PLAYBOOK_COMMAND)
+        os.chmod(command, os.stat(command).st_mode | stat.S_IXUSR)
+        self.path = os.environ['PATH']
+        os.environ['PATH'] = self.root + os.pathsep + self.path
+
+    def tearDown(self):
+        os.environ['PATH'] = self.path
+        shutil.rmtree(self.root)
+
+    def run_output(self, output, abort_on=('failed', 'unreachable')):
+        """Run a playbook printing ``output``; return the failure events."""
+        with open(os.path.join(self.root, 'playbook.yml'), 'w') as f:
+            f.write(output)
+        events = []
+        status, _ = AnsibleRunner(
+            self.root, 'inventory', 'playbook.yml', None, abort_on=abort_on,
+            on_event=events.append).run()
+        return status, [(e.host, e.task, e.status) for e in events
+                        if e.status not in ('ok', 'changed', 'skipping')]
+
+    def test_loop_items_ignored(self):
+        """Failed loop items followed by ``...ignoring`` are ignored."""
+        status, events = self.run_output(LOOP_IGNORED)
+        self.assertEqual(status, 0)
+        self.assertEqual(events, [('node2', 'install packages', 'ignored')] *
+                         2)
+
+    def test_loop_items_failed(self):
+        """Failed loop items not ignored fail the host and abort the run."""
+        status, events = self.run_output(LOOP_FAILED)
+        self.assertNotEqual(status, 0)
+        self.assertEqual(events, [('node2', 'install packages', 'failed')] *
+                         3)
+
+    def test_rescued(self):
+        """Failures handled by a ``rescue`` section do not abort the run."""
+        status, events = self.run_output(RESCUED)
+        self.assertEqual(status, 0)
+        self.assertEqual(events, [('node2', 'configure slurmd', 'rescued')])
+        status, events = self.run_output(RESCUED_LAST)
+        self.assertEqual(status, 0)
+        self.assertEqual(events, [('node2', 'configure slurmd', 'rescued')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,27 @@
+"""Check that importing SlurmScale stays within its start-up time budget."""
+import os
+import subprocess
+import sys
+import unittest
+
+BENCHMARK = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                         'benchmarks', 'bench_import.py')
+
+
+class ImportTimeTest(unittest.TestCase):
+    """Run ``benchmarks/bench_import.py`` as a test."""
+
+    def test_import_budget(self):
+        """Import time is within budget and heavy modules are not loaded."""
+        # A looser budget than the benchmark's default, for loaded machines
+        budget = os.environ.get('SLURMSCALE_IMPORT_BUDGET', '300')
+        proc = subprocess.Popen(
+            [sys.executable, BENCHMARK, '--budget', budget, '--repeat', '3',
+             '--fake'],
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        out, _ = proc.communicate()
+        self.assertEqual(proc.returncode, 0, out.decode('utf-8'))
+
+
+if __name__ == '__main__':
+    unittest.main()
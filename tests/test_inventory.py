@@ -0,0 +1,53 @@
+"""Check that configuration runs are fingerprinted consistently."""
+import os
+import random
+import unittest
+
+from slurmscale import fake
+from slurmscale.util.ansible import InventoryFile
+
+
+class InventoryFingerprintTest(unittest.TestCase):
+    """Render inventories and fingerprint them with the fake backends."""
+
+    def setUp(self):
+        self.config_manager = fake.install().config_manager()
+        self.nodes = [{'name': 'jetstream-iu-large{0}'.format(i),
+                       'ip': '10.0.0.{0}'.format(i), 'cpus': 24,
+                       'memory': 60000} for i in range(20)]
+        for node in self.nodes[::3]:
+            node.update(group='slurmpool_gpu', partition='gpu')
+
+    def test_render_order(self):
+        """Node order does not change the inventory or its fingerprint."""
+        shuffled = list(self.nodes)
+        random.Random(4).shuffle(shuffled)
+        self.assertNotEqual(shuffled, self.nodes)
+        inventory = InventoryFile.render(self.nodes)
+        self.assertEqual(InventoryFile.render(shuffled), inventory)
+        self.assertEqual(
+            self.config_manager._fingerprint(InventoryFile.render(shuffled)),
+            self.config_manager._fingerprint(inventory))
+
+    def test_runtime_files(self):
+        """Ansible logs and fact caches do not change the fingerprint."""
+        cm = self.config_manager
+        inventory = InventoryFile.render(self.nodes)
+        with open(os.path.join(cm._playbook_root, 'ansible.cfg'), 'w') as f:
+            f.write("[defaults]\nlog_path = logs/ansible\n"
+                    "fact_caching_connection = facts\n")
+        fingerprint = cm._fingerprint(inventory)
+        for path in ('ansible.log', 'logs/ansible', 'facts/node0'):
+            path = os.path.join(cm._playbook_root, path)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(path, 'w') as f:
+                f.write(path)
+        self.assertEqual(cm._fingerprint(inventory), fingerprint)
+        with open(os.path.join(cm._playbook_root, 'vars.yml'), 'w') as f:
+            f.write("slurm_version: 17.02\n")
+        self.assertNotEqual(cm._fingerprint(inventory), fingerprint)
+
+
+if __name__ == '__main__':
+    unittest.main()
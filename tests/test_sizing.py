@@ -0,0 +1,46 @@
+"""Check how pending array jobs are counted when sizing the cluster."""
+import unittest
+
+from slurmscale.jobs.summary import JobSummary
+from slurmscale.util import sizing
+
+
+def array_job(job_id, tasks, max_tasks=0, cpus=4, partition='batch'):
+    """Make a pending array job record with the supplied task indexes."""
+    return {'job_id': job_id, 'job_state': 'PENDING',
+            'state_reason': 'Resources', 'partition': partition,
+            'num_nodes': 1, 'num_cpus': cpus, 'array_task_str': tasks,
+            'array_max_tasks': max_tasks}
+
+
+class ArrayJobTest(unittest.TestCase):
+    """Pending array jobs count once per task."""
+
+    def test_job_tasks(self):
+        """Task index lists, steps and throttles are expanded."""
+        for tasks, max_tasks, expected, throttled in (
+                ('1-100', 0, 100, 100), ('1,3,5-7%4', 0, 5, 4),
+                ('0-20:5', 0, 5, 5), ('1-100', 10, 100, 10),
+                ('1-3,7...', 0, 3, 3), (None, 0, 1, 1)):
+            job = array_job(1, tasks, max_tasks)
+            self.assertEqual(sizing.job_tasks(job, throttle=False), expected)
+            self.assertEqual(sizing.job_tasks(job), throttled)
+
+    def test_nodes_needed(self):
+        """Each task that may run at once is packed."""
+        shape = sizing.NodeShape(24, 60000)
+        self.assertEqual(sizing.nodes_needed([array_job(1, '1-60')], shape),
+                         10)
+        self.assertEqual(
+            sizing.nodes_needed([array_job(1, '1-60%12')], shape), 2)
+
+    def test_summary(self):
+        """The summary counts pending array jobs once per task."""
+        summary = JobSummary({1: array_job(1, '1-60', partition='a,b'),
+                              2: array_job(2, None, cpus=2, partition='a')})
+        self.assertEqual(summary.count_by_partition(), {'a': 61, 'b': 60})
+        self.assertEqual(summary.total_cpus(), 242)
+
+
+if __name__ == '__main__':
+    unittest.main()